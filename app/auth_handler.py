@@ -4,42 +4,27 @@ import jwt
 from jwt.exceptions import InvalidTokenError
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
-from passlib.context import CryptContext
 from sqlmodel import Session, select
-from db.session import get_session
+from sqlmodel.ext.asyncio.session import AsyncSession
+from db.session import get_session, get_async_session
 from models import User
+from schemas import UserType
+from cache import TTLCache
+from config import settings
+from passwords import (pwd_context,
+                       get_password_hash,
+                       verify_password,
+                       hash_password_async,
+                       verify_password_async)
 
 SECRET_KEY = "your-secret-key-here"
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="auth/login")
 
-def get_password_hash(password):
-    """
-    Генерирует хэш пароля с использованием bcrypt.
-    
-    Args:
-        password (str): Пароль в открытом виде
-        
-    Returns:
-        str: Хэшированная версия пароля
-    """
-    return pwd_context.hash(password)
-
-def verify_password(plain_password, hashed_password):
-    """
-    Проверяет соответствие пароля его хэшу.
-    
-    Args:
-        plain_password (str): Пароль в открытом виде
-        hashed_password (str): Хэшированный пароль
-        
-    Returns:
-        bool: True если пароль совпадает, False в противном случае
-    """
-    return pwd_context.verify(plain_password, hashed_password)
+# Аутентифицированные пользователи по subject токена (email)
+user_cache = TTLCache(maxsize=settings.auth_cache_size, ttl=settings.auth_cache_ttl)
 
 def create_access_token(data: dict, expires_delta: timedelta | None = None):
     """
@@ -62,10 +47,82 @@ def create_access_token(data: dict, expires_delta: timedelta | None = None):
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
+def user_claims(user: User) -> dict:
+    """
+    Формирует полезную нагрузку токена для пользователя.
+
+    Args:
+        user (User): Пользователь
+
+    Returns:
+        dict: subject (email), user_id, user_type и dancer_id
+    """
+    return {
+        "sub": user.email,
+        "user_id": user.user_id,
+        "user_type": UserType(user.user_type).value,
+        "dancer_id": user.dancer_id,
+    }
+
+def decode_token(token: str) -> dict:
+    """
+    Проверяет JWT токен и возвращает его полезную нагрузку.
+
+    Args:
+        token (str): JWT токен из заголовка Authorization
+
+    Raises:
+        HTTPException: 401 если токен невалиден или в нем нет subject
+
+    Returns:
+        dict: Полезная нагрузка токена
+    """
+    try:
+        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        if not payload.get("sub"):
+            raise credentials_exception()
+    except InvalidTokenError:
+        raise credentials_exception()
+    return payload
+
+def credentials_exception() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail="Не удалось проверить учетные данные",
+        headers={"WWW-Authenticate": "Bearer"},
+    )
+
+def _check_user_id(payload: dict, user: User):
+    # Токен, выданный удаленному пользователю, не подходит новому с тем же email
+    if payload.get("user_id") not in (None, user.user_id):
+        raise credentials_exception()
+
+def _remember_user(payload: dict, user: User | None) -> User:
+    if user is None:
+        raise credentials_exception()
+    _check_user_id(payload, user)
+    principal = User(**user.model_dump())
+    user_cache.set(payload["sub"], principal)
+    return principal
+
+def forget_user(email: str | None):
+    """
+    Удаляет пользователя из кэша аутентификации.
+
+    Вызывается при удалении или изменении пользователя.
+
+    Args:
+        email (str | None): Email (subject токена) пользователя
+    """
+    user_cache.pop(email)
+
 def get_current_user(token: Annotated[str, Depends(oauth2_scheme)], 
                     db_session: Session = Depends(get_session)):
     """
     Возвращает текущего аутентифицированного пользователя на основе JWT токена.
+
+    Пользователи кэшируются по subject токена, поэтому база запрашивается
+    только при промахе кэша.
     
     Args:
         token (str): JWT токен из заголовка Authorization
@@ -75,26 +132,38 @@ def get_current_user(token: Annotated[str, Depends(oauth2_scheme)],
         HTTPException: 401 если токен невалиден или пользователь не найден
         
     Returns:
-        User: Объект аутентифицированного пользователя
+        User: Объект аутентифицированного пользователя (не привязан к сессии)
     """
-    credentials_exception = HTTPException(
-        status_code=status.HTTP_401_UNAUTHORIZED,
-        detail="Не удалось проверить учетные данные",
-        headers={"WWW-Authenticate": "Bearer"},
-    )
-    
-    try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        username: str = payload.get("sub")
-        if not username:
-            raise credentials_exception
-    except InvalidTokenError:
-        raise credentials_exception
+    payload = decode_token(token)
+    user = user_cache.get(payload["sub"])
+    if user is not None:
+        _check_user_id(payload, user)
+        return user
 
     # Поиск пользователя в базе данных по email
-    statement = select(User).where(User.email == username)
-    user = db_session.exec(statement).first()
+    statement = select(User).where(User.email == payload["sub"])
+    return _remember_user(payload, db_session.exec(statement).first())
 
-    if user is None:
-        raise credentials_exception
-    return user
\ No newline at end of file
+async def get_current_user_async(token: Annotated[str, Depends(oauth2_scheme)],
+                                 db_session: AsyncSession = Depends(get_async_session)):
+    """
+    Асинхронная версия get_current_user для режима async_db.
+
+    Args:
+        token (str): JWT токен из заголовка Authorization
+        db_session (AsyncSession): Асинхронная сессия базы данных
+
+    Raises:
+        HTTPException: 401 если токен невалиден или пользователь не найден
+
+    Returns:
+        User: Объект аутентифицированного пользователя (не привязан к сессии)
+    """
+    payload = decode_token(token)
+    user = user_cache.get(payload["sub"])
+    if user is not None:
+        _check_user_id(payload, user)
+        return user
+
+    statement = select(User).where(User.email == payload["sub"])
+    return _remember_user(payload, (await db_session.exec(statement)).first())
@@ -0,0 +1,80 @@
+"""
+Recall vs latency of the KNN neighbour search backends.
+
+Run from the app directory:
+
+    python -m benchmarks.bench_neighbors --sizes 1000 10000 100000 --json out.json
+
+Points are synthetic (level, age, height) features normalized the same way
+as the recommendation index does. Recall@K is measured against brute force.
+"""
+import argparse
+import json
+import time
+import numpy as np
+from recommender.neighbors import BACKENDS, BruteForceSearch
+
+
+def make_points(size: int, rng: np.random.Generator) -> np.ndarray:
+    features = np.stack([
+        rng.integers(0, 3, size),
+        rng.integers(14, 45, size),
+        rng.normal(172, 9, size),
+    ], axis=1).astype(np.float64)
+    return (features - features.mean(axis=0)) / (features.std(axis=0) + 1e-8)
+
+
+def recall(found: list[np.ndarray], exact: list[np.ndarray]) -> float:
+    hits = sum(len(np.intersect1d(a, b)) for a, b in zip(found, exact))
+    total = sum(len(b) for b in exact)
+    return hits / total if total else 1.0
+
+
+def run(sizes: list[int], queries: int, k: int, seed: int) -> list[dict]:
+    rng = np.random.default_rng(seed)
+    results = []
+    for size in sizes:
+        points = make_points(size, rng)
+        targets = points[rng.integers(0, size, queries)] + rng.normal(0, 0.05, (queries, 3))
+        exact = BruteForceSearch(points).query(targets, k)
+        for name, backend in BACKENDS.items():
+            started = time.perf_counter()
+            try:
+                search = backend(points)
+            except RuntimeError as e:
+                print(f"{name:>6} n={size:<7} skipped: {e}")
+                continue
+            built = time.perf_counter()
+            found = search.query(targets, k)
+            done = time.perf_counter()
+            row = {
+                "backend": name,
+                "size": size,
+                "k": k,
+                "build_ms": (built - started) * 1000,
+                "query_us": (done - built) / queries * 1e6,
+                "recall": recall(found, exact),
+            }
+            results.append(row)
+            print(f"{name:>6} n={size:<7} build {row['build_ms']:9.1f} ms  "
+                  f"query {row['query_us']:9.1f} us  recall@{k} {row['recall']:.3f}")
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("-k", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", help="Write results to this file")
+    args = parser.parse_args()
+
+    results = run(args.sizes, args.queries, args.k, args.seed)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
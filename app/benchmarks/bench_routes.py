@@ -0,0 +1,266 @@
+"""
+Micro-benchmarks of route handlers and an in-process load test of the API.
+
+Run from the app directory:
+
+    python -m benchmarks.bench_routes --sizes 1000 10000 100000 --json out.json
+
+For every size a SQLite database is generated (benchmarks.datagen), then:
+
+- micro: handlers are called directly with a session, without HTTP:
+  get_basic_recommendations and get_knn_recommendations with the
+  recommendation cache cleared before every call (cold) and kept (warm),
+  read_pairs for one page, and update_request accepting a fresh request.
+- load: httpx sends requests to the ASGI app in process, `--concurrency`
+  at a time, `--requests` per route, and reports throughput and
+  p50/p95/p99 latency per route. Authentication is bypassed with an
+  admin user.
+
+Results go to the JSON file together with the commit and settings, so
+runs can be compared with benchmarks.compare.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import subprocess
+import tempfile
+import time
+import httpx
+import numpy as np
+from fastapi import Response
+from sqlalchemy import insert
+from sqlmodel import Session
+from auth_handler import get_current_user
+from config import settings
+from db.db import configure_sqlite
+from db.session import get_session, get_async_session
+from main import app
+from models import Dancer, Request, User
+from pagination import DEFAULT_LIMIT
+from recommender.index import index
+from recommender.results import recommendation_cache
+from routes.pairs import read_pairs
+from routes.recomendations import get_basic_recommendations, get_knn_recommendations
+from routes.requests import update_request
+from schemas import RequestStatus, RequestUpdate, UserType
+from benchmarks.datagen import create_database, populate
+
+ADMIN = User(user_id=1, name="bench", user_type=UserType.ADMIN)
+
+# Load test routes: path template and request body
+ROUTES = [
+    ("GET", "/dancers/?limit=100", None),
+    ("GET", "/dancers/{dancer_id}", None),
+    ("GET", "/dancers/{dancer_id}/requests/incoming?status=PENDING", None),
+    ("GET", "/dancers/{dancer_id}/requests/incoming/count", None),
+    ("GET", "/requests/?receiver_id={dancer_id}&status=PENDING", None),
+    ("GET", "/pairs/?limit=100", None),
+    ("GET", "/recomendations/base/{dancer_id}", None),
+    ("GET", "/recomendations/knn/{dancer_id}?k=5", None),
+    ("PUT", "/requests/{request_id}", {"status": "REJECTED"}),
+]
+
+
+def percentiles(samples: list[float]) -> dict:
+    p50, p95, p99 = np.percentile(samples, [50, 95, 99]) if samples else (0.0, 0.0, 0.0)
+    return {"p50_ms": p50 * 1000, "p95_ms": p95 * 1000, "p99_ms": p99 * 1000,
+            "mean_ms": float(np.mean(samples)) * 1000 if samples else 0.0}
+
+
+def timed(call, repeat: int, before=None) -> list[float]:
+    samples = []
+    for i in range(repeat):
+        if before is not None:
+            before()
+        started = time.perf_counter()
+        call(i)
+        samples.append(time.perf_counter() - started)
+    return samples
+
+
+def add_acceptable_requests(engine, count: int) -> list[int]:
+    # Fresh dancers in search, so that every accept creates a pair
+    with Session(engine) as session:
+        dancers = []
+        for i in range(count):
+            dancers += [Dancer(name=f"Bench leader {i}", secret_name="s", sex="MALE",
+                               style="latin", level="C"),
+                        Dancer(name=f"Bench follower {i}", secret_name="s", sex="FEMALE",
+                               style="latin", level="C")]
+        session.add_all(dancers)
+        session.flush()
+        result = session.execute(insert(Request).returning(Request.id), [
+            {"sender_id": dancers[2 * i].id, "receiver_id": dancers[2 * i + 1].id,
+             "status": RequestStatus.PENDING.value}
+            for i in range(count)
+        ])
+        ids = list(result.scalars())
+        session.commit()
+    return ids
+
+
+def run_micro(engine, data: dict, repeat: int, rng: random.Random) -> list[dict]:
+    targets = [rng.choice(data["searching"]) for _ in range(repeat)]
+    results = []
+
+    def record(name: str, samples: list[float]):
+        row = {"benchmark": name, "calls": len(samples), **percentiles(samples)}
+        results.append(row)
+        print(f"  {name:<24} p50 {row['p50_ms']:8.2f} ms  p95 {row['p95_ms']:8.2f} ms  "
+              f"p99 {row['p99_ms']:8.2f} ms")
+
+    with Session(engine) as session:
+        index.ensure_loaded(session)
+        for name, handler in (("basic", lambda i: get_basic_recommendations(targets[i], session)),
+                              ("knn", lambda i: get_knn_recommendations(targets[i], session, k=5))):
+            record(f"{name}_recommendations_cold", timed(handler, repeat, recommendation_cache.clear))
+            # The first pass fills the cache, the second one is measured
+            timed(handler, repeat)
+            record(f"{name}_recommendations_warm", timed(handler, repeat))
+            session.rollback()
+
+        pages = max(1, data["pairs"] // DEFAULT_LIMIT)
+        cursors = [rng.randrange(pages) * DEFAULT_LIMIT or None for _ in range(repeat)]
+        record("read_pairs", timed(
+            lambda i: read_pairs(session, Response(), cursors[i], DEFAULT_LIMIT, None), repeat))
+
+    request_ids = add_acceptable_requests(engine, repeat)
+    accept = RequestUpdate(status=RequestStatus.ACCEPTED)
+
+    def update(i):
+        with Session(engine) as session:
+            update_request(request_ids[i], accept, session, ADMIN)
+
+    record("update_request_accept", timed(update, repeat))
+    return results
+
+
+async def _load_route(client, method: str, path: str, body, data: dict,
+                      requests: int, concurrency: int, rng: random.Random) -> dict:
+    paths = [path.format(dancer_id=rng.choice(data["searching"]),
+                         request_id=rng.choice(data["pending"]))
+             for _ in range(requests)]
+    samples, errors = [], 0
+    queue = iter(paths)
+
+    async def user():
+        nonlocal errors
+        for url in queue:
+            started = time.perf_counter()
+            response = await client.request(method, url, json=body)
+            samples.append(time.perf_counter() - started)
+            if response.status_code >= 400:
+                errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*[user() for _ in range(concurrency)])
+    elapsed = time.perf_counter() - started
+    return {"route": f"{method} {path}", "requests": requests, "errors": errors,
+            "concurrency": concurrency, "rps": requests / elapsed, **percentiles(samples)}
+
+
+async def run_load(path: str, data: dict, requests: int, concurrency: int,
+                   rng: random.Random) -> list[dict]:
+    results = []
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        for method, route, body in ROUTES:
+            row = await _load_route(client, method, route, body, data,
+                                    requests, concurrency, rng)
+            results.append(row)
+            print(f"  {row['route']:<58} {row['rps']:8.1f} req/s  p50 {row['p50_ms']:7.2f}  "
+                  f"p95 {row['p95_ms']:7.2f}  p99 {row['p99_ms']:7.2f} ms  errors {row['errors']}")
+    return results
+
+
+def use_database(engine, path: str):
+    """Direct the application's sessions and authentication to the benchmark database."""
+    def bench_session():
+        with Session(engine) as session:
+            yield session
+
+    app.dependency_overrides[get_session] = bench_session
+    app.dependency_overrides[get_current_user] = lambda: ADMIN
+    if settings.async_db:
+        from sqlalchemy.ext.asyncio import create_async_engine
+        from sqlmodel.ext.asyncio.session import AsyncSession
+        async_engine = create_async_engine(f"sqlite+aiosqlite:///{path}",
+                                           connect_args={"timeout": 30})
+        configure_sqlite(async_engine.sync_engine)
+
+        async def bench_async_session():
+            async with AsyncSession(async_engine) as session:
+                yield session
+
+        app.dependency_overrides[get_async_session] = bench_async_session
+
+
+def commit_id() -> str | None:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(sizes: list[int], repeat: int, requests: int, concurrency: int,
+        micro: bool, load: bool, seed: int) -> dict:
+    report = {
+        "commit": commit_id(),
+        "python": platform.python_version(),
+        "settings": {"knn_backend": settings.knn_backend, "fast_json": settings.fast_json,
+                     "async_db": settings.async_db,
+                     "recommendation_cache_size": settings.recommendation_cache_size},
+        "runs": [],
+    }
+    with tempfile.TemporaryDirectory() as directory:
+        for size in sizes:
+            path = os.path.join(directory, f"bench_{size}.db")
+            started = time.perf_counter()
+            engine = create_database(path)
+            data = populate(engine, size, seed=seed)
+            print(f"n={size}: {data['pairs']} pairs, {data['requests']} requests "
+                  f"generated in {time.perf_counter() - started:.1f} s")
+            index.clear()
+            recommendation_cache.clear()
+            rng = random.Random(seed)
+            entry = {"dancers": size, "pairs": data["pairs"], "requests": data["requests"]}
+            if load:
+                use_database(engine, path)
+                try:
+                    entry["load"] = asyncio.run(run_load(path, data, requests, concurrency, rng))
+                finally:
+                    app.dependency_overrides.clear()
+            if micro:
+                entry["micro"] = run_micro(engine, data, repeat, rng)
+            report["runs"].append(entry)
+            index.clear()
+            recommendation_cache.clear()
+            engine.dispose()
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--repeat", type=int, default=50, help="Calls per micro-benchmark")
+    parser.add_argument("--requests", type=int, default=500, help="Requests per route")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--no-micro", dest="micro", action="store_false")
+    parser.add_argument("--no-load", dest="load", action="store_false")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", help="Write results to this file")
+    args = parser.parse_args()
+
+    report = run(args.sizes, args.repeat, args.requests, args.concurrency,
+                 args.micro, args.load, args.seed)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
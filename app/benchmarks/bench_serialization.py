@@ -0,0 +1,136 @@
+"""
+Response model vs fast JSON serialization of list endpoints.
+
+Run from the app directory:
+
+    python -m benchmarks.bench_serialization --dancers 10000 --json out.json
+
+For the dancer list and the pair list (dancers paired up), measures the
+FastAPI response-model path (ORM objects, validation against the
+response_model, jsonable serialization, JSONResponse) and the fast path
+used with FAST_JSON=true (column rows, dicts, FastJSONResponse). The fast
+path is also timed with the stdlib json fallback. Times cover the query
+and serialization of the whole list, without HTTP.
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+from fastapi.responses import JSONResponse
+from fastapi.routing import serialize_response
+from fastapi.utils import create_model_field
+from sqlalchemy import insert
+from sqlalchemy.orm import selectinload
+from sqlalchemy.pool import StaticPool
+from sqlmodel import SQLModel, Session, create_engine, select
+import serialization
+from models import Dancer, Pair, PairResponse
+from schemas import DancerResponse
+from routes.pairs import pair_page_rows, to_pair_response
+from serialization import FastJSONResponse, model_columns
+
+
+def make_engine(dancers: int, seed: int):
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False},
+                           poolclass=StaticPool)
+    SQLModel.metadata.create_all(engine)
+    rng = random.Random(seed)
+    rows = [{
+        "name": f"Dancer {i}", "secret_name": "s",
+        "sex": "MALE" if i % 2 else "FEMALE",
+        "age": rng.randint(14, 45), "height": round(rng.gauss(172, 9), 1),
+        "style": rng.choice(["latin", "standard"]), "level": rng.choice(["E", "D", "C", "B"]),
+        "status": "IN_PAIR", "level_rank": 0,
+    } for i in range(dancers)]
+    with Session(engine) as session:
+        session.execute(insert(Dancer), rows)
+        session.execute(insert(Pair), [{"dancer1_id": i, "dancer2_id": i + 1}
+                                       for i in range(1, dancers, 2)])
+        session.commit()
+    return engine
+
+
+def model_dancers(session, size):
+    field = create_model_field("Response", list[DancerResponse], mode="serialization")
+    dancers = session.exec(select(Dancer).order_by(Dancer.id).limit(size)).all()
+    content = asyncio.run(serialize_response(field=field, response_content=dancers))
+    return JSONResponse(content).body
+
+
+def fast_dancers(session, size):
+    statement = select(*[getattr(Dancer, name) for name in model_columns(DancerResponse)])
+    rows = session.exec(statement.order_by(Dancer.id).limit(size)).all()
+    return FastJSONResponse([dict(zip(row._fields, row)) for row in rows]).body
+
+
+def model_pairs(session, size):
+    field = create_model_field("Response", list[PairResponse], mode="serialization")
+    pairs = session.exec(select(Pair).options(selectinload(Pair.dancer1), selectinload(Pair.dancer2))
+                         .order_by(Pair.id).limit(size)).all()
+    content = asyncio.run(serialize_response(
+        field=field, response_content=[to_pair_response(pair) for pair in pairs]))
+    return JSONResponse(content).body
+
+
+def fast_pairs(session, size):
+    pairs, _ = pair_page_rows(session, None, size)
+    return FastJSONResponse(pairs).body
+
+
+def measure(engine, build, size: int, repeat: int) -> tuple[float, bytes]:
+    best, body = float("inf"), b""
+    for _ in range(repeat):
+        with Session(engine) as session:
+            started = time.perf_counter()
+            body = build(session, size)
+            best = min(best, time.perf_counter() - started)
+    return best, body
+
+
+def run(dancers: int, repeat: int, seed: int) -> list[dict]:
+    engine = make_engine(dancers, seed)
+    orjson = serialization.orjson
+    cases = [
+        ("dancers", dancers, model_dancers, fast_dancers),
+        ("pairs", dancers // 2, model_pairs, fast_pairs),
+    ]
+    results = []
+    for endpoint, size, slow, fast in cases:
+        model_time, expected = measure(engine, slow, size, repeat)
+        paths = [("model", model_time)]
+        for name, module in (("fast", orjson), ("fast_stdlib", None)):
+            if name == "fast" and module is None:
+                continue
+            serialization.orjson = module
+            try:
+                fast_time, body = measure(engine, fast, size, repeat)
+            finally:
+                serialization.orjson = orjson
+            assert json.loads(body) == json.loads(expected), f"{endpoint}: {name} output differs"
+            paths.append((name, fast_time))
+        for name, seconds in paths:
+            row = {"endpoint": endpoint, "items": size, "path": name,
+                   "ms": seconds * 1000, "speedup": model_time / seconds}
+            results.append(row)
+            print(f"{endpoint:>8} n={size:<7} {name:<12} {row['ms']:9.1f} ms  x{row['speedup']:.1f}")
+    engine.dispose()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--dancers", type=int, default=10000)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", help="Write results to this file")
+    args = parser.parse_args()
+
+    results = run(args.dancers, args.repeat, args.seed)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
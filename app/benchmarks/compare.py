@@ -0,0 +1,81 @@
+"""
+Compare two benchmarks.bench_routes result files.
+
+Run from the app directory:
+
+    python -m benchmarks.compare before.json after.json --threshold 0.2
+
+Prints p50/p95 latency and throughput of every micro-benchmark and route
+present in both files, with the relative change. Exits with status 1 if
+any p95 latency grew or throughput fell by more than the threshold.
+"""
+import argparse
+import json
+import sys
+
+
+def _rows(report: dict) -> dict:
+    rows = {}
+    for run in report["runs"]:
+        for row in run.get("micro", []):
+            rows[(run["dancers"], "micro", row["benchmark"])] = row
+        for row in run.get("load", []):
+            rows[(run["dancers"], "load", row["route"])] = row
+    return rows
+
+
+def _change(before: float, after: float) -> float:
+    return (after - before) / before if before else 0.0
+
+
+def compare(before: dict, after: dict, threshold: float) -> list[tuple]:
+    """
+    Match rows of two reports and find regressions.
+
+    Args:
+        before (dict): Baseline report
+        after (dict): New report
+        threshold (float): Allowed relative change, e.g. 0.2 for 20%
+
+    Returns:
+        list[tuple]: (key, metric, before, after, change) of every regression
+    """
+    old, new = _rows(before), _rows(after)
+    regressions = []
+    print(f"{before.get('commit')} -> {after.get('commit')}")
+    for key in sorted(old.keys() & new.keys(), key=str):
+        a, b = old[key], new[key]
+        dancers, kind, name = key
+        line = (f"n={dancers:<7} {kind:<5} {name:<58} "
+                f"p50 {a['p50_ms']:8.2f} -> {b['p50_ms']:8.2f} ms  "
+                f"p95 {a['p95_ms']:8.2f} -> {b['p95_ms']:8.2f} ms ({_change(a['p95_ms'], b['p95_ms']):+.0%})")
+        if _change(a["p95_ms"], b["p95_ms"]) > threshold:
+            regressions.append((key, "p95_ms", a["p95_ms"], b["p95_ms"],
+                                _change(a["p95_ms"], b["p95_ms"])))
+        if "rps" in a:
+            line += f"  {a['rps']:8.1f} -> {b['rps']:8.1f} req/s ({_change(a['rps'], b['rps']):+.0%})"
+            if -_change(a["rps"], b["rps"]) > threshold:
+                regressions.append((key, "rps", a["rps"], b["rps"], _change(a["rps"], b["rps"])))
+        print(line)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("before")
+    parser.add_argument("after")
+    parser.add_argument("--threshold", type=float, default=0.2)
+    args = parser.parse_args()
+
+    with open(args.before) as f:
+        before = json.load(f)
+    with open(args.after) as f:
+        after = json.load(f)
+    regressions = compare(before, after, args.threshold)
+    for (dancers, kind, name), metric, old, new, change in regressions:
+        print(f"REGRESSION n={dancers} {kind} {name}: {metric} {old:.2f} -> {new:.2f} ({change:+.0%})")
+    sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
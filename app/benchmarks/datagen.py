@@ -0,0 +1,146 @@
+"""
+Synthetic dancers, pairs and partnership requests for benchmarks.
+
+Run from the app directory to build a database for manual load tests:
+
+    python -m benchmarks.datagen --dancers 100000 --db bench.db
+
+Dancers get realistic sex, style, level, age and height. A share of them
+are paired up (pair and pair_member rows, status IN_PAIR). Every dancer
+sends a few requests to dancers of the other sex, most of them still
+PENDING. The database is created with the application schema and indexes.
+"""
+import argparse
+import os
+import random
+import time
+from sqlalchemy import insert
+from sqlmodel import SQLModel, Session, create_engine
+from db.db import configure_sqlite
+from db.migrations import migrate
+from models import Dancer, Pair, PairMember, Request
+from schemas import LEVEL_ORDER, RequestStatus, StatusType, get_level_value
+
+STYLES = ["latin", "standard", "ten-dance"]
+_CHUNK_SIZE = 10000
+
+
+def create_database(path: str):
+    """
+    Create an empty SQLite database file with the application schema.
+
+    Args:
+        path (str): File path; an existing file is replaced
+
+    Returns:
+        Engine: Engine configured like the application's SQLite engine
+    """
+    for suffix in ("", "-wal", "-shm"):
+        if os.path.exists(path + suffix):
+            os.remove(path + suffix)
+    engine = create_engine(f"sqlite:///{path}",
+                           connect_args={"check_same_thread": False, "timeout": 30})
+    configure_sqlite(engine)
+    SQLModel.metadata.create_all(engine)
+    migrate(engine)
+    return engine
+
+
+def _insert(session, model, rows: list[dict]):
+    for start in range(0, len(rows), _CHUNK_SIZE):
+        session.execute(insert(model), rows[start:start + _CHUNK_SIZE])
+
+
+def populate(engine, dancers: int, pair_share: float = 0.2,
+             requests_per_dancer: int = 2, seed: int = 0) -> dict:
+    """
+    Fill an empty database with synthetic data.
+
+    Args:
+        engine: Database engine
+        dancers (int): Number of dancers
+        pair_share (float): Share of dancers that are in a pair
+        requests_per_dancer (int): Requests sent by every dancer
+        seed (int): Random seed
+
+    Returns:
+        dict: Row counts, and id pools benchmarks pick targets from:
+            "searching" (dancers in search) and "pending" (pending requests)
+    """
+    rng = random.Random(seed)
+    levels = list(LEVEL_ORDER)
+    rows = []
+    for i in range(dancers):
+        sex = "MALE" if i % 2 else "FEMALE"
+        level = rng.choice(levels)
+        rows.append({
+            "name": f"Dancer {i}",
+            "secret_name": f"secret {i}",
+            "sex": sex,
+            "age": rng.randint(14, 45),
+            "height": round(rng.gauss(180 if sex == "MALE" else 166, 7), 1),
+            "style": rng.choice(STYLES),
+            "level": level,
+            "level_rank": get_level_value(level),
+            "status": StatusType.IN_SEARCH.value,
+        })
+    ids = list(range(1, dancers + 1))
+    males = [dancer_id for dancer_id in ids if dancer_id % 2 == 0]
+    females = [dancer_id for dancer_id in ids if dancer_id % 2 == 1]
+
+    paired = int(min(len(males), len(females)) * pair_share)
+    leaders = rng.sample(males, paired)
+    followers = rng.sample(females, paired)
+    for dancer_id in leaders + followers:
+        rows[dancer_id - 1]["status"] = StatusType.IN_PAIR.value
+    pairs = [{"id": pair_id, "dancer1_id": leader, "dancer2_id": follower}
+             for pair_id, (leader, follower) in enumerate(zip(leaders, followers), 1)]
+    members = [{"dancer_id": dancer_id, "pair_id": pair["id"]}
+               for pair in pairs for dancer_id in (pair["dancer1_id"], pair["dancer2_id"])]
+
+    requests = []
+    for sender in ids:
+        others = females if sender % 2 == 0 else males
+        for receiver in rng.sample(others, min(requests_per_dancer, len(others))):
+            status = rng.choices([RequestStatus.PENDING, RequestStatus.REJECTED],
+                                 weights=[0.8, 0.2])[0]
+            requests.append({"sender_id": sender, "receiver_id": receiver,
+                             "status": status.value})
+
+    with Session(engine) as session:
+        _insert(session, Dancer, rows)
+        _insert(session, Pair, pairs)
+        _insert(session, PairMember, members)
+        _insert(session, Request, requests)
+        session.commit()
+
+    in_pair = set(leaders) | set(followers)
+    return {
+        "dancers": dancers,
+        "pairs": len(pairs),
+        "requests": len(requests),
+        "searching": [dancer_id for dancer_id in ids if dancer_id not in in_pair],
+        "pending": [request_id for request_id, request in enumerate(requests, 1)
+                    if request["status"] == RequestStatus.PENDING.value],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--dancers", type=int, default=10000)
+    parser.add_argument("--pair-share", type=float, default=0.2)
+    parser.add_argument("--requests-per-dancer", type=int, default=2)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--db", default="bench.db", help="SQLite file to create")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    engine = create_database(args.db)
+    counts = populate(engine, args.dancers, args.pair_share, args.requests_per_dancer, args.seed)
+    engine.dispose()
+    print(f"{args.db}: {counts['dancers']} dancers, {counts['pairs']} pairs, "
+          f"{counts['requests']} requests in {time.perf_counter() - started:.1f} s")
+
+
+if __name__ == "__main__":
+    main()
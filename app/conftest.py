@@ -0,0 +1,163 @@
+import asyncio
+import pytest
+from fastapi.testclient import TestClient
+from passlib.context import CryptContext
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.pool import NullPool
+from sqlmodel import SQLModel, Session, create_engine
+from sqlmodel.ext.asyncio.session import AsyncSession
+from config import settings
+import passwords
+from main import app, create_app
+from auth_handler import get_current_user, user_cache
+from db.session import get_session, get_async_session
+from models import Dancer, Pair, User
+from schemas import UserType
+from recommender.index import index
+from recommender.results import recommendation_cache
+
+ADMIN = User(user_id=1, name="admin", user_type=UserType.ADMIN)
+
+# Приложения для обоих режимов работы с базой: обработчики на Session
+# и на AsyncSession (ASYNC_DB)
+APPS = {settings.async_db: app, not settings.async_db: create_app(not settings.async_db)}
+
+
+@pytest.fixture
+def database_path(tmp_path):
+    return tmp_path / "test.db"
+
+
+@pytest.fixture
+def engine(database_path):
+    engine = create_engine(f"sqlite:///{database_path}",
+                           connect_args={"check_same_thread": False})
+    SQLModel.metadata.create_all(engine)
+    yield engine
+    engine.dispose()
+
+
+@pytest.fixture
+def async_engine(engine, database_path):
+    # Каждый запрос TestClient выполняется в своем event loop,
+    # поэтому соединения не переиспользуются между запросами
+    async_engine = create_async_engine(f"sqlite+aiosqlite:///{database_path}",
+                                       poolclass=NullPool)
+    yield async_engine
+    asyncio.run(async_engine.dispose())
+
+
+@pytest.fixture
+def session(engine):
+    with Session(engine) as session:
+        yield session
+
+
+@pytest.fixture
+def client(request, engine, async_engine):
+    """
+    Клиент приложения на тестовой базе.
+
+    По умолчанию режим следует настройке ASYNC_DB; тест выбирает режим
+    параметром "sync" или "async" (indirect-параметризация фикстуры).
+    """
+    mode = getattr(request, "param", "async" if settings.async_db else "sync")
+    test_app = APPS[mode == "async"]
+
+    def get_test_session():
+        with Session(engine) as session:
+            yield session
+
+    async def get_test_async_session():
+        async with AsyncSession(async_engine) as session:
+            yield session
+
+    overrides = dict(test_app.dependency_overrides)
+    test_app.dependency_overrides[get_session] = get_test_session
+    test_app.dependency_overrides[get_async_session] = get_test_async_session
+    index.clear()
+    recommendation_cache.clear()
+    user_cache.clear()
+    yield TestClient(test_app)
+    test_app.dependency_overrides.clear()
+    test_app.dependency_overrides.update(overrides)
+    index.clear()
+    recommendation_cache.clear()
+    user_cache.clear()
+
+
+@pytest.fixture
+def record_queries(engine, async_engine):
+    """
+    Функция record(call): выполнить call и вернуть его результат и список
+    выполненных SQL-команд в виде (statement, parameters).
+    """
+    engines = [engine, async_engine.sync_engine]
+
+    def record(call):
+        statements = []
+
+        def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+            statements.append((statement, parameters))
+
+        for target in engines:
+            event.listen(target, "before_cursor_execute", before_cursor_execute)
+        try:
+            result = call()
+        finally:
+            for target in engines:
+                event.remove(target, "before_cursor_execute", before_cursor_execute)
+        return result, statements
+
+    return record
+
+
+@pytest.fixture
+def count_queries(record_queries):
+    """Функция count(call): результат call и число выполненных SQL-команд."""
+    def count(call):
+        result, statements = record_queries(call)
+        return result, len(statements)
+
+    return count
+
+
+@pytest.fixture
+def add_pairs(session):
+    """Функция add(count): создать count пар из новых танцоров."""
+    def add(count):
+        for i in range(count):
+            dancer1 = Dancer(name=f"Leader {i}", secret_name="l", sex="MALE",
+                             style="latin", level="C", status="IN_PAIR")
+            dancer2 = Dancer(name=f"Follower {i}", secret_name="f", sex="FEMALE",
+                             style="latin", level="C", status="IN_PAIR")
+            session.add_all([dancer1, dancer2])
+            session.flush()
+            session.add(Pair(dancer1_id=dancer1.id, dancer2_id=dancer2.id))
+        session.commit()
+
+    return add
+
+
+@pytest.fixture
+def admin():
+    """Администратор, подставленный в приложение как текущий пользователь."""
+    overrides = {test_app: test_app.dependency_overrides.get(get_current_user)
+                 for test_app in APPS.values()}
+    for test_app in APPS.values():
+        test_app.dependency_overrides[get_current_user] = lambda: ADMIN
+    yield ADMIN
+    for test_app, override in overrides.items():
+        if override is None:
+            test_app.dependency_overrides.pop(get_current_user, None)
+        else:
+            test_app.dependency_overrides[get_current_user] = override
+
+
+@pytest.fixture
+def fast_hashing(monkeypatch):
+    """Хэширование паролей в пуле потоков со стоимостью bcrypt 5."""
+    monkeypatch.setattr(settings, "password_hash_workers", 0)
+    monkeypatch.setattr(passwords, "pwd_context", CryptContext(
+        schemes=["bcrypt"], bcrypt__default_rounds=5, bcrypt__min_rounds=5))
@@ -1,10 +1,98 @@
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
 from sqlmodel import create_engine, SQLModel
+from config import settings
+from db.migrations import migrate
 
-sqlite_file_name = "dancers.db"
-sqlite_url = f"sqlite:///{sqlite_file_name}"
 
-connect_args = {"check_same_thread": False}
-engine = create_engine(sqlite_url, connect_args=connect_args)
+def is_sqlite(url: str) -> bool:
+    return make_url(url).get_backend_name() == "sqlite"
+
+
+def engine_options(url: str) -> dict:
+    """
+    Собрать параметры движка из настроек.
+
+    Args:
+        url (str): URL базы данных
+
+    Returns:
+        dict: Аргументы для create_engine / create_async_engine
+    """
+    options = {
+        "pool_pre_ping": settings.db_pool_pre_ping,
+        "pool_recycle": settings.db_pool_recycle,
+    }
+    if is_sqlite(url):
+        options["connect_args"] = {"check_same_thread": False}
+        if make_url(url).database in (None, "", ":memory:"):
+            return options
+    options.update(
+        pool_size=settings.db_pool_size,
+        max_overflow=settings.db_max_overflow,
+        pool_timeout=settings.db_pool_timeout,
+    )
+    return options
+
+
+def set_sqlite_pragmas(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.close()
+    # Драйвер sqlite3 сам открывает транзакцию только перед изменениями,
+    # поэтому чтения выполняются вне нее; BEGIN выдает begin_sqlite_transaction
+    dbapi_connection.isolation_level = None
+
+
+def begin_sqlite_transaction(conn):
+    """
+    Открыть транзакцию SQLite с режимом из опции выполнения sqlite_begin.
+
+    BEGIN IMMEDIATE сразу берет блокировку записи, поэтому проверки,
+    сделанные в транзакции, остаются верными до ее фиксации.
+    """
+    mode = conn.get_execution_options().get("sqlite_begin")
+    conn.exec_driver_sql(f"BEGIN {mode}" if mode else "BEGIN")
+
+
+def configure_sqlite(engine):
+    """Подключить к движку SQLite настройки соединения и управление транзакциями."""
+    event.listen(engine, "connect", set_sqlite_pragmas)
+    event.listen(engine, "begin", begin_sqlite_transaction)
+
+
+def to_async_url(url: str) -> str:
+    """
+    Заменить синхронный драйвер в URL базы на асинхронный.
+
+    Args:
+        url (str): URL для синхронного движка
+
+    Returns:
+        str: URL с драйвером aiosqlite для SQLite или asyncpg для Postgres
+    """
+    scheme, rest = url.split("://", 1)
+    dialect = scheme.split("+", 1)[0]
+    if dialect == "sqlite":
+        return f"sqlite+aiosqlite://{rest}"
+    if dialect in ("postgresql", "postgres"):
+        return f"postgresql+asyncpg://{rest}"
+    raise ValueError(f"No async driver configured for {dialect}")
+
+
+engine = create_engine(settings.database_url, **engine_options(settings.database_url))
+if is_sqlite(settings.database_url):
+    configure_sqlite(engine)
+
+async_engine = None
+if settings.async_db:
+    from sqlalchemy.ext.asyncio import create_async_engine
+    async_engine = create_async_engine(to_async_url(settings.database_url),
+                                       **engine_options(settings.database_url))
+    if is_sqlite(settings.database_url):
+        configure_sqlite(async_engine.sync_engine)
 
 def init_db():
-    SQLModel.metadata.create_all(engine)
\ No newline at end of file
+    SQLModel.metadata.create_all(engine)
+    migrate(engine)
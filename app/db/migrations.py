@@ -0,0 +1,98 @@
+from sqlalchemy import Engine, case, func, inspect, select, text
+from sqlalchemy.schema import CreateTable
+from sqlmodel import SQLModel
+from schemas import LEVEL_ORDER
+
+
+# Индексы, замененные более полными
+_OBSOLETE_INDEXES = [
+    ("request", "ix_request_receiver_id_status"),
+    ("request", "ix_request_sender_id_status"),
+]
+
+
+def _add_column(conn, table: str, column: str, ddl: str) -> bool:
+    columns = {c["name"] for c in inspect(conn).get_columns(table)}
+    if column in columns:
+        return False
+    conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {column} {ddl}"))
+    return True
+
+
+def _backfill_level_rank(conn):
+    dancer = SQLModel.metadata.tables["dancer"]
+    conn.execute(dancer.update().values(
+        level_rank=case(LEVEL_ORDER, value=func.upper(dancer.c.level), else_=0)
+    ))
+
+
+def _backfill_pair_members(conn):
+    pair = SQLModel.metadata.tables["pair"]
+    member = SQLModel.metadata.tables["pair_member"]
+    if conn.execute(select(func.count()).select_from(member)).scalar():
+        return
+    seen, rows = set(), []
+    # Если танцор уже попал в несколько пар, за ним остается самая ранняя
+    for pair_id, dancer1_id, dancer2_id in conn.execute(
+            select(pair.c.id, pair.c.dancer1_id, pair.c.dancer2_id).order_by(pair.c.id)):
+        for dancer_id in (dancer1_id, dancer2_id):
+            if dancer_id not in seen:
+                seen.add(dancer_id)
+                rows.append({"dancer_id": dancer_id, "pair_id": pair_id})
+    if rows:
+        conn.execute(member.insert(), rows)
+
+
+def _rebuild_with_autoincrement(conn, name: str):
+    # SQLite не умеет добавлять AUTOINCREMENT к существующей таблице, поэтому
+    # таблица пересоздается: новая копия под временным именем, перенос строк,
+    # затем старая удаляется, а копия переименовывается. Ссылки на таблицу
+    # из других таблиц при этом не меняются.
+    sql = conn.execute(text("SELECT sql FROM sqlite_master WHERE type = 'table' "
+                            "AND name = :name"), {"name": name}).scalar()
+    if sql is None or "AUTOINCREMENT" in sql.upper():
+        return
+    table = SQLModel.metadata.tables[name]
+    temporary = f"_{name}_rebuild"
+    quote = conn.dialect.identifier_preparer.quote
+    create = str(CreateTable(table).compile(dialect=conn.dialect)).strip()
+    conn.execute(text(create.replace(f"CREATE TABLE {quote(name)} (",
+                                     f"CREATE TABLE {temporary} (", 1)))
+    existing = {c["name"] for c in inspect(conn).get_columns(name)}
+    columns = ", ".join(c.name for c in table.columns if c.name in existing)
+    conn.execute(text(f"INSERT INTO {temporary} ({columns}) SELECT {columns} FROM {name}"))
+    # Индексы удаляются вместе с таблицей и создаются заново в migrate
+    conn.execute(text(f"DROP TABLE {name}"))
+    conn.execute(text(f"ALTER TABLE {temporary} RENAME TO {name}"))
+
+
+def migrate(engine: Engine):
+    """
+    Привести схему существующей базы к текущим моделям.
+
+    `create_all` создает только отсутствующие таблицы, поэтому новые колонки
+    добавляются и заполняются здесь, новые таблицы заполняются из уже
+    существующих данных, а индексы создаются, если их еще нет. На SQLite
+    таблицы dancer, request и pair без AUTOINCREMENT пересоздаются, чтобы
+    id удаленных строк не выдавались повторно.
+
+    Args:
+        engine (Engine): Движок базы данных
+    """
+    with engine.begin() as conn:
+        if _add_column(conn, "dancer", "level_rank", "INTEGER NOT NULL DEFAULT 0"):
+            _backfill_level_rank(conn)
+        _backfill_pair_members(conn)
+        for table in ("dancer", "request", "pair"):
+            _add_column(conn, table, "version", "INTEGER NOT NULL DEFAULT 1")
+        if conn.dialect.name == "sqlite":
+            for table in ("dancer", "request", "pair"):
+                _rebuild_with_autoincrement(conn, table)
+
+        for table, name in _OBSOLETE_INDEXES:
+            if name in {index["name"] for index in inspect(conn).get_indexes(table)}:
+                conn.execute(text(f"DROP INDEX {name}"))
+
+        for table in SQLModel.metadata.sorted_tables:
+            for index in table.indexes:
+                index.create(conn, checkfirst=True)
@@ -1,10 +1,64 @@
+from contextlib import asynccontextmanager
 from sqlmodel import Session
+from sqlmodel.ext.asyncio.session import AsyncSession
 from typing import Annotated
 from fastapi import Depends
-from db.db import engine
+from starlette.concurrency import run_in_threadpool
+from db.db import engine, async_engine
 
 def get_session():
     with Session(engine) as session:
         yield session
 
-SessionDep = Annotated[Session, Depends(get_session)]
\ No newline at end of file
+async def get_async_session():
+    async with AsyncSession(async_engine) as session:
+        yield session
+
+async def run_db(session, func):
+    """
+    Выполнить синхронную работу с сессией из асинхронного обработчика.
+
+    func(session) получает синхронную сессию: для AsyncSession работа идет
+    через run_sync, для обычной Session - в пуле потоков.
+    """
+    if isinstance(session, AsyncSession):
+        return await session.run_sync(func)
+    return await run_in_threadpool(func, session)
+
+@asynccontextmanager
+async def new_session_like(session):
+    """
+    Открыть новую сессию того же вида и на той же базе, что и session.
+
+    Нужна потоковым ответам: тело отдается уже после выхода из обработчика,
+    когда сессия из зависимости закрыта.
+
+    Args:
+        session (Session | AsyncSession): Сессия обработчика
+    """
+    if isinstance(session, AsyncSession):
+        async with AsyncSession(session.bind) as new_session:
+            yield new_session
+    else:
+        with Session(session.bind) as new_session:
+            yield new_session
+
+def begin_write(session: Session):
+    """
+    Начать транзакцию записи, в которой проверки и изменения атомарны.
+
+    На SQLite транзакция открывается через BEGIN IMMEDIATE и сразу берет
+    блокировку записи. На Postgres нужные строки блокируются самим
+    обработчиком через SELECT ... FOR UPDATE (with_for_update).
+    Уже открытая транзакция чтения (например, от проверки токена)
+    фиксируется.
+
+    Args:
+        session (Session): Сессия базы данных
+    """
+    if session.in_transaction():
+        session.commit()
+    session.connection(execution_options={"sqlite_begin": "IMMEDIATE"})
+
+SessionDep = Annotated[Session, Depends(get_session)]
+AsyncSessionDep = Annotated[AsyncSession, Depends(get_async_session)]
@@ -0,0 +1,84 @@
+from typing import Annotated
+from fastapi import Header, Response
+from fastapi.responses import JSONResponse
+from cache import TTLCache
+from config import settings
+from serialization import FastJSONResponse
+
+IfNoneMatchHeader = Annotated[str | None, Header(
+    description="ETag ранее полученного ответа; если он не изменился, ответ будет 304")]
+
+# Сериализованные ответы по (тип ресурса, id): (ETag, тело)
+response_cache = TTLCache(maxsize=max(settings.response_cache_size, 1))
+
+
+def make_etag(resource_id: int, *versions: int) -> str:
+    """
+    Построить слабый ETag ресурса из версий его строк.
+
+    Args:
+        resource_id (int): ID ресурса
+        *versions (int): Версии строк, из которых собран ответ
+
+    Returns:
+        str: ETag вида W/"id-v1.v2"
+    """
+    return f'W/"{resource_id}-{".".join(str(version) for version in versions)}"'
+
+
+def etag_matches(if_none_match: str | None, etag: str) -> bool:
+    """Совпадает ли ETag с одним из значений If-None-Match (слабое сравнение)."""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    opaque = etag.removeprefix("W/")
+    return any(tag.strip().removeprefix("W/") == opaque for tag in if_none_match.split(","))
+
+
+def conditional_response(if_none_match: str | None, key: tuple, etag: str, render) -> Response:
+    """
+    Ответить на GET ресурса с учетом If-None-Match и кэша ответов.
+
+    Если клиент прислал текущий ETag, возвращается 304 без тела. Иначе
+    тело берется из кэша, если оно сохранено для этого же ETag, и только
+    в остальных случаях ресурс сериализуется: в режиме fast_json через
+    FastJSONResponse, иначе обычным JSONResponse.
+
+    Args:
+        if_none_match (str | None): Значение заголовка If-None-Match
+        key (tuple): Ключ ресурса в кэше, например ("dancer", 5)
+        etag (str): Текущий ETag прочитанного ресурса
+        render: Функция без аргументов, возвращающая JSON-совместимое
+            содержимое ответа
+
+    Returns:
+        Response: 304 или JSON-ответ с заголовком ETag
+    """
+    if etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers={"ETag": etag})
+    if settings.response_cache_size > 0:
+        cached = response_cache.get(key)
+        if cached is not None and cached[0] == etag:
+            return Response(content=cached[1], media_type="application/json",
+                            headers={"ETag": etag})
+    response_class = FastJSONResponse if settings.fast_json else JSONResponse
+    response = response_class(content=render(), headers={"ETag": etag})
+    if settings.response_cache_size > 0:
+        response_cache.set(key, (etag, response.body))
+    return response
+
+
+def invalidate_responses(kind: str, *resource_ids: int):
+    """
+    Удалить сохраненные ответы измененных или удаленных ресурсов.
+
+    Устаревший ответ и так не отдается, потому что его ETag не совпадет
+    с текущим; удаление лишь освобождает место в кэше.
+
+    Args:
+        kind (str): Тип ресурса: "dancer", "request" или "pair"
+        *resource_ids (int): ID ресурсов
+    """
+    for resource_id in resource_ids:
+        response_cache.pop((kind, resource_id))
@@ -0,0 +1,207 @@
+import codecs
+import csv
+import io
+import json
+from fastapi import HTTPException, status
+from pydantic import ValidationError
+
+CSV_TYPES = ("text/csv", "application/csv")
+NDJSON_TYPES = ("application/x-ndjson", "application/ndjson", "application/jsonl",
+                "application/json-lines")
+# Пределы одной записи CSV из нескольких строк (поле в кавычках с переводами строк)
+CSV_MAX_RECORD_LINES = 100
+CSV_MAX_RECORD_BYTES = 64 * 1024
+
+
+async def iter_lines(stream):
+    """
+    Разбить поток байтов тела запроса на строки по мере поступления.
+
+    Метка порядка байтов UTF-8 в начале первой строки отбрасывается.
+
+    Args:
+        stream: Асинхронный итератор кусков тела (request.stream())
+
+    Yields:
+        tuple: (номер строки в файле с 1, байты строки без перевода строки)
+    """
+    buffer = b""
+    line_number = 0
+    async for chunk in stream:
+        buffer += chunk
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            line_number += 1
+            yield line_number, _strip_bom(line, line_number)
+    if buffer:
+        line_number += 1
+        yield line_number, _strip_bom(buffer, line_number)
+
+
+def _strip_bom(line: bytes, line_number: int) -> bytes:
+    if line_number == 1 and line.startswith(codecs.BOM_UTF8):
+        return line[len(codecs.BOM_UTF8):]
+    return line
+
+
+class _CsvRecords:
+    """
+    Сборка физических строк в записи CSV.
+
+    Поле в кавычках может содержать переводы строк: строки объединяются,
+    пока число кавычек в записи нечетное (экранированная кавычка "" не
+    меняет четность). Одиночная кавычка внутри поля без кавычек тоже
+    делает число нечетным, поэтому объединение ограничено
+    CSV_MAX_RECORD_LINES строками и CSV_MAX_RECORD_BYTES байтами. Если
+    предел достигнут или объединенная запись разбирается в несколько
+    строк CSV, первая строка отклоняется, а остальные разбираются заново.
+    """
+
+    def __init__(self):
+        self._parts: list[tuple[int, bytes]] = []
+        self._quotes = 0
+        self._size = 0
+
+    def feed(self, line_number: int, line: bytes) -> list[tuple]:
+        """Добавить строку; вернуть готовые записи (номер строки, значения или ошибка)."""
+        if not self._parts and not line.strip():
+            return []
+        self._parts.append((line_number, line))
+        self._quotes += line.count(b'"')
+        self._size += len(line)
+        if self._quotes % 2 == 0:
+            return self._complete()
+        if len(self._parts) >= CSV_MAX_RECORD_LINES or self._size >= CSV_MAX_RECORD_BYTES:
+            return self._reject("Unbalanced quote: record is too long")
+        return []
+
+    def finish(self) -> list[tuple]:
+        """Вернуть последнюю запись в конце тела."""
+        return self._complete() if self._parts else []
+
+    def _complete(self) -> list[tuple]:
+        values = _parse_csv_record(b"\n".join(line for _, line in self._parts))
+        if isinstance(values, list) and len(values) != 1:
+            return self._reject("Unbalanced quote")
+        records = [(self._parts[0][0], values[0] if isinstance(values, list) else values)]
+        self._reset()
+        return records
+
+    def _reject(self, message: str) -> list[tuple]:
+        (line_number, _), *rest = self._parts
+        self._reset()
+        records = [(line_number, ValueError(message))]
+        for number, line in rest:
+            records.extend(self.feed(number, line))
+        return records
+
+    def _reset(self):
+        self._parts, self._quotes, self._size = [], 0, 0
+
+
+async def iter_csv_rows(lines):
+    """
+    Собрать физические строки в записи CSV (см. _CsvRecords).
+
+    Пустые строки вне записи пропускаются.
+
+    Args:
+        lines: Асинхронный итератор из iter_lines
+
+    Yields:
+        tuple: (номер первой строки записи, список значений или ошибка разбора)
+    """
+    records = _CsvRecords()
+    async for line_number, line in lines:
+        for record in records.feed(line_number, line):
+            yield record
+    for record in records.finish():
+        yield record
+
+
+def _parse_csv_record(record: bytes):
+    try:
+        return list(csv.reader(io.StringIO(record.decode("utf-8").rstrip("\r"), newline=""),
+                               strict=True))
+    except (UnicodeDecodeError, csv.Error) as e:
+        return e
+
+
+async def iter_records(stream, content_type: str):
+    """
+    Читать записи CSV (с заголовком) или NDJSON из потока тела запроса.
+
+    Тело читается в UTF-8 (метка порядка байтов допускается). Строка с
+    некорректными байтами становится ошибкой этой записи.
+
+    Args:
+        stream: Асинхронный итератор кусков тела
+        content_type (str): Заголовок Content-Type запроса
+
+    Raises:
+        HTTPException: 415 если формат не поддерживается
+        HTTPException: 400 если заголовок CSV не удалось разобрать
+
+    Yields:
+        tuple: (номер строки в файле, запись dict или ошибка разбора)
+    """
+    media_type = content_type.split(";", 1)[0].strip().lower()
+    lines = iter_lines(stream)
+    if media_type in CSV_TYPES:
+        header = None
+        async for line_number, values in iter_csv_rows(lines):
+            if header is None:
+                if isinstance(values, Exception):
+                    raise HTTPException(
+                        status_code=status.HTTP_400_BAD_REQUEST,
+                        detail=f"Invalid CSV header: {values}"
+                    )
+                header = [name.strip() for name in values]
+                continue
+            if isinstance(values, Exception):
+                yield line_number, values
+                continue
+            if len(values) != len(header):
+                yield line_number, ValueError(f"Expected {len(header)} columns, got {len(values)}")
+                continue
+            # Пустые ячейки CSV означают отсутствие значения
+            yield line_number, {name: value if value != "" else None
+                                for name, value in zip(header, values)}
+    elif media_type in NDJSON_TYPES:
+        async for line_number, line in lines:
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line.decode("utf-8"))
+            except ValueError as e:
+                yield line_number, e
+                continue
+            if not isinstance(record, dict):
+                yield line_number, ValueError("Expected a JSON object")
+                continue
+            yield line_number, record
+    else:
+        raise HTTPException(
+            status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
+            detail="Expected text/csv or application/x-ndjson body"
+        )
+
+
+def validate_record(model, record):
+    """
+    Проверить запись по модели.
+
+    Args:
+        model: Модель SQLModel
+        record (dict | Exception): Запись или ошибка разбора
+
+    Returns:
+        tuple: (объект модели, None) или (None, список ошибок)
+    """
+    if isinstance(record, Exception):
+        return None, [{"loc": [], "msg": str(record)}]
+    try:
+        return model.model_validate(record), None
+    except ValidationError as e:
+        return None, [{"loc": list(error["loc"]), "msg": error["msg"]}
+                      for error in e.errors(include_url=False)]
@@ -1,26 +1,76 @@
 from fastapi import FastAPI
-from db.db import init_db
+from config import settings
+from db.db import init_db, engine, async_engine
+from passwords import shutdown_pool
+from auth_handler import get_current_user, get_current_user_async
 from routes import (dancers,
                     requests,
                     pairs,
                     auth,
-                    recomendations)
-
-app = FastAPI(title="FastAPI dancers' matcher",
-              description="This server allows dancres to find pair for ballroom dancing.",
-              version="1.0.0",
-              contact={
-               'name': 'Andrew Pervunetskikh',
-               'url': 'https://github.com/Pandnak',
-               'email': 'pervunetskikh.aa@phystech.edu'   
-              })
-
-app.include_router(dancers.app)
-app.include_router(requests.app)
-app.include_router(pairs.app)
-app.include_router(auth.app)
-app.include_router(recomendations.app)
-
-@app.on_event("startup")
+                    recomendations,
+                    notifications,
+                    monitoring)
+from routes.async_router import to_async_router
+from recommender.precompute import worker
+from monitoring import MetricsMiddleware, instrument_engine
+
+def create_app(async_db: bool = settings.async_db) -> FastAPI:
+    """
+    Собрать приложение со всеми роутерами.
+
+    Args:
+        async_db (bool): Обслуживать запросы асинхронными обработчиками
+            через AsyncSession (по умолчанию - настройка ASYNC_DB)
+
+    Returns:
+        FastAPI: Приложение
+    """
+    app = FastAPI(title="FastAPI dancers' matcher",
+                  description="This server allows dancres to find pair for ballroom dancing.",
+                  version="1.0.0",
+                  contact={
+                   'name': 'Andrew Pervunetskikh',
+                   'url': 'https://github.com/Pandnak',
+                   'email': 'pervunetskikh.aa@phystech.edu'   
+                  })
+
+    routers = [dancers.app,
+               requests.app,
+               pairs.app,
+               auth.app,
+               recomendations.app,
+               notifications.app,
+               monitoring.app]
+
+    if async_db:
+        routers = [to_async_router(router) for router in routers]
+        app.dependency_overrides[get_current_user] = get_current_user_async
+
+    if settings.metrics_enabled or settings.slow_query_ms is not None:
+        instrument_engine(engine)
+        if async_engine is not None:
+            instrument_engine(async_engine.sync_engine)
+        app.add_middleware(MetricsMiddleware)
+    if settings.metrics_enabled:
+        routers.append(monitoring.metrics_app)
+
+    for router in routers:
+        app.include_router(router)
+
+    app.add_event_handler("startup", on_startup)
+    app.add_event_handler("shutdown", on_shutdown)
+    return app
+
+
 def on_startup():
     init_db()
+    if settings.precompute_enabled:
+        worker.start(engine)
+
+
+def on_shutdown():
+    worker.stop()
+    shutdown_pool()
+
+
+app = create_app()
@@ -1,46 +1,100 @@
 from datetime import datetime
-from sqlmodel import Field, SQLModel
+from sqlalchemy import Index, event
+from sqlalchemy.orm import object_session
+from sqlmodel import Field, SQLModel, Relationship
 from pydantic import EmailStr, BaseModel
 from pydantic_settings import SettingsConfigDict
-from schemas import (Sex, StatusType, RequestStatus, UserType)
+from schemas import (RequestStatus, UserType, DancerBase, DancerResponse, get_level_value)
 
-class Dancer(SQLModel, table=True):
+class Dancer(DancerBase, table=True):
     __tablename__ = "dancer"
+    __table_args__ = (
+        Index("ix_dancer_style_sex_status_level_rank",
+              "style", "sex", "status", "level_rank"),
+        # id не переиспользуется после удаления: иначе новая строка получила
+        # бы ETag удаленной (W/"id-1")
+        {"sqlite_autoincrement": True},
+    )
 
     id: int | None = Field(default=None, primary_key=True)
-    name: str = Field(index=True)
-    sex: Sex = "MALE"
-    age: int | None = Field(default=None, index=True)
-    height: float | None = Field(default=None, index=True)
-    secret_name: str 
-    style: str | None = None
-    level: str | None = None
-    status: StatusType = "IN_SEARCH"
+    # Числовое значение level из LEVEL_ORDER, поддерживается автоматически;
+    # служебная колонка, в API не принимается и не отдается
+    level_rank: int = Field(default=0)
+    # Версия строки, растет при каждом изменении; из нее строится ETag.
+    # Управляется сервером: в DancerCreate и DancerUpdate ее нет
+    version: int = Field(default=1)
     # user_id: int = Field(default=None, foreign_key="user.id")
 
 
+@event.listens_for(Dancer, "before_insert")
+@event.listens_for(Dancer, "before_update")
+def _sync_level_rank(mapper, connection, target):
+    target.level_rank = get_level_value(target.level)
+
+
 class Request(SQLModel, table=True):
     __tablename__ = "request"
+    __table_args__ = (
+        # Входящие и исходящие запросы танцора по статусу, от новых к старым
+        Index("ix_request_receiver_status_created",
+              "receiver_id", "status", "created_at", "id"),
+        Index("ix_request_sender_status_created",
+              "sender_id", "status", "created_at", "id"),
+        {"sqlite_autoincrement": True},
+    )
 
     id: int | None = Field(default=None, primary_key=True)
     sender_id: int = Field(foreign_key="dancer.id")
     receiver_id: int = Field(foreign_key="dancer.id")
     status: RequestStatus = Field(default=RequestStatus.PENDING)
     created_at: datetime = Field(default_factory=datetime.utcnow)
+    version: int = Field(default=1)
 
 
 class Pair(SQLModel, table=True):
     __tablename__ = "pair"
+    __table_args__ = {"sqlite_autoincrement": True}
 
     id: int | None = Field(default=None, primary_key=True)
-    dancer1_id: int = Field(foreign_key="dancer.id")
-    dancer2_id: int = Field(foreign_key="dancer.id")
+    dancer1_id: int = Field(foreign_key="dancer.id", index=True)
+    dancer2_id: int = Field(foreign_key="dancer.id", index=True)
     created_at: datetime = Field(default_factory=datetime.utcnow)
+    version: int = Field(default=1)
+
+    dancer1: Dancer = Relationship(
+        sa_relationship_kwargs={"foreign_keys": "[Pair.dancer1_id]"})
+    dancer2: Dancer = Relationship(
+        sa_relationship_kwargs={"foreign_keys": "[Pair.dancer2_id]"})
+
+
+@event.listens_for(Dancer, "before_update")
+@event.listens_for(Request, "before_update")
+@event.listens_for(Pair, "before_update")
+def _bump_version(mapper, connection, target):
+    # before_update вызывается и для объектов без реальных изменений
+    if object_session(target).is_modified(target, include_collections=False):
+        target.version = (target.version or 0) + 1
+
+class PairMember(SQLModel, table=True):
+    __tablename__ = "pair_member"
+
+    # Танцор может состоять только в одной паре: dancer_id - первичный ключ
+    dancer_id: int = Field(foreign_key="dancer.id", primary_key=True, ondelete="CASCADE")
+    pair_id: int = Field(foreign_key="pair.id", index=True, ondelete="CASCADE")
+
+
+class Recommendation(SQLModel, table=True):
+    __tablename__ = "recommendation"
+
+    # Предрассчитанный список KNN танцора, заполняется фоновым обработчиком
+    dancer_id: int = Field(foreign_key="dancer.id", primary_key=True, ondelete="CASCADE")
+    rank: int = Field(primary_key=True)
+    candidate_id: int = Field(foreign_key="dancer.id", index=True, ondelete="CASCADE")
 
 class PairResponse(SQLModel):
     id: int
-    dancer1: Dancer
-    dancer2: Dancer
+    dancer1: DancerResponse
+    dancer2: DancerResponse
     created_at: datetime
 
 class User(SQLModel, table=True):
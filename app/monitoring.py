@@ -0,0 +1,447 @@
+import itertools
+import logging
+import os
+import sys
+import threading
+import time
+from bisect import bisect_left
+from collections import Counter, defaultdict, deque
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from sqlalchemy import event
+from starlette.concurrency import run_in_threadpool
+from config import settings
+
+# Границы бакетов гистограмм длительности, секунды
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# Границы бакетов числа SQL-запросов на HTTP-запрос
+STATEMENT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+PROFILE_HEADER = "x-profile"
+PROFILE_REPORT_HEADER = "X-Profile-Report"
+
+_APP_ROOT = os.path.dirname(os.path.abspath(__file__))
+
+logger = logging.getLogger(__name__)
+
+
+class RequestStats:
+    """SQL-запросы одного HTTP-запроса: число и суммарное время."""
+
+    __slots__ = ("scope", "statements", "db_seconds")
+
+    def __init__(self, scope: dict | None = None):
+        # ASGI scope запроса; маршрут появляется в нем после маршрутизации
+        self.scope = scope
+        self.statements = 0
+        self.db_seconds = 0.0
+
+
+# Статистика текущего HTTP-запроса. Пулы потоков и run_sync выполняются в
+# копии контекста, поэтому обработчики видят тот же объект, что и middleware
+current_request: ContextVar[RequestStats | None] = ContextVar("current_request", default=None)
+
+
+class Histogram:
+    """
+    Гистограмма в формате Prometheus: накопительные счетчики по бакетам.
+
+    Args:
+        buckets (tuple): Верхние границы бакетов по возрастанию
+    """
+
+    def __init__(self, buckets: tuple):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def lines(self, name: str, labels: str) -> list[str]:
+        lines = []
+        cumulative = 0
+        for bound, count in zip((*self.buckets, "+Inf"), self.counts):
+            cumulative += count
+            lines.append(f'{name}_bucket{{{labels},le="{bound}"}} {cumulative}')
+        lines.append(f"{name}_sum{{{labels}}} {self.sum}")
+        lines.append(f"{name}_count{{{labels}}} {self.count}")
+        return lines
+
+
+class Metrics:
+    """
+    Метрики HTTP-запросов и базы данных процесса.
+
+    Маршрут берется шаблоном пути (/dancers/{dancer_id}), а не самим путем,
+    поэтому число рядов не растет с числом объектов.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._requests: Counter = Counter()
+        self._latency: dict = defaultdict(lambda: Histogram(LATENCY_BUCKETS))
+        self._statements: dict = defaultdict(lambda: Histogram(STATEMENT_BUCKETS))
+        self._db_time: dict = defaultdict(lambda: Histogram(LATENCY_BUCKETS))
+        self.db_statements = 0
+        self.db_seconds = 0.0
+
+    def observe_request(self, method: str, route: str, status: int,
+                        seconds: float, stats: RequestStats):
+        """
+        Учесть завершенный HTTP-запрос.
+
+        Args:
+            method (str): HTTP-метод
+            route (str): Шаблон пути маршрута
+            status (int): Код ответа
+            seconds (float): Длительность запроса
+            stats (RequestStats): SQL-запросы, выполненные при обработке
+        """
+        key = (method, route)
+        with self._lock:
+            self._requests[(method, route, status)] += 1
+            self._latency[key].observe(seconds)
+            self._statements[key].observe(stats.statements)
+            self._db_time[key].observe(stats.db_seconds)
+
+    def observe_statement(self, seconds: float):
+        with self._lock:
+            self.db_statements += 1
+            self.db_seconds += seconds
+
+    def render(self) -> str:
+        """Все метрики в текстовом формате Prometheus."""
+        lines = []
+        with self._lock:
+            lines += ["# HELP http_requests_total HTTP requests by route and status.",
+                      "# TYPE http_requests_total counter"]
+            for (method, route, status), count in sorted(self._requests.items()):
+                lines.append(f'http_requests_total{{method="{method}",route="{route}",'
+                             f'status="{status}"}} {count}')
+            for name, help_text, histograms in (
+                ("http_request_duration_seconds", "HTTP request latency.", self._latency),
+                ("http_request_db_statements", "SQL statements per HTTP request.", self._statements),
+                ("http_request_db_seconds", "Time in SQL statements per HTTP request.", self._db_time),
+            ):
+                lines += [f"# HELP {name} {help_text}", f"# TYPE {name} histogram"]
+                for (method, route), histogram in sorted(histograms.items()):
+                    lines += histogram.lines(name, f'method="{method}",route="{route}"')
+            lines += ["# HELP db_statements_total SQL statements executed by the process.",
+                      "# TYPE db_statements_total counter",
+                      f"db_statements_total {self.db_statements}",
+                      "# HELP db_seconds_total Time spent in SQL statements.",
+                      "# TYPE db_seconds_total counter",
+                      f"db_seconds_total {self.db_seconds}"]
+        return "\n".join(lines) + "\n"
+
+
+metrics = Metrics()
+
+
+def _display(value):
+    # Параметры для просмотра: JSON-совместимые и ограниченной длины
+    if isinstance(value, (list, tuple)):
+        items = [_display(item) for item in value[:20]]
+        return items + ["..."] if len(value) > 20 else items
+    if isinstance(value, dict):
+        return {str(key): _display(item) for key, item in value.items()}
+    if value is None or isinstance(value, (bool, int, float)):
+        return value
+    text = str(value)
+    return text if len(text) <= 200 else text[:200] + "..."
+
+
+class SlowQueryLog:
+    """
+    Кольцевой буфер последних медленных SQL-запросов.
+
+    Запрос попадает в буфер, если выполнялся дольше SLOW_QUERY_MS
+    миллисекунд; при переполнении вытесняются самые старые записи. Вместе
+    с текстом сохраняются параметры и маршрут, из которого выполнен запрос.
+    Параметры могут содержать хэши паролей и личные данные, поэтому в журнал
+    пишется только текст запроса, а параметры хранятся в закрытых полях
+    записи. План (EXPLAIN) строится только по требованию и запоминается в записи.
+
+    Args:
+        maxsize (int): Число хранимых записей
+    """
+
+    def __init__(self, maxsize: int):
+        self._entries: deque = deque(maxlen=maxsize)
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self.recorded = 0
+
+    def record(self, statement: str, parameters, executemany: bool, dialect: str,
+               seconds: float, stats: RequestStats | None):
+        """
+        Сохранить медленный запрос.
+
+        Args:
+            statement (str): SQL в виде, переданном драйверу
+            parameters: Параметры драйвера (для executemany - список наборов)
+            executemany (bool): Выполнялся ли запрос с несколькими наборами
+            dialect (str): Диалект базы, например sqlite или postgresql
+            seconds (float): Длительность запроса
+            stats (RequestStats | None): HTTP-запрос, из которого выполнен
+                SQL-запрос; None для фоновой работы
+        """
+        scope = stats.scope if stats is not None and stats.scope is not None else {}
+        endpoint = scope.get("endpoint")
+        entry = {
+            "id": next(self._ids),
+            "at": datetime.now(timezone.utc).isoformat(),
+            "duration_ms": seconds * 1000,
+            "route": f"{scope['method']} {_route_name(scope)}" if scope else None,
+            "endpoint": getattr(endpoint, "__name__", None),
+            "statement": statement,
+            "executemany": executemany,
+            "dialect": dialect,
+            "explain": None,
+            # Параметры отдаются только администратору по явному запросу
+            "_display_parameters": _display(parameters),
+            # Исходные параметры для EXPLAIN, наружу не отдаются
+            "_parameters": parameters[0] if executemany and parameters else parameters,
+        }
+        with self._lock:
+            self._entries.append(entry)
+            self.recorded += 1
+        logger.warning("Slow query %.1f ms in %s (%s): %s", entry["duration_ms"],
+                       entry["endpoint"] or "background", entry["route"],
+                       statement[:1000])
+
+    def entries(self, limit: int | None = None) -> list[dict]:
+        """Записи от новых к старым."""
+        with self._lock:
+            entries = list(reversed(self._entries))
+        return entries[:limit] if limit is not None else entries
+
+    def explain(self, entry: dict, connection) -> list[str]:
+        """
+        Построить план запроса записи, если его еще нет.
+
+        EXPLAIN не выполняет сам запрос. Для SQLite используется
+        EXPLAIN QUERY PLAN, для остальных баз - EXPLAIN. Каждый EXPLAIN
+        выполняется в точке сохранения: ошибка на Postgres иначе прервала
+        бы всю транзакцию соединения.
+
+        Args:
+            entry (dict): Запись буфера
+            connection: Соединение SQLAlchemy с той же базой
+
+        Returns:
+            list[str]: Строки плана или описание ошибки
+        """
+        if entry["explain"] is not None:
+            return entry["explain"]
+        if connection.dialect.name != entry["dialect"]:
+            plan = [f"EXPLAIN needs a {entry['dialect']} connection"]
+        else:
+            prefix = "EXPLAIN QUERY PLAN" if entry["dialect"] == "sqlite" else "EXPLAIN"
+            try:
+                with connection.begin_nested():
+                    rows = connection.exec_driver_sql(f"{prefix} {entry['statement']}",
+                                                      entry["_parameters"])
+                    plan = [" | ".join(str(value) for value in row) for row in rows]
+            except Exception as e:
+                plan = [f"EXPLAIN failed: {e}"]
+        entry["explain"] = plan
+        return plan
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"size": len(self._entries), "maxsize": self._entries.maxlen,
+                    "recorded": self.recorded}
+
+
+slow_queries = SlowQueryLog(settings.slow_query_log_size)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    context._monitoring_started = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    seconds = time.perf_counter() - context._monitoring_started
+    metrics.observe_statement(seconds)
+    stats = current_request.get()
+    if stats is not None:
+        stats.statements += 1
+        stats.db_seconds += seconds
+    if settings.slow_query_ms is not None and seconds * 1000 >= settings.slow_query_ms:
+        slow_queries.record(statement, parameters, executemany, conn.dialect.name,
+                            seconds, stats)
+
+
+def instrument_engine(engine):
+    """
+    Считать SQL-запросы движка и их время, записывать медленные запросы.
+
+    Args:
+        engine: Синхронный движок (для AsyncEngine - его sync_engine)
+    """
+    if not event.contains(engine, "before_cursor_execute", _before_cursor_execute):
+        event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+
+
+class SamplingProfiler:
+    """
+    Профилировщик одного запроса по выборкам стеков.
+
+    Фоновый поток раз в interval секунд снимает стеки всех потоков через
+    sys._current_frames и оставляет те, в которых есть код приложения, -
+    так попадают и обработчики в пуле потоков, и асинхронные. Запросы,
+    идущие одновременно с профилируемым, тоже попадают в выборку.
+
+    Args:
+        interval (float): Период выборки, секунды
+    """
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self.samples: Counter = Counter()
+        self.seconds = 0.0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="request-profiler", daemon=True)
+
+    def __enter__(self):
+        self._started = time.perf_counter()
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stop.set()
+        self._thread.join()
+        self.seconds = time.perf_counter() - self._started
+
+    def _run(self):
+        own = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own:
+                    continue
+                stack = []
+                while frame is not None:
+                    stack.append(frame.f_code)
+                    frame = frame.f_back
+                if any(code.co_filename.startswith(_APP_ROOT)
+                       and not code.co_filename.endswith("monitoring.py") for code in stack):
+                    self.samples[tuple(reversed(stack))] += 1
+
+    @staticmethod
+    def _name(code) -> str:
+        filename = code.co_filename
+        if filename.startswith(_APP_ROOT):
+            filename = os.path.relpath(filename, _APP_ROOT)
+        else:
+            filename = os.path.basename(filename)
+        return f"{code.co_name} ({filename}:{code.co_firstlineno})"
+
+    def report(self, title: str, limit: int = 40) -> str:
+        """
+        Текстовый отчет: функции по числу выборок и свернутые стеки.
+
+        Свернутые стеки ("a;b;c N") открываются в speedscope и flamegraph.pl.
+        """
+        total = sum(self.samples.values())
+        cumulative, own = Counter(), Counter()
+        for stack, count in self.samples.items():
+            for code in set(stack):
+                cumulative[code] += count
+            own[stack[-1]] += count
+
+        lines = [f"{title}: {self.seconds * 1000:.1f} ms, {total} samples "
+                 f"every {self.interval * 1000:.1f} ms", "",
+                 f"{'total':>7} {'self':>7}  function"]
+        for code, count in cumulative.most_common(limit):
+            lines.append(f"{count / total:7.1%} {own[code] / total:7.1%}  {self._name(code)}")
+        lines += ["", "# collapsed stacks"]
+        for stack, count in self.samples.most_common():
+            lines.append(";".join(self._name(code) for code in stack) + f" {count}")
+        return "\n".join(lines) + "\n"
+
+
+def _route_name(scope) -> str:
+    route = scope.get("route")
+    return getattr(route, "path", None) or "unmatched"
+
+
+class MetricsMiddleware:
+    """
+    ASGI middleware: длительность, SQL-запросы и время в базе по маршрутам.
+
+    Длительность запроса считается до начала ответа (http.response.start),
+    поэтому потоковые ответы (SSE, StreamingResponse) не учитываются как
+    медленные на все время жизни потока. В ответ добавляется заголовок Server-Timing с временем обработки и
+    временем в базе до начала ответа. Запрос с заголовком X-Profile,
+    равным PROFILE_TOKEN, профилируется SamplingProfiler, а отчет
+    записывается в PROFILE_DIR; имя файла возвращается в X-Profile-Report.
+    Отчет собирается и пишется в пуле потоков, не блокируя event loop.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    def _profile_path(self, scope) -> str | None:
+        if not settings.profile_token:
+            return None
+        headers = dict(scope.get("headers") or [])
+        if headers.get(PROFILE_HEADER.encode()) != settings.profile_token.encode():
+            return None
+        return os.path.join(settings.profile_dir, f"profile-{time.time_ns()}.txt")
+
+    @staticmethod
+    def _write_profile(profiler: SamplingProfiler, path: str, title: str):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w") as f:
+            f.write(profiler.report(title))
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = RequestStats(scope)
+        token = current_request.set(stats)
+        profile_path = self._profile_path(scope)
+        started = time.perf_counter()
+        status = 500
+        duration = None
+
+        async def send_with_timing(message):
+            nonlocal status, duration
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                duration = time.perf_counter() - started
+                elapsed = duration * 1000
+                headers = list(message.get("headers", []))
+                headers.append((b"server-timing",
+                                f'app;dur={elapsed:.1f}, db;dur={stats.db_seconds * 1000:.1f};'
+                                f'desc="{stats.statements} statements"'.encode()))
+                if profile_path is not None:
+                    headers.append((PROFILE_REPORT_HEADER.lower().encode(),
+                                    os.path.basename(profile_path).encode()))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        profiler = SamplingProfiler(settings.profile_interval) if profile_path else None
+        try:
+            if profiler is not None:
+                with profiler:
+                    await self.app(scope, receive, send_with_timing)
+            else:
+                await self.app(scope, receive, send_with_timing)
+        finally:
+            current_request.reset(token)
+            if duration is None:
+                duration = time.perf_counter() - started
+            metrics.observe_request(scope["method"], _route_name(scope), status,
+                                    duration, stats)
+            if profiler is not None:
+                await run_in_threadpool(self._write_profile, profiler, profile_path,
+                                        f"{scope['method']} {scope['path']}")
@@ -0,0 +1,165 @@
+import abc
+import asyncio
+import threading
+from collections import defaultdict
+from config import settings
+
+
+class Subscription:
+    """
+    Подписка одного соединения на события танцора.
+
+    События складываются в ограниченную очередь на event loop соединения.
+    Если клиент не успевает их забирать, самые старые события
+    отбрасываются, а перед следующим отдается событие "resync" с числом
+    пропущенных: клиенту нужно перечитать состояние через REST.
+
+    Args:
+        dancer_id (int): ID танцора, на события которого оформлена подписка
+        maxsize (int): Максимальная длина очереди событий
+    """
+
+    def __init__(self, dancer_id: int, maxsize: int):
+        self.dancer_id = dancer_id
+        self.loop = asyncio.get_running_loop()
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize)
+        self.missed = 0
+
+    def put(self, event: dict):
+        """Положить событие в очередь; вызывается только на loop соединения."""
+        if self.queue.full():
+            self.queue.get_nowait()
+            self.missed += 1
+        self.queue.put_nowait(event)
+
+    async def get(self) -> dict:
+        """Дождаться следующего события."""
+        if self.missed:
+            missed, self.missed = self.missed, 0
+            return {"type": "resync", "missed": missed}
+        return await self.queue.get()
+
+
+class Broker(abc.ABC):
+    """
+    Интерфейс доставки событий между процессами приложения.
+
+    Обработчики публикуют события через брокер, а брокер каждого процесса
+    передает все события своему хабу (функция deliver). Для нескольких
+    процессов uvicorn нужна реализация поверх внешней шины (например,
+    Redis pub/sub), в одном процессе достаточно LocalBroker.
+    """
+
+    @abc.abstractmethod
+    def start(self, deliver):
+        """
+        Начать передавать события хабу.
+
+        Args:
+            deliver: Функция deliver(dancer_ids, event) хаба
+        """
+
+    @abc.abstractmethod
+    def publish(self, dancer_ids: list[int], event: dict):
+        """Отправить событие танцорам во всех процессах."""
+
+    @abc.abstractmethod
+    def stop(self):
+        """Перестать передавать события."""
+
+
+class LocalBroker(Broker):
+    """Брокер в памяти процесса: события сразу передаются своему хабу."""
+
+    def __init__(self):
+        self._deliver = None
+
+    def start(self, deliver):
+        self._deliver = deliver
+
+    def publish(self, dancer_ids: list[int], event: dict):
+        if self._deliver is not None:
+            self._deliver(dancer_ids, event)
+
+    def stop(self):
+        self._deliver = None
+
+
+class NotificationHub:
+    """
+    Раздача событий о запросах и парах открытым соединениям танцоров.
+
+    Подписки хранятся по ID танцора, поэтому событие обходит только
+    соединения его адресатов. Публикация не ждет клиентов: событие
+    передается на event loop каждого соединения через call_soon_threadsafe,
+    и публиковать можно как из потоков синхронных обработчиков, так и с
+    самого event loop.
+
+    Args:
+        broker (Broker): Брокер между процессами
+        queue_size (int): Длина очереди событий одного соединения
+    """
+
+    def __init__(self, broker: Broker, queue_size: int):
+        self.broker = broker
+        self.queue_size = queue_size
+        self._subscriptions: dict[int, set] = defaultdict(set)
+        self._lock = threading.Lock()
+        self.published = 0
+        self.delivered = 0
+        broker.start(self.deliver)
+
+    def subscribe(self, dancer_id: int) -> Subscription:
+        """Подписать соединение на события танцора; вызывается на event loop."""
+        subscription = Subscription(dancer_id, self.queue_size)
+        with self._lock:
+            self._subscriptions[dancer_id].add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        """Отменить подписку закрытого соединения."""
+        with self._lock:
+            subscriptions = self._subscriptions.get(subscription.dancer_id)
+            if subscriptions is not None:
+                subscriptions.discard(subscription)
+                if not subscriptions:
+                    del self._subscriptions[subscription.dancer_id]
+
+    def publish(self, dancer_ids, event: dict):
+        """
+        Опубликовать событие для танцоров.
+
+        Вызывается после фиксации транзакции, которая породила событие.
+
+        Args:
+            dancer_ids: ID танцоров-адресатов
+            event (dict): Событие, сериализуемое в JSON
+        """
+        self.published += 1
+        self.broker.publish(sorted(set(dancer_ids)), event)
+
+    def deliver(self, dancer_ids: list[int], event: dict):
+        """Передать событие соединениям этого процесса."""
+        with self._lock:
+            targets = [subscription for dancer_id in dancer_ids
+                       for subscription in self._subscriptions.get(dancer_id, ())]
+        for subscription in targets:
+            try:
+                subscription.loop.call_soon_threadsafe(subscription.put, event)
+            except RuntimeError:
+                # event loop соединения уже закрыт
+                self.unsubscribe(subscription)
+        self.delivered += len(targets)
+
+    def stats(self) -> dict:
+        """Число подписок и счетчики событий."""
+        with self._lock:
+            return {
+                "dancers": len(self._subscriptions),
+                "connections": sum(len(s) for s in self._subscriptions.values()),
+                "published": self.published,
+                "delivered": self.delivered,
+            }
+
+
+hub = NotificationHub(LocalBroker(), settings.notification_queue_size)
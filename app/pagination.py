@@ -0,0 +1,188 @@
+from datetime import datetime
+from typing import Annotated
+from fastapi import HTTPException, Query, Response
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from sqlalchemy import tuple_
+from sqlmodel import Session, select
+from config import settings
+from serialization import FastJSONResponse
+
+DEFAULT_LIMIT = 100
+MAX_LIMIT = 1000
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+CursorQuery = Annotated[int | None, Query(
+    description="ID последней записи предыдущей страницы (значение X-Next-Cursor)")]
+TimeCursorQuery = Annotated[str | None, Query(
+    description="Курсор следующей страницы (значение X-Next-Cursor)")]
+LimitQuery = Annotated[int, Query(ge=1, le=MAX_LIMIT,
+                                  description="Максимальное число записей на странице")]
+FieldsQuery = Annotated[str | None, Query(
+    description="Список возвращаемых полей через запятую, например name,age")]
+
+
+def parse_fields(fields: str | None, model) -> list[str] | None:
+    """
+    Разобрать параметр выборочных полей.
+
+    Args:
+        fields (str | None): Имена полей через запятую
+        model: Модель, поля которой можно запрашивать
+
+    Raises:
+        HTTPException: 400 если запрошено неизвестное поле
+
+    Returns:
+        list[str] | None: Имена полей (id всегда первым) или None для всех полей
+    """
+    if not fields:
+        return None
+    names = [name.strip() for name in fields.split(",") if name.strip()]
+    unknown = [name for name in names if name not in model.model_fields]
+    if unknown:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unknown fields: {', '.join(unknown)}"
+        )
+    return ["id"] + [name for name in dict.fromkeys(names) if name != "id"]
+
+
+def paginate(session: Session, model, conditions: list,
+             cursor: int | None, limit: int, fields: list[str] | None = None,
+             options: tuple = ()):
+    """
+    Выбрать одну страницу записей с keyset-пагинацией по id.
+
+    Запрашивается limit + 1 строк: лишняя строка лишь показывает, что есть
+    следующая страница. При выборочных полях из базы читаются только они.
+
+    Args:
+        session (Session): Сессия базы данных
+        model: Модель таблицы
+        conditions (list): Условия фильтрации
+        cursor (int | None): id последней записи предыдущей страницы
+        limit (int): Размер страницы
+        fields (list[str] | None): Выбираемые поля или None для всей модели
+        options (tuple): Опции загрузки ORM (например selectinload) для всей модели
+
+    Returns:
+        tuple[list, int | None]: Записи страницы и курсор следующей страницы
+    """
+    if fields:
+        statement = select(*[getattr(model, name) for name in fields])
+    else:
+        statement = select(model).options(*options)
+    if cursor is not None:
+        conditions = [*conditions, model.id > cursor]
+    statement = statement.where(*conditions).order_by(model.id).limit(limit + 1)
+
+    items = session.exec(statement).all()
+    next_cursor = None
+    if len(items) > limit:
+        items = items[:limit]
+        next_cursor = items[-1].id
+    return items, next_cursor
+
+
+def encode_time_cursor(created_at: datetime, item_id: int) -> str:
+    return f"{created_at.isoformat()}_{item_id}"
+
+
+def decode_time_cursor(cursor: str) -> tuple[datetime, int]:
+    """
+    Разобрать курсор пагинации по времени.
+
+    Raises:
+        HTTPException: 400 если курсор поврежден
+
+    Returns:
+        tuple[datetime, int]: Время создания и id последней записи
+    """
+    try:
+        created_at, item_id = cursor.rsplit("_", 1)
+        return datetime.fromisoformat(created_at), int(item_id)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def paginate_by_time(session: Session, model, conditions: list,
+                     cursor: str | None, limit: int, fields: list[str] | None = None):
+    """
+    Выбрать одну страницу записей с keyset-пагинацией по (created_at, id),
+    от новых к старым.
+
+    Граница страницы задается сравнением пар (created_at, id), которое
+    выполняется по индексу, оканчивающемуся этими колонками. При выборочных
+    полях created_at выбирается всегда, потому что он нужен для курсора.
+    Если его не запрашивали, записи возвращаются словарями без него.
+
+    Args:
+        session (Session): Сессия базы данных
+        model: Модель таблицы с колонкой created_at
+        conditions (list): Условия фильтрации
+        cursor (str | None): Курсор из X-Next-Cursor предыдущей страницы
+        limit (int): Размер страницы
+        fields (list[str] | None): Выбираемые поля или None для всей модели
+
+    Returns:
+        tuple[list, str | None]: Записи страницы и курсор следующей страницы
+    """
+    cursor_only = bool(fields) and "created_at" not in fields
+    if fields:
+        if cursor_only:
+            fields = [*fields, "created_at"]
+        statement = select(*[getattr(model, name) for name in fields])
+    else:
+        statement = select(model)
+    if cursor is not None:
+        conditions = [*conditions,
+                      tuple_(model.created_at, model.id) < tuple_(*decode_time_cursor(cursor))]
+    statement = (statement.where(*conditions)
+                 .order_by(model.created_at.desc(), model.id.desc())
+                 .limit(limit + 1))
+
+    items = session.exec(statement).all()
+    next_cursor = None
+    if len(items) > limit:
+        items = items[:limit]
+        next_cursor = encode_time_cursor(items[-1].created_at, items[-1].id)
+    if cursor_only:
+        keys = fields[:-1]
+        items = [dict(zip(keys, item)) for item in items]
+    return items, next_cursor
+
+
+def page_response(response: Response, items: list, next_cursor: int | str | None,
+                  fields: list[str] | None, serialized: bool = False):
+    """
+    Оформить страницу: выставить заголовок курсора и сериализовать поля.
+
+    Args:
+        response (Response): Ответ, в который пишется заголовок X-Next-Cursor
+        items (list): Записи страницы: модели, строки выбранных полей
+            или словари полей
+        next_cursor (int | str | None): Курсор следующей страницы
+        fields (list[str] | None): Выбранные поля
+        serialized (bool): Записи - уже готовые словари ответа, проверка
+            по модели ответа не нужна
+
+    Returns:
+        list | JSONResponse: Записи как есть или JSON только с выбранными полями
+    """
+    # Выбранные поля приходят строками из базы; в режиме fast_json они
+    # сериализуются без jsonable_encoder
+    headers = {}
+    if next_cursor is not None:
+        headers[NEXT_CURSOR_HEADER] = str(next_cursor)
+    if fields is None and not serialized:
+        response.headers.update(headers)
+        return items
+    if serialized or (items and isinstance(items[0], dict)):
+        rows = items
+    else:
+        keys = items[0]._fields if items else ()
+        rows = [dict(zip(keys, row)) for row in items]
+    if settings.fast_json:
+        return FastJSONResponse(content=rows, headers=headers)
+    return JSONResponse(content=jsonable_encoder(rows), headers=headers)
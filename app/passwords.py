@@ -0,0 +1,117 @@
+import asyncio
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from fastapi import HTTPException, status
+from passlib.context import CryptContext
+from starlette.concurrency import run_in_threadpool
+from config import settings
+
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto",
+                           bcrypt__default_rounds=settings.bcrypt_rounds,
+                           bcrypt__min_rounds=settings.bcrypt_rounds)
+
+_pool: ProcessPoolExecutor | None = None
+_pool_lock = threading.Lock()
+_pending = threading.BoundedSemaphore(settings.password_hash_max_pending)
+
+def get_password_hash(password):
+    """
+    Генерирует хэш пароля с использованием bcrypt.
+    
+    Args:
+        password (str): Пароль в открытом виде
+        
+    Returns:
+        str: Хэшированная версия пароля
+    """
+    return pwd_context.hash(password)
+
+def verify_password(plain_password, hashed_password):
+    """
+    Проверяет соответствие пароля его хэшу.
+    
+    Args:
+        plain_password (str): Пароль в открытом виде
+        hashed_password (str): Хэшированный пароль
+        
+    Returns:
+        bool: True если пароль совпадает, False в противном случае
+    """
+    return pwd_context.verify(plain_password, hashed_password)
+
+def needs_rehash(hashed_password) -> bool:
+    """
+    Проверяет, устарел ли хэш (другая схема или меньшая стоимость bcrypt).
+
+    Args:
+        hashed_password (str): Хэшированный пароль
+
+    Returns:
+        bool: True если пароль нужно перехэшировать
+    """
+    return pwd_context.needs_update(hashed_password)
+
+def _get_pool() -> ProcessPoolExecutor:
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(
+                max_workers=settings.password_hash_workers,
+                mp_context=multiprocessing.get_context("spawn")
+            )
+        return _pool
+
+def shutdown_pool():
+    """Останавливает процессы пула хэширования."""
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(cancel_futures=True)
+            _pool = None
+
+async def _run(func, *args):
+    if not _pending.acquire(blocking=False):
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Too many pending password operations, retry later",
+            headers={"Retry-After": "1"},
+        )
+    try:
+        if settings.password_hash_workers <= 0:
+            return await run_in_threadpool(func, *args)
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(_get_pool(), func, *args)
+    finally:
+        _pending.release()
+
+async def hash_password_async(password) -> str:
+    """
+    Хэширует пароль в отдельном процессе пула, не занимая event loop.
+
+    Args:
+        password (str): Пароль в открытом виде
+
+    Raises:
+        HTTPException: 503 если очередь пула переполнена
+
+    Returns:
+        str: Хэшированная версия пароля
+    """
+    return await _run(get_password_hash, password)
+
+async def verify_password_async(plain_password, hashed_password) -> bool:
+    """
+    Проверяет пароль в отдельном процессе пула, не занимая event loop.
+
+    Args:
+        plain_password (str): Пароль в открытом виде
+        hashed_password (str): Хэшированный пароль
+
+    Raises:
+        HTTPException: 503 если очередь пула переполнена
+
+    Returns:
+        bool: True если пароль совпадает, False в противном случае
+    """
+    return await _run(verify_password, plain_password, hashed_password)
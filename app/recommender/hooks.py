@@ -0,0 +1,54 @@
+from models import Dancer
+from recommender.index import index
+from recommender.results import bucket_of, recommendation_cache
+from recommender.precompute import worker
+
+
+def dancer_saved(dancer: Dancer, previous: tuple | None = None):
+    """
+    Notify recommendation structures that a dancer was created or changed.
+
+    Must be called after the change is committed.
+
+    Args:
+        dancer (Dancer): Committed dancer
+        previous (tuple | None): (sex, style) before the change, if they may
+            have changed
+    """
+    buckets = {bucket_of(dancer.sex, dancer.style)}
+    if previous is not None:
+        buckets.add(bucket_of(*previous))
+    recommendation_cache.invalidate(dancer.id, buckets)
+    index.upsert(dancer)
+    worker.dancer_changed(dancer.id, dancer.sex, dancer.style, buckets)
+
+
+def dancer_deleted(dancer_id: int, previous: tuple | None = None):
+    """
+    Notify recommendation structures that a dancer was deleted.
+
+    Must be called after the deletion is committed.
+
+    Args:
+        dancer_id (int): ID of the deleted dancer
+        previous (tuple | None): (sex, style) of the deleted dancer; if unknown,
+            all cached recommendations are dropped
+    """
+    index.remove(dancer_id)
+    if previous is not None:
+        recommendation_cache.invalidate(dancer_id, [bucket_of(*previous)])
+        worker.dancer_changed(dancer_id, None, None, [bucket_of(*previous)])
+    else:
+        recommendation_cache.clear()
+        worker.everything_changed()
+
+
+def dancers_bulk_changed():
+    """
+    Notify recommendation structures that many dancers changed at once.
+
+    The index is dropped and reloaded lazily instead of applying every row.
+    """
+    recommendation_cache.clear()
+    index.clear()
+    worker.everything_changed()
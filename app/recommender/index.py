@@ -0,0 +1,393 @@
+import threading
+from collections import defaultdict
+import numpy as np
+from sqlmodel import Session, select
+from models import Dancer
+from schemas import Sex, StatusType, get_level_value
+from config import settings
+from recommender.neighbors import get_backend
+
+FEATURE_COUNT = 3
+_INITIAL_CAPACITY = 64
+
+
+def dancer_key(sex, style, status) -> tuple:
+    """
+    Build the partition key of a dancer.
+
+    Args:
+        sex (Sex | str): Dancer's sex
+        style (str | None): Dance style
+        status (StatusType | str): Search status
+
+    Returns:
+        tuple: (sex, style, status) key with enum members normalized
+    """
+    return (Sex(sex), style, StatusType(status))
+
+
+def dancer_features(level, age, height) -> tuple | None:
+    """
+    Build the KNN feature vector (level, age, height) of a dancer.
+
+    Args:
+        level (str | None): Skill level letter
+        age (int | None): Age
+        height (float | None): Height
+
+    Returns:
+        tuple | None: Feature vector, or None if the dancer can't take part in KNN
+    """
+    if not (age and height and level):
+        return None
+    return (get_level_value(level), age, height)
+
+
+class _Partition:
+    """
+    Contiguous NumPy storage of one (sex, style, status) partition.
+
+    Rows are kept dense: removing a row moves the last row into its place.
+    `version` changes on every modification. Running mean and sum of squared
+    deviations (`m2`) of the features are updated with Welford's algorithm.
+    """
+
+    __slots__ = ("ids", "features", "size", "version", "mean", "m2")
+
+    def __init__(self):
+        self.ids = np.empty(_INITIAL_CAPACITY, dtype=np.int64)
+        self.features = np.empty((_INITIAL_CAPACITY, FEATURE_COUNT), dtype=np.float64)
+        self.size = 0
+        self.version = 0
+        self.mean = np.zeros(FEATURE_COUNT)
+        self.m2 = np.zeros(FEATURE_COUNT)
+
+    def append(self, dancer_id: int, features: tuple) -> int:
+        if self.size == len(self.ids):
+            capacity = len(self.ids) * 2
+            self.ids = np.resize(self.ids, capacity)
+            grown = np.empty((capacity, FEATURE_COUNT), dtype=np.float64)
+            grown[:self.size] = self.features[:self.size]
+            self.features = grown
+        row = self.size
+        self.ids[row] = dancer_id
+        self.features[row] = features
+        self.size += 1
+        self.version += 1
+
+        delta = self.features[row] - self.mean
+        self.mean += delta / self.size
+        self.m2 += delta * (self.features[row] - self.mean)
+        return row
+
+    def remove(self, row: int) -> int | None:
+        """Remove a row and return the id of the dancer moved into it, if any."""
+        last = self.size - 1
+        self.size = last
+        self.version += 1
+
+        if last:
+            removed = self.features[row]
+            delta = removed - self.mean
+            self.mean -= delta / last
+            self.m2 -= delta * (removed - self.mean)
+            np.maximum(self.m2, 0.0, out=self.m2)
+        else:
+            self.mean[:] = 0.0
+            self.m2[:] = 0.0
+
+        if row == last:
+            return None
+        self.ids[row] = self.ids[last]
+        self.features[row] = self.features[last]
+        return int(self.ids[row])
+
+    def view(self) -> tuple[np.ndarray, np.ndarray]:
+        return self.ids[:self.size], self.features[:self.size]
+
+
+def _merge_stats(partitions) -> tuple[int, np.ndarray, np.ndarray]:
+    """Combine (size, mean, m2) of several partitions (Chan et al.)."""
+    count, mean, m2 = 0, np.zeros(FEATURE_COUNT), np.zeros(FEATURE_COUNT)
+    for partition in partitions:
+        if not partition.size:
+            continue
+        total = count + partition.size
+        delta = partition.mean - mean
+        mean = mean + delta * partition.size / total
+        m2 = m2 + partition.m2 + delta ** 2 * count * partition.size / total
+        count = total
+    return count, mean, m2
+
+
+class RecommendationIndex:
+    """
+    Resident index of dancers' KNN features partitioned by (sex, style, status).
+
+    The index is loaded lazily from the database on first use and then kept
+    in sync by the write handlers through `upsert` and `remove`. It lives in
+    process memory, so every worker process keeps its own copy.
+
+    Features are normalized with the running mean and std of the candidates'
+    (sex, style) bucket, so every query against a bucket sees the same scale.
+    Neighbour search over a candidate pool goes through a pluggable backend
+    (see recommender.neighbors), built once per pool and reused until one of
+    the pool's partitions changes.
+
+    Args:
+        backend (str): Neighbour search backend name
+    """
+
+    def __init__(self, backend: str = "brute"):
+        self._backend = get_backend(backend)
+        self._searches: dict[tuple, tuple] = {}
+        self._lock = threading.RLock()
+        self._partitions: dict[tuple, _Partition] = {}
+        self._keys: dict[int, tuple] = {}
+        self._rows: dict[int, int] = {}
+        self._loaded = False
+
+    @property
+    def loaded(self) -> bool:
+        return self._loaded
+
+    def clear(self):
+        """Drop all data; the next `ensure_loaded` reloads from the database."""
+        with self._lock:
+            self._partitions.clear()
+            self._keys.clear()
+            self._rows.clear()
+            self._searches.clear()
+            self._loaded = False
+
+    def ensure_loaded(self, session: Session):
+        """
+        Load all dancers from the database if the index is empty.
+
+        Only the needed columns are selected, no ORM objects are built.
+
+        Args:
+            session (Session): Database session
+        """
+        if self._loaded:
+            return
+        with self._lock:
+            if self._loaded:
+                return
+            self.load(session.exec(select(
+                Dancer.id, Dancer.sex, Dancer.style, Dancer.status,
+                Dancer.level, Dancer.age, Dancer.height
+            )).all())
+
+    def load(self, rows):
+        """
+        Replace the index contents with the given dancers and mark it loaded.
+
+        Args:
+            rows: Iterable of (id, sex, style, status, level, age, height) tuples
+        """
+        with self._lock:
+            self.clear()
+            for dancer_id, sex, style, status, level, age, height in rows:
+                self._insert(dancer_id, dancer_key(sex, style, status),
+                             dancer_features(level, age, height))
+            self._loaded = True
+
+    def key_of(self, dancer_id: int) -> tuple | None:
+        """Return the partition key the dancer is currently stored under."""
+        return self._keys.get(dancer_id)
+
+    def upsert(self, dancer: Dancer):
+        """
+        Insert a dancer or move it to its new partition after an update.
+
+        Args:
+            dancer (Dancer): Dancer with its current attribute values
+        """
+        key = dancer_key(dancer.sex, dancer.style, dancer.status)
+        features = dancer_features(dancer.level, dancer.age, dancer.height)
+        with self._lock:
+            if not self._loaded:
+                return
+            self._discard(dancer.id)
+            self._insert(dancer.id, key, features)
+
+    def remove(self, dancer_id: int):
+        """
+        Remove a dancer from the index.
+
+        Args:
+            dancer_id (int): ID of the deleted dancer
+        """
+        with self._lock:
+            if self._loaded:
+                self._discard(dancer_id)
+
+    def snapshot(self, status=StatusType.IN_SEARCH) -> dict[tuple, tuple]:
+        """
+        Copy all partitions with the given status.
+
+        Args:
+            status (StatusType): Status of the partitions to copy
+
+        Returns:
+            dict[tuple, tuple]: (sex, style) -> (ids, features) copies
+        """
+        with self._lock:
+            return {(sex, style): (ids.copy(), features.copy())
+                    for (sex, style, part_status), partition in self._partitions.items()
+                    if part_status == status and partition.size
+                    for ids, features in [partition.view()]}
+
+    def candidates(self, sex, style, level: int) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Collect IN_SEARCH candidates of the opposite sex within ±1 level.
+
+        Args:
+            sex (Sex): Sex of the dancer seeking recommendations
+            style (str | None): Dance style
+            level (int): Numeric level of the dancer
+
+        Returns:
+            tuple[np.ndarray, np.ndarray]: Candidate ids and their feature rows
+        """
+        with self._lock:
+            return self._collect(self._opposite(sex, style), level)
+
+    def stats(self, sex, style) -> tuple[int, np.ndarray, np.ndarray]:
+        """
+        Running statistics of the IN_SEARCH dancers of one (sex, style) bucket.
+
+        Args:
+            sex (Sex): Sex of the bucket
+            style (str | None): Dance style
+
+        Returns:
+            tuple: Number of dancers, mean and std of their (level, age, height)
+        """
+        with self._lock:
+            partition = self._partitions.get(dancer_key(sex, style, StatusType.IN_SEARCH))
+            count, mean, m2 = _merge_stats([partition] if partition else [])
+        return count, mean, np.sqrt(m2 / count) if count else np.zeros(FEATURE_COUNT)
+
+    def _opposite(self, sex, style) -> list[_Partition]:
+        return [self._partitions[key] for other in Sex if other != Sex(sex)
+                for key in [(other, style, StatusType.IN_SEARCH)] if key in self._partitions]
+
+    @staticmethod
+    def _collect(partitions: list[_Partition], level: int) -> tuple[np.ndarray, np.ndarray]:
+        ids_parts, feature_parts = [], []
+        for partition in partitions:
+            ids, features = partition.view()
+            mask = np.abs(features[:, 0] - level) <= 1
+            ids_parts.append(ids[mask])
+            feature_parts.append(features[mask])
+        if not ids_parts:
+            return (np.empty(0, dtype=np.int64),
+                    np.empty((0, FEATURE_COUNT), dtype=np.float64))
+        return np.concatenate(ids_parts), np.concatenate(feature_parts)
+
+    def nearest(self, sex, style, query: tuple, k: int) -> list[int]:
+        """
+        Find the K nearest compatible candidates on normalized features.
+
+        Args:
+            sex (Sex): Sex of the dancer seeking recommendations
+            style (str | None): Dance style
+            query (tuple): (level, age, height) of the dancer
+            k (int): Number of neighbours
+
+        Returns:
+            list[int]: Candidate ids ordered by distance
+        """
+        return self.nearest_many(sex, style, query[0], np.asarray([query]), k)[0]
+
+    def nearest_many(self, sex, style, level: int,
+                     queries: np.ndarray, k: int) -> list[list[int]]:
+        """
+        Find the K nearest candidates for many dancers sharing one pool.
+
+        Dancers of the same sex, style and level have the same candidate pool,
+        so it is collected and normalized once (running mean and std of the
+        candidates' bucket) and all queries go to one search structure built
+        over it. The structure is reused until the bucket changes, so a
+        repeated query only normalizes its own row.
+
+        Args:
+            sex (Sex): Sex of the dancers seeking recommendations
+            style (str | None): Dance style
+            level (int): Numeric level of the dancers
+            queries (np.ndarray): (m, 3) array of (level, age, height) rows
+            k (int): Number of neighbours
+
+        Returns:
+            list[list[int]]: Candidate ids ordered by distance, per query row
+        """
+        search_key = (Sex(sex), style, level)
+        with self._lock:
+            partitions = self._opposite(sex, style)
+            versions = tuple((id(partition), partition.version) for partition in partitions)
+            cached = self._searches.get(search_key)
+            if cached is None or cached[0] != versions:
+                ids, features = self._collect(partitions, level)
+                count, mean, m2 = _merge_stats(partitions)
+                std = np.sqrt(m2 / max(count, 1)) + 1e-8
+                search = self._backend((features - mean) / std) if len(ids) else None
+                cached = self._searches[search_key] = (versions, ids, mean, std, search)
+        _, ids, mean, std, search = cached
+        if not len(ids):
+            return [[] for _ in range(len(queries))]
+
+        current = (np.asarray(queries, dtype=np.float64) - mean) / std
+        return [ids[rows].tolist() for rows in search.query(current, k)]
+
+    def nearest_for(self, rows, k: int) -> dict[int, list[int]]:
+        """
+        Find the K nearest candidates for many dancers given as column rows.
+
+        Rows are grouped by (sex, style, level) and every group is searched
+        with one `nearest_many` call. Dancers without age or height are
+        skipped.
+
+        Args:
+            rows: Iterable of (id, sex, style, level, age, height)
+            k (int): Number of neighbours
+
+        Returns:
+            dict[int, list[int]]: Candidate ids ordered by distance, per dancer id
+        """
+        groups = defaultdict(list)
+        for dancer_id, sex, style, level, age, height in rows:
+            if not age or not height:
+                continue
+            level = get_level_value(level)
+            groups[(sex, style, level)].append((dancer_id, (level, age, height)))
+
+        results = {}
+        for (sex, style, level), members in groups.items():
+            queries = np.array([features for _, features in members], dtype=np.float64)
+            neighbours = self.nearest_many(sex, style, level, queries, k)
+            for (dancer_id, _), top_ids in zip(members, neighbours):
+                results[dancer_id] = top_ids
+        return results
+
+    def _insert(self, dancer_id: int, key: tuple, features: tuple | None):
+        self._keys[dancer_id] = key
+        if features is None:
+            return
+        partition = self._partitions.get(key)
+        if partition is None:
+            partition = self._partitions[key] = _Partition()
+        self._rows[dancer_id] = partition.append(dancer_id, features)
+
+    def _discard(self, dancer_id: int):
+        key = self._keys.pop(dancer_id, None)
+        row = self._rows.pop(dancer_id, None)
+        if row is None:
+            return
+        moved = self._partitions[key].remove(row)
+        if moved is not None:
+            self._rows[moved] = row
+
+
+index = RecommendationIndex(backend=settings.knn_backend)
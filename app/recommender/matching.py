@@ -0,0 +1,166 @@
+import numpy as np
+from recommender.index import RecommendationIndex
+from schemas import Sex
+
+# Max elements of one distance matrix block
+_MATRIX_BUDGET = 1 << 22
+
+
+def _squared_distances(left: np.ndarray, right: np.ndarray) -> np.ndarray:
+    distances = (np.einsum("ij,ij->i", left, left)[:, None]
+                 + np.einsum("ij,ij->i", right, right)[None, :]
+                 - 2.0 * left @ right.T)
+    np.maximum(distances, 0.0, out=distances)
+    return distances
+
+
+def _merge_best(best_d: np.ndarray, best_i: np.ndarray,
+                cols: np.ndarray, rows: np.ndarray, dists: np.ndarray):
+    """Merge new (col, row, distance) candidates into per-column top-K lists."""
+    k = best_d.shape[1]
+    touched = np.unique(cols)
+    all_cols = np.concatenate([np.repeat(touched, k), cols])
+    all_rows = np.concatenate([best_i[touched].ravel(), rows])
+    all_d = np.concatenate([best_d[touched].ravel(), dists])
+
+    order = np.lexsort((all_d, all_cols))
+    all_cols, all_rows, all_d = all_cols[order], all_rows[order], all_d[order]
+    starts = np.searchsorted(all_cols, touched)
+    rank = np.arange(len(all_cols)) - np.repeat(starts, np.diff(np.append(starts, len(all_cols))))
+    keep = rank < k
+    slots = (np.searchsorted(touched, all_cols[keep]), rank[keep])
+    best_d[touched[slots[0]], slots[1]] = all_d[keep]
+    best_i[touched[slots[0]], slots[1]] = all_rows[keep]
+
+
+def _candidate_edges(leaders: np.ndarray, followers: np.ndarray,
+                     leader_levels: np.ndarray, follower_levels: np.ndarray,
+                     k: int) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Build the sparse top-K candidate graph between two sides of a style.
+
+    Each dancer keeps edges to its K closest compatible (±1 level) dancers of
+    the other side. Leaders are processed per level against followers of the
+    three neighbouring levels, in row chunks bounded by _MATRIX_BUDGET; the
+    followers' own top-K lists are merged across chunks on the fly.
+
+    Returns:
+        tuple: Leader row numbers, follower row numbers and squared distances
+    """
+    best_d = np.full((len(followers), k), np.inf)
+    best_i = np.full((len(followers), k), -1, dtype=np.int64)
+    rows, cols, dists = [], [], []
+
+    for level in np.unique(leader_levels):
+        leader_rows = np.flatnonzero(leader_levels == level)
+        follower_rows = np.flatnonzero(np.abs(follower_levels - level) <= 1)
+        if not len(follower_rows):
+            continue
+        targets = followers[follower_rows]
+        chunk = max(1, _MATRIX_BUDGET // len(follower_rows))
+        for start in range(0, len(leader_rows), chunk):
+            block_rows = leader_rows[start:start + chunk]
+            distances = _squared_distances(leaders[block_rows], targets)
+
+            # Leaders' top-K
+            kk = min(k, distances.shape[1])
+            top = np.argpartition(distances, kk - 1, axis=1)[:, :kk]
+            rows.append(np.repeat(block_rows, kk))
+            cols.append(follower_rows[top].ravel())
+            dists.append(np.take_along_axis(distances, top, axis=1).ravel())
+
+            # Followers' top-K: only distances beating a follower's current
+            # K-th best can enter its list, which is few after the first blocks
+            kth = best_d[follower_rows].max(axis=1)
+            unfilled = np.isinf(kth)
+            if unfilled.any():
+                # Lists still having free slots take the block's top-K directly
+                kk = min(k, distances.shape[0])
+                first = np.ascontiguousarray(distances[:, unfilled].T)
+                top = np.argpartition(first, kk - 1, axis=1)[:, :kk]
+                _merge_best(best_d, best_i, np.repeat(follower_rows[unfilled], kk),
+                            block_rows[top].ravel(),
+                            np.take_along_axis(first, top, axis=1).ravel())
+                kth[unfilled] = -1.0
+            hit_rows, hit_cols = np.nonzero(distances < kth[None, :])
+            if len(hit_rows):
+                _merge_best(best_d, best_i, follower_rows[hit_cols],
+                            block_rows[hit_rows], distances[hit_rows, hit_cols])
+
+    valid = best_i >= 0
+    rows.append(best_i[valid])
+    cols.append(np.nonzero(valid)[0])
+    dists.append(best_d[valid])
+    return np.concatenate(rows), np.concatenate(cols), np.concatenate(dists)
+
+
+def _greedy_stable(rows: np.ndarray, cols: np.ndarray, dists: np.ndarray,
+                   n_rows: int, n_cols: int) -> list[tuple[int, int, float]]:
+    # Taking edges by increasing distance while both ends are free gives a
+    # stable matching: distances are symmetric, so a blocking edge would
+    # have been taken before the edges of both its ends.
+    order = np.lexsort((cols, rows, dists))
+    row_free = np.ones(n_rows, dtype=bool)
+    col_free = np.ones(n_cols, dtype=bool)
+    matched = []
+    for edge in order:
+        row, col = rows[edge], cols[edge]
+        if row_free[row] and col_free[col]:
+            row_free[row] = False
+            col_free[col] = False
+            matched.append((row, col, float(np.sqrt(dists[edge]))))
+    return matched
+
+
+def propose_pairs(index: RecommendationIndex, k: int = 10,
+                  style: str | None = None) -> list[dict]:
+    """
+    Compute a global stable matching of all IN_SEARCH dancers.
+
+    Candidates are scored with the KNN features (level, age, height),
+    normalized with the mean and std of each style's searching dancers and
+    restricted to the opposite sex, the same style and ±1 level. Every dancer
+    keeps its top-K candidates, and the resulting sparse graph is matched
+    greedily by increasing distance, which is stable for symmetric scores.
+    Nothing is written to the database.
+
+    Args:
+        index (RecommendationIndex): Loaded recommendation index
+        k (int): Candidates kept per dancer
+        style (str | None): Only match this style; all styles if None
+
+    Returns:
+        list[dict]: Proposed pairs with dancer1_id (MALE), dancer2_id (FEMALE),
+            style and distance, best pairs first
+    """
+    buckets = index.snapshot()
+    styles = {bucket_style for _, bucket_style in buckets}
+    if style is not None:
+        styles &= {style}
+
+    proposals = []
+    for bucket_style in styles:
+        leaders = buckets.get((Sex.MALE, bucket_style))
+        followers = buckets.get((Sex.FEMALE, bucket_style))
+        if leaders is None or followers is None:
+            continue
+        leader_ids, leader_features = leaders
+        follower_ids, follower_features = followers
+
+        features = np.concatenate([leader_features, follower_features])
+        mean = features.mean(axis=0)
+        std = features.std(axis=0) + 1e-8
+        rows, cols, dists = _candidate_edges(
+            (leader_features - mean) / std, (follower_features - mean) / std,
+            leader_features[:, 0], follower_features[:, 0], k)
+        for row, col, distance in _greedy_stable(
+                rows, cols, dists, len(leader_ids), len(follower_ids)):
+            proposals.append({
+                "dancer1_id": int(leader_ids[row]),
+                "dancer2_id": int(follower_ids[col]),
+                "style": bucket_style,
+                "distance": distance,
+            })
+
+    proposals.sort(key=lambda pair: pair["distance"])
+    return proposals
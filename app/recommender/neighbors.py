@@ -0,0 +1,229 @@
+import importlib.util
+import numpy as np
+
+# Max elements of one query x point distance matrix block
+_MATRIX_BUDGET = 1 << 22
+
+
+def _top_k(distances: np.ndarray, k: int) -> np.ndarray:
+    if k < len(distances):
+        top = np.argpartition(distances, k - 1)[:k]
+        return top[np.argsort(distances[top])]
+    return np.argsort(distances)
+
+
+class BruteForceSearch:
+    """
+    Exact search: distances to every point, top K by `argpartition`.
+
+    No build cost, O(N) per query.
+    """
+
+    name = "brute"
+    requires = None
+
+    def __init__(self, points: np.ndarray):
+        self.points = points
+
+    def query(self, queries: np.ndarray, k: int) -> list[np.ndarray]:
+        result = []
+        chunk = max(1, _MATRIX_BUDGET // max(1, len(self.points)))
+        for start in range(0, len(queries), chunk):
+            block = queries[start:start + chunk]
+            distances = np.linalg.norm(self.points[None, :, :] - block[:, None, :], axis=2)
+            result.extend(_top_k(row, k) for row in distances)
+        return result
+
+
+class KDTreeSearch:
+    """
+    Exact search with a KD-tree (scipy.spatial.cKDTree).
+
+    O(N log N) build, about O(log N) per query. Requires scipy.
+    """
+
+    name = "kdtree"
+    requires = "scipy"
+
+    def __init__(self, points: np.ndarray):
+        from scipy.spatial import cKDTree
+        self.size = len(points)
+        self.tree = cKDTree(points)
+
+    def query(self, queries: np.ndarray, k: int) -> list[np.ndarray]:
+        k = min(k, self.size)
+        _, indices = self.tree.query(queries, k=k)
+        indices = np.asarray(indices).reshape(len(queries), k)
+        return list(indices)
+
+
+class GridSearch:
+    """
+    Grid bucketing over normalized features.
+
+    Points are hashed into cubic cells holding about `cell_target` points
+    on average. A query scans rings of cells around its own cell and stops
+    once the K-th best distance can't be beaten by unvisited cells (exact)
+    or after `max_cells` cells were scanned (approximate).
+    """
+
+    name = "grid"
+    requires = None
+
+    def __init__(self, points: np.ndarray, cell_target: int = 16, max_cells: int = 343):
+        self.points = points
+        self.max_cells = max_cells
+        dims = points.shape[1]
+        self.low = points.min(axis=0) if len(points) else np.zeros(dims)
+        span = points.max(axis=0) - self.low if len(points) else np.zeros(dims)
+        cells = max(1.0, len(points) / cell_target)
+        # Flat dimensions (e.g. one level in the pool) don't split into cells
+        active = span > 1e-6
+        if active.any():
+            self.cell = float(np.prod(span[active]) / cells) ** (1.0 / active.sum())
+        else:
+            self.cell = 1.0
+        self.shape = np.floor(span / self.cell).astype(np.int64) + 1
+
+        coords = self._coords(points)
+        keys = np.ravel_multi_index(coords.T, self.shape)
+        self.order = np.argsort(keys, kind="stable")
+        self.keys, self.starts, counts = np.unique(keys[self.order], return_index=True,
+                                                   return_counts=True)
+        self.ends = self.starts + counts
+
+    def _coords(self, points: np.ndarray) -> np.ndarray:
+        coords = np.floor((points - self.low) / self.cell).astype(np.int64)
+        return np.clip(coords, 0, self.shape - 1)
+
+    def _cell_points(self, cells: np.ndarray) -> np.ndarray:
+        keys = np.ravel_multi_index(cells.T, self.shape)
+        slots = np.searchsorted(self.keys, keys)
+        slots = slots[(slots < len(self.keys)) & (self.keys[np.minimum(slots, len(self.keys) - 1)] == keys)]
+        if not len(slots):
+            return np.empty(0, dtype=np.int64)
+        return np.concatenate([self.order[self.starts[s]:self.ends[s]] for s in slots])
+
+    def _ring(self, center: np.ndarray, radius: int) -> np.ndarray:
+        offsets = np.arange(-radius, radius + 1)
+        grid = np.stack(np.meshgrid(*[offsets] * len(center), indexing="ij"), -1).reshape(-1, len(center))
+        grid = grid[np.abs(grid).max(axis=1) == radius] + center
+        return grid[((grid >= 0) & (grid < self.shape)).all(axis=1)]
+
+    def query(self, queries: np.ndarray, k: int) -> list[np.ndarray]:
+        result = []
+        k = min(k, len(self.points))
+        max_radius = int(self.shape.max())
+        for query in queries:
+            center = self._coords(query[None, :])[0]
+            found = np.empty(0, dtype=np.int64)
+            scanned = 0
+            for radius in range(max_radius + 1):
+                ring = self._ring(center, radius)
+                scanned += len(ring)
+                found = np.concatenate([found, self._cell_points(ring)])
+                if len(found) >= k:
+                    distances = np.linalg.norm(self.points[found] - query, axis=1)
+                    kth = np.partition(distances, k - 1)[k - 1] if k else 0.0
+                    # Distance from the query to the nearest unvisited cell;
+                    # sides already past the grid edge hold no more points
+                    lower = np.where(center - radius <= 0, np.inf,
+                                     query - (self.low + (center - radius) * self.cell))
+                    upper = np.where(center + radius >= self.shape - 1, np.inf,
+                                     self.low + (center + radius + 1) * self.cell - query)
+                    inner = min(lower.min(), upper.min())
+                    if kth <= inner or scanned >= self.max_cells:
+                        break
+            distances = np.linalg.norm(self.points[found] - query, axis=1)
+            result.append(found[_top_k(distances, k)])
+        return result
+
+
+class RandomProjectionSearch:
+    """
+    Locality-sensitive hashing with quantized random projections (E2LSH).
+
+    Each of `tables` hash tables projects points on `hashes` random
+    directions and cuts every projection into buckets of one randomly
+    shifted width, chosen so that a bucket holds about `bucket_target`
+    points. A query reranks the union of its buckets exactly; if that gives
+    fewer than K points it falls back to brute force.
+    """
+
+    name = "lsh"
+    requires = None
+
+    def __init__(self, points: np.ndarray, tables: int = 8, hashes: int = 3,
+                 bucket_target: int = 32, seed: int = 0):
+        rng = np.random.default_rng(seed)
+        self.points = points
+        self.directions = rng.normal(size=(tables, hashes, points.shape[1]))
+        projections = np.einsum("thd,nd->nth", self.directions, points)
+        if len(points):
+            span = np.maximum(projections.max(axis=0) - projections.min(axis=0), 1e-6)
+            cells = max(1.0, len(points) / bucket_target)
+            self.width = (np.prod(span, axis=1) / cells) ** (1.0 / hashes)
+        else:
+            self.width = np.ones(tables)
+        self.shifts = rng.uniform(0, 1, size=(tables, hashes)) * self.width[:, None]
+        # Bucket coordinates are folded into one integer key per table;
+        # a rare collision only adds candidates
+        self.weights = rng.integers(1, 1 << 31, hashes)
+        codes = self._codes(projections)
+        self.buckets = []
+        for table in codes.T:
+            order = np.argsort(table, kind="stable")
+            keys, starts, counts = np.unique(table[order], return_index=True, return_counts=True)
+            self.buckets.append((order, keys, starts, starts + counts))
+
+    def _codes(self, projections: np.ndarray) -> np.ndarray:
+        cells = np.floor((projections + self.shifts) / self.width[:, None]).astype(np.int64)
+        return cells @ self.weights
+
+    def query(self, queries: np.ndarray, k: int) -> list[np.ndarray]:
+        result = []
+        k = min(k, len(self.points))
+        codes = self._codes(np.einsum("thd,nd->nth", self.directions, queries))
+        for query, codes in zip(queries, codes):
+            parts = []
+            for (order, keys, starts, ends), code in zip(self.buckets, codes):
+                slot = np.searchsorted(keys, code)
+                if slot < len(keys) and keys[slot] == code:
+                    parts.append(order[starts[slot]:ends[slot]])
+            found = np.unique(np.concatenate(parts)) if parts else np.empty(0, dtype=np.int64)
+            if len(found) < k:
+                found = np.arange(len(self.points))
+            distances = np.linalg.norm(self.points[found] - query, axis=1)
+            result.append(found[_top_k(distances, k)])
+        return result
+
+
+BACKENDS = {
+    backend.name: backend
+    for backend in (BruteForceSearch, KDTreeSearch, GridSearch, RandomProjectionSearch)
+}
+
+
+def get_backend(name: str):
+    """
+    Find a neighbour search backend by name.
+
+    Args:
+        name (str): One of "brute", "kdtree", "grid", "lsh"
+
+    Raises:
+        ValueError: If there is no such backend
+        RuntimeError: If the backend's optional dependency is not installed
+
+    Returns:
+        type: Backend class, built from a (N, D) array of normalized points
+    """
+    try:
+        backend = BACKENDS[name]
+    except KeyError:
+        raise ValueError(f"Unknown KNN backend {name!r}, expected one of {sorted(BACKENDS)}")
+    if backend.requires and importlib.util.find_spec(backend.requires) is None:
+        raise RuntimeError(f"KNN backend {name!r} requires {backend.requires}: "
+                           f"pip install {backend.requires}, or set KNN_BACKEND to "
+                           f"one of {sorted(n for n, b in BACKENDS.items() if not b.requires)}")
+    return backend
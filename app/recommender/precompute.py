@@ -0,0 +1,305 @@
+import logging
+import threading
+import time
+from collections import OrderedDict
+from sqlalchemy import delete, insert
+from sqlmodel import Session, select
+from config import settings
+from models import Dancer, Recommendation
+from schemas import Sex
+from recommender.index import index
+from recommender.results import bucket_of, candidate_buckets
+
+logger = logging.getLogger(__name__)
+
+# SQLite limits the number of bound parameters in one statement
+_IN_CHUNK_SIZE = 900
+
+
+class PrecomputeWorker:
+    """
+    Background thread keeping top-K KNN lists materialized in the
+    `recommendation` table.
+
+    Writes mark work as dirty: a changed dancer's own list, and the
+    (sex, style) buckets whose members are candidates of other dancers.
+    The worker recomputes dirty dancers in batches of `batch_size`, and for
+    a dirty bucket all dancers drawing candidates from it. A dancer's list
+    is served from the table only while neither the dancer nor any of its
+    candidate buckets is dirty; otherwise the endpoint computes on demand.
+
+    Writers never wait for the worker. When more than `max_pending` single
+    dancers are queued, they are collapsed into their buckets, which bounds
+    the queue by the number of buckets.
+
+    Like the recommendation index, the queue lives in process memory.
+    """
+
+    def __init__(self, batch_size: int, k: int, max_pending: int, interval: float):
+        self.batch_size = batch_size
+        self.k = k
+        self.max_pending = max_pending
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+        self._engine = None
+        # dancer id -> (candidate buckets, time marked)
+        self._dirty_dancers: OrderedDict = OrderedDict()
+        # dancer id -> candidate buckets, for dancers of the batch in progress
+        self._running: dict = {}
+        # bucket -> time marked
+        self._dirty_buckets: OrderedDict = OrderedDict()
+        self._active_buckets: dict = {}
+        self._job: tuple | None = None
+        # dancer id -> candidate buckets of a materialized list
+        self._materialized: dict[int, tuple] = {}
+        self.processed = 0
+        self.batches = 0
+        self.collapses = 0
+        self.last_batch_seconds = 0.0
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self, engine):
+        """
+        Start the worker thread and queue a full recomputation.
+
+        Args:
+            engine: Database engine the worker opens its sessions on
+        """
+        if self.running:
+            return
+        self._engine = engine
+        self._stop.clear()
+        with Session(engine) as session:
+            buckets = session.exec(select(Dancer.sex, Dancer.style).distinct()).all()
+        with self._lock:
+            self._materialized.clear()
+            for sex, style in buckets:
+                self._mark_bucket(bucket_of(sex, style), time.monotonic())
+        self._thread = threading.Thread(target=self._run, name="recommendation-precompute",
+                                        daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float | None = 10.0):
+        """
+        Stop the worker thread after its current batch.
+
+        Writes are no longer tracked once it stops, so no stored list is
+        treated as fresh any more.
+        """
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+        self._thread = None
+        with self._lock:
+            self._materialized.clear()
+
+    def dancer_changed(self, dancer_id: int, sex, style, buckets):
+        """
+        Queue recomputation after a dancer was created, changed or deleted.
+
+        Does nothing if the worker is not running.
+
+        Args:
+            dancer_id (int): Changed dancer
+            sex (Sex | str | None): Current sex, None if the dancer was deleted
+            style (str | None): Current style
+            buckets: (sex, style) buckets the change touched
+        """
+        if not self.running:
+            return
+        now = time.monotonic()
+        with self._lock:
+            self._materialized.pop(dancer_id, None)
+            self._dirty_dancers.pop(dancer_id, None)
+            if sex is not None:
+                self._dirty_dancers[dancer_id] = (candidate_buckets(sex, style), now)
+            for bucket in buckets:
+                self._mark_bucket(bucket, now)
+            if len(self._dirty_dancers) > self.max_pending:
+                self._collapse()
+        self._wake.set()
+
+    def everything_changed(self):
+        """Queue a full recomputation, e.g. after a bulk import."""
+        if not self.running:
+            return
+        now = time.monotonic()
+        with self._lock:
+            for buckets, _ in self._dirty_dancers.values():
+                for bucket in buckets:
+                    self._mark_bucket(bucket, now)
+            self._dirty_dancers.clear()
+            self._materialized.clear()
+            # Buckets that appeared in the import are found from the database
+            self._dirty_buckets[None] = now
+        self._wake.set()
+
+    def is_fresh(self, dancer_id: int, k: int) -> bool:
+        """Whether the stored list of a dancer is up to date and long enough."""
+        if k > self.k:
+            return False
+        with self._lock:
+            buckets = self._materialized.get(dancer_id)
+            if buckets is None or dancer_id in self._dirty_dancers or dancer_id in self._running:
+                return False
+            pending = self._dirty_buckets.keys() | self._active_buckets.keys()
+            return None not in pending and not any(bucket in pending for bucket in buckets)
+
+    def stats(self) -> dict:
+        """Queue sizes and how far behind the worker is."""
+        now = time.monotonic()
+        with self._lock:
+            marks = [since for _, since in self._dirty_dancers.values()]
+            marks += list(self._dirty_buckets.values()) + list(self._active_buckets.values())
+            return {
+                "running": self.running,
+                "pending_dancers": len(self._dirty_dancers) + len(self._running),
+                "pending_buckets": len(self._dirty_buckets) + len(self._active_buckets),
+                "job_remaining": len(self._job[1] or ()) if self._job else 0,
+                "lag_seconds": now - min(marks) if marks else 0.0,
+                "materialized": len(self._materialized),
+                "processed": self.processed,
+                "batches": self.batches,
+                "collapses": self.collapses,
+                "last_batch_seconds": self.last_batch_seconds,
+            }
+
+    def _mark_bucket(self, bucket, now: float):
+        self._dirty_buckets.setdefault(bucket, now)
+
+    def _collapse(self):
+        # Every queued dancer is a dependent of its candidate buckets
+        for buckets, since in self._dirty_dancers.values():
+            for bucket in buckets:
+                self._mark_bucket(bucket, since)
+        self._dirty_dancers.clear()
+        self.collapses += 1
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                worked = self._step()
+            except Exception:
+                logger.exception("Recommendation precompute batch failed")
+                worked = False
+            if not worked:
+                self._wake.wait(self.interval)
+                self._wake.clear()
+
+    def _next_batch(self) -> tuple[list[int], tuple | None]:
+        """Take the next batch: queued dancers first, then a bucket's dependents.
+
+        Returns:
+            tuple: Dancer ids and, for a bucket batch, (bucket, is_last_batch)
+        """
+        with self._lock:
+            if self._dirty_dancers:
+                ids = []
+                while self._dirty_dancers and len(ids) < self.batch_size:
+                    dancer_id, (buckets, _) = self._dirty_dancers.popitem(last=False)
+                    ids.append(dancer_id)
+                    self._running[dancer_id] = buckets
+                return ids, None
+            if self._job is None and self._dirty_buckets:
+                bucket, since = self._dirty_buckets.popitem(last=False)
+                self._active_buckets[bucket] = since
+                self._job = (bucket, None)
+            job = self._job
+        if job is None:
+            return [], None
+
+        bucket, dependents = job
+        if dependents is None:
+            dependents = self._dependents(bucket)
+        ids, rest = dependents[:self.batch_size], dependents[self.batch_size:]
+        with self._lock:
+            self._running.update(dict.fromkeys(ids, ()))
+            self._job = (bucket, rest) if rest else None
+        return ids, (bucket, not rest)
+
+    def _dependents(self, bucket) -> list[int]:
+        # Dancers whose candidates come from the bucket: same style, other sex.
+        # The None bucket stands for all dancers
+        query = select(Dancer.id)
+        if bucket is not None:
+            sex, style = bucket
+            query = query.where(Dancer.style == style,
+                                Dancer.sex.in_([other for other in Sex if other != sex]))
+        with Session(self._engine) as session:
+            return list(session.exec(query.order_by(Dancer.id)).all())
+
+    def _step(self) -> bool:
+        try:
+            ids, job = self._next_batch()
+        except Exception:
+            self._fail([], self._job and (self._job[0], True))
+            raise
+        if not ids and job is None:
+            return False
+        started = time.perf_counter()
+        try:
+            computed = self._compute(ids) if ids else {}
+        except Exception:
+            self._fail(ids, job)
+            raise
+
+        with self._lock:
+            for dancer_id in ids:
+                self._running.pop(dancer_id, None)
+                if dancer_id in computed and dancer_id not in self._dirty_dancers:
+                    self._materialized[dancer_id] = computed[dancer_id]
+            if job is not None and job[1]:
+                self._active_buckets.pop(job[0], None)
+            self.processed += len(ids)
+            self.batches += 1
+            self.last_batch_seconds = time.perf_counter() - started
+        return True
+
+    def _fail(self, ids: list[int], job: tuple | None):
+        # Put the work back so it is retried
+        now = time.monotonic()
+        with self._lock:
+            running = {dancer_id: self._running.pop(dancer_id, ()) for dancer_id in ids}
+            if job is None:
+                for dancer_id, buckets in running.items():
+                    self._dirty_dancers.setdefault(dancer_id, (buckets, now))
+                return
+            bucket = job[0]
+            self._job = None
+            self._mark_bucket(bucket, self._active_buckets.pop(bucket, now))
+
+    def _compute(self, ids: list[int]) -> dict[int, tuple]:
+        """Recompute and store the lists of a batch; return the materialized ones."""
+        with Session(self._engine) as session:
+            index.ensure_loaded(session)
+            rows = []
+            for start in range(0, len(ids), _IN_CHUNK_SIZE):
+                chunk = ids[start:start + _IN_CHUNK_SIZE]
+                rows += session.exec(select(
+                    Dancer.id, Dancer.sex, Dancer.style, Dancer.level, Dancer.age, Dancer.height
+                ).where(Dancer.id.in_(chunk))).all()
+            results = index.nearest_for(rows, self.k)
+
+            for start in range(0, len(ids), _IN_CHUNK_SIZE):
+                chunk = ids[start:start + _IN_CHUNK_SIZE]
+                session.execute(delete(Recommendation).where(Recommendation.dancer_id.in_(chunk)))
+            values = [{"dancer_id": dancer_id, "rank": rank, "candidate_id": candidate_id}
+                      for dancer_id, top_ids in results.items()
+                      for rank, candidate_id in enumerate(top_ids)]
+            if values:
+                session.execute(insert(Recommendation), values)
+            session.commit()
+
+        buckets = {row[0]: candidate_buckets(row[1], row[2]) for row in rows}
+        return {dancer_id: buckets[dancer_id] for dancer_id in results}
+
+
+worker = PrecomputeWorker(settings.precompute_batch_size, settings.precompute_k,
+                          settings.precompute_max_pending, settings.precompute_interval)
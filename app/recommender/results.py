@@ -0,0 +1,153 @@
+import threading
+from cache import TTLCache
+from config import settings
+from schemas import Sex
+
+
+def bucket_of(sex, style) -> tuple:
+    """
+    Build the (sex, style) bucket key of a dancer.
+
+    Args:
+        sex (Sex | str): Dancer's sex
+        style (str | None): Dance style
+
+    Returns:
+        tuple: (sex, style) key with the enum member normalized
+    """
+    return (Sex(sex), style)
+
+
+def candidate_buckets(sex, style) -> tuple:
+    """Buckets a dancer's recommendations are drawn from: other sexes, same style."""
+    return tuple(bucket_of(other, style) for other in Sex if other != Sex(sex))
+
+
+class RecommendationCache:
+    """
+    LRU cache of recommendation lists keyed by (dancer_id, algorithm, k).
+
+    Entries live in a `cache.TTLCache` and remember the buckets their
+    candidates come from. A write that touches a bucket drops the entries
+    depending on it, and entries of the changed dancer itself. Buckets and
+    dancers also have generation counters: a result computed while its
+    dancer or one of its buckets changed is not stored, so a list computed
+    before a write can't be served after it. Only written dancers get a
+    counter, so lookups of unknown ids don't grow the cache.
+
+    Invalidation only sees writes made by this process. Entries also expire
+    after `ttl` seconds, which bounds how long another worker process can
+    serve a list made stale by a write it did not see.
+
+    Args:
+        maxsize (int): Maximum number of cached lists, 0 disables the cache
+        ttl (float | None): Lifetime of an entry in seconds, None - no expiry
+    """
+
+    def __init__(self, maxsize: int, ttl: float | None = None):
+        self.maxsize = maxsize
+        self._entries = TTLCache(maxsize, ttl)
+        self._dancer_generations: dict[int, int] = {}
+        self._bucket_generations: dict[tuple, int] = {}
+        self._epoch = 0
+        self._lock = threading.Lock()
+        self.invalidations = 0
+        self.stale = 0
+
+    def get(self, dancer_id: int, algorithm: str, k: int | None = None):
+        """Return the cached list or None and mark it as recently used."""
+        entry = self._entries.get((dancer_id, algorithm, k))
+        return None if entry is None else entry[0]
+
+    def generations(self, dancer_id: int) -> tuple:
+        """
+        Current generation of a dancer, taken before reading it.
+
+        Args:
+            dancer_id (int): ID of the dancer the result is computed for
+
+        Returns:
+            tuple: Token to extend with `bucket_generations`
+        """
+        with self._lock:
+            return (self._epoch, self._dancer_generations.get(dancer_id, 0))
+
+    def bucket_generations(self, token: tuple, buckets: tuple) -> tuple:
+        """
+        Add the generations of the result's buckets once the dancer is read.
+
+        Must be taken before the candidates are read.
+
+        Args:
+            token (tuple): Result of `generations`
+            buckets (tuple): Buckets the result will depend on
+
+        Returns:
+            tuple: Token to pass to `set`
+        """
+        with self._lock:
+            return (*token, *(self._bucket_generations.get(bucket, 0) for bucket in buckets))
+
+    def set(self, dancer_id: int, algorithm: str, k: int | None,
+            value, buckets: tuple, generations: tuple):
+        """
+        Store a computed list unless its dancer or one of its buckets changed meanwhile.
+
+        Args:
+            dancer_id (int): ID of the dancer the list was computed for
+            algorithm (str): Recommendation algorithm name
+            k (int | None): Number of neighbours, None if not applicable
+            value: Recommendation list
+            buckets (tuple): Buckets the list depends on
+            generations (tuple): Result of `bucket_generations`
+        """
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            current = (self._epoch, self._dancer_generations.get(dancer_id, 0),
+                       *(self._bucket_generations.get(bucket, 0) for bucket in buckets))
+            if generations != current:
+                self.stale += 1
+                return
+            self._entries.set((dancer_id, algorithm, k), (value, frozenset(buckets)))
+
+    def invalidate(self, dancer_id: int | None = None, buckets=()) -> int:
+        """
+        Drop the lists of a dancer and all lists drawn from the given buckets.
+
+        Args:
+            dancer_id (int | None): Changed dancer
+            buckets: (sex, style) buckets the change touched
+
+        Returns:
+            int: Number of dropped lists
+        """
+        buckets = frozenset(buckets)
+        with self._lock:
+            if dancer_id is not None:
+                self._dancer_generations[dancer_id] = self._dancer_generations.get(dancer_id, 0) + 1
+            for bucket in buckets:
+                self._bucket_generations[bucket] = self._bucket_generations.get(bucket, 0) + 1
+            dropped = self._entries.discard_where(
+                lambda key, entry: key[0] == dancer_id or not buckets.isdisjoint(entry[1]))
+            self.invalidations += dropped
+        return dropped
+
+    def clear(self):
+        """Drop everything; results being computed are not stored either."""
+        with self._lock:
+            self._entries.clear()
+            self._dancer_generations.clear()
+            self._epoch += 1
+
+    def stats(self) -> dict:
+        """Hit rate and invalidation counters."""
+        return {
+            **self._entries.stats(),
+            "invalidations": self.invalidations,
+            "stale_rejected": self.stale,
+        }
+
+
+recommendation_cache = RecommendationCache(settings.recommendation_cache_size,
+                                           settings.recommendation_cache_ttl or None)
@@ -0,0 +1,94 @@
+import functools
+import inspect
+from fastapi import APIRouter
+from fastapi.routing import APIRoute, APIWebSocketRoute
+from db.session import SessionDep, AsyncSessionDep
+
+
+def _async_endpoint(endpoint):
+    """
+    Построить асинхронную версию обработчика, работающую с AsyncSession.
+
+    Синхронный обработчик выполняется через `AsyncSession.run_sync`: его код
+    с синхронной сессией идет в greenlet на event loop, а каждое обращение
+    к базе ожидается асинхронным драйвером, без потока на запрос.
+    Асинхронный обработчик получает AsyncSession напрямую.
+
+    Args:
+        endpoint: Функция-обработчик маршрута
+
+    Returns:
+        Асинхронная функция с той же сигнатурой, где SessionDep заменен на
+        AsyncSessionDep
+    """
+    signature = inspect.signature(endpoint)
+    session_params = [name for name, param in signature.parameters.items()
+                      if param.annotation == SessionDep]
+    if not session_params:
+        return endpoint
+
+    async_signature = signature.replace(parameters=[
+        param.replace(annotation=AsyncSessionDep) if name in session_params else param
+        for name, param in signature.parameters.items()
+    ])
+
+    if inspect.iscoroutinefunction(endpoint):
+        @functools.wraps(endpoint)
+        async def wrapper(**kwargs):
+            return await endpoint(**kwargs)
+    else:
+        session_param = session_params[0]
+
+        @functools.wraps(endpoint)
+        async def wrapper(**kwargs):
+            session = kwargs.pop(session_param)
+            return await session.run_sync(
+                lambda sync_session: endpoint(**kwargs, **{session_param: sync_session})
+            )
+
+    wrapper.__signature__ = async_signature
+    return wrapper
+
+
+def to_async_router(router: APIRouter) -> APIRouter:
+    """
+    Создать копию роутера, все обработчики которого асинхронные.
+
+    Args:
+        router (APIRouter): Исходный роутер с обработчиками на SessionDep
+
+    Returns:
+        APIRouter: Роутер с теми же путями на AsyncSessionDep
+    """
+    async_router = APIRouter()
+    for route in router.routes:
+        if isinstance(route, APIWebSocketRoute):
+            async_router.add_api_websocket_route(
+                route.path,
+                _async_endpoint(route.endpoint),
+                name=route.name,
+                dependencies=route.dependencies,
+            )
+            continue
+        if not isinstance(route, APIRoute):
+            async_router.routes.append(route)
+            continue
+        async_router.add_api_route(
+            route.path,
+            _async_endpoint(route.endpoint),
+            response_model=route.response_model,
+            status_code=route.status_code,
+            tags=route.tags,
+            dependencies=route.dependencies,
+            summary=route.summary,
+            description=route.description,
+            response_description=route.response_description,
+            responses=route.responses,
+            deprecated=route.deprecated,
+            methods=route.methods,
+            operation_id=route.operation_id,
+            include_in_schema=route.include_in_schema,
+            response_class=route.response_class,
+            name=route.name,
+        )
+    return async_router
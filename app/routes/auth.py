@@ -3,12 +3,17 @@ from psycopg2.errors import UniqueViolation
 from fastapi import APIRouter, status, HTTPException, Depends
 from fastapi.security.oauth2 import OAuth2PasswordRequestForm
 from models import User
-from auth_handler import (get_password_hash,
-                          verify_password,
+from schemas import UserType
+from auth_handler import (hash_password_async,
+                          verify_password_async,
                           create_access_token,
                           get_current_user,
+                          user_claims,
+                          forget_user,
+                          user_cache,
                           ACCESS_TOKEN_EXPIRE_MINUTES)
-from db.session import SessionDep
+from db.session import SessionDep, run_db
+from passwords import needs_rehash
 from sqlmodel import select
 from datetime import timedelta
 
@@ -18,17 +23,20 @@ app = APIRouter(prefix='/auth',tags=['auth'])
 @app.post("/signup", status_code=status.HTTP_201_CREATED,
              response_model=int,
              summary = 'Добавить пользователя')
-def create_user(user: User,
-                session: SessionDep):
+async def create_user(user: User,
+                      session: SessionDep):
     """
     Зарегистрировать нового пользователя системы.
 
+    Пароль хэшируется в пуле процессов, не занимая обработчики запросов.
+
     Args:
         user (User): Данные нового пользователя
         session (Session): Сессия базы данных
 
     Raises:
         HTTPException: 422 если email уже зарегистрирован
+        HTTPException: 503 если очередь хэширования паролей переполнена
 
     Returns:
         int: ID созданного пользователя
@@ -39,40 +47,48 @@ def create_user(user: User,
         email=user.email,
         user_type=user.user_type,
         dancer_id=user.dancer_id,
-        password=get_password_hash(user.password)
+        password=await hash_password_async(user.password)
     )
-    try:
-        session.add(new_user)
-        session.commit()
-        session.refresh(new_user)
-        return new_user.user_id
-    except IntegrityError as e:
-        assert isinstance(e.orig, UniqueViolation)
-        raise HTTPException(
-            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
-            detail=f"User with email {user.email} already exists"
-        )
+
+    def save(session):
+        try:
+            session.add(new_user)
+            session.commit()
+            session.refresh(new_user)
+            return new_user.user_id
+        except IntegrityError as e:
+            assert isinstance(e.orig, UniqueViolation)
+            raise HTTPException(
+                status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                detail=f"User with email {user.email} already exists"
+            )
+
+    return await run_db(session, save)
 
 @app.post("/login", status_code=status.HTTP_200_OK,
              summary = 'Войти в систему')
-def user_login(session: SessionDep, login_attempt_data: OAuth2PasswordRequestForm = Depends()):
+async def user_login(session: SessionDep, login_attempt_data: OAuth2PasswordRequestForm = Depends()):
     statement = (select(User)
                  .where(User.email == login_attempt_data.username))
     """
     Аутентификация пользователя и получение JWT токена.
 
+    Проверка пароля выполняется в пуле процессов. Если хэш пароля устарел
+    (например, увеличена стоимость bcrypt), он пересчитывается и сохраняется.
+
     Args:
         login_attempt_data (OAuth2PasswordRequestForm): Данные для входа
         db_session (Session): Сессия базы данных
 
     Raises:
         HTTPException: 401 при неверных учетных данных
+        HTTPException: 503 если очередь хэширования паролей переполнена
 
     Returns:
         dict: JWT токен доступа
     """
 
-    existing_user = session.exec(statement).first()
+    existing_user = await run_db(session, lambda s: s.exec(statement).first())
 
     if not existing_user:
         raise HTTPException(
@@ -80,12 +96,27 @@ def user_login(session: SessionDep, login_attempt_data: OAuth2PasswordRequestFor
             detail=f"User {login_attempt_data.username} not found"
         )
 
-    if verify_password(
+    if await verify_password_async(
             login_attempt_data.password,
             existing_user.password):
+        # Данные токена читаются до коммита: после него атрибуты
+        # пользователя истекают, а в режиме AsyncSession их нельзя
+        # подгрузить вне run_db
+        claims = user_claims(existing_user)
+        if needs_rehash(existing_user.password):
+            new_hash = await hash_password_async(login_attempt_data.password)
+
+            def rehash(session):
+                existing_user.password = new_hash
+                session.add(existing_user)
+                session.commit()
+                forget_user(login_attempt_data.username)
+
+            await run_db(session, rehash)
+
         access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
         access_token = create_access_token(
-            data={"sub": login_attempt_data.username},
+            data=claims,
             expires_delta=access_token_expires
         )
         return {
@@ -125,6 +156,26 @@ def delete_user(user_id: int,
     user = session.get(User, user_id)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
+    email = user.email
     session.delete(user)
     session.commit()
+    forget_user(email)
     return {"ok": True}
+
+@app.get("/cache/stats", summary='Статистика кэша аутентификации')
+def auth_cache_stats(current_user = Depends(get_current_user)):
+    """
+    Получить счетчики попаданий и промахов кэша пользователей.
+
+    Raises:
+        HTTPException: 403 если пользователь не администратор
+
+    Returns:
+        dict: Размер кэша, попадания, промахи, вытеснения и доля попаданий
+    """
+    if current_user.user_type != UserType.ADMIN:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Only admins can see cache statistics",
+        )
+    return user_cache.stats()
@@ -1,85 +1,476 @@
-from fastapi import APIRouter, HTTPException, status, Depends
-from db.session import SessionDep
+import time
+from typing import Annotated
+from fastapi import APIRouter, HTTPException, status, Depends, Query, Request, Response
+from fastapi.encoders import jsonable_encoder
+from fastapi.exceptions import RequestValidationError
+from fastapi.responses import JSONResponse
+from sqlalchemy import insert, delete, func, bindparam
+from sqlalchemy.exc import IntegrityError, DataError
 from sqlmodel import select
-from models import Dancer
+from pydantic import ValidationError
+from db.session import SessionDep, run_db, begin_write
+from models import Dancer, Pair, PairMember, Recommendation, Request as PartnerRequest
+from schemas import (StatusType, UserType, RequestStatus, get_level_value,
+                     DancerCreate, DancerUpdate, DancerResponse,
+                     DancerBatchRequest, DancerBatchResponse)
+from ingest import iter_records, validate_record
+from pagination import (DEFAULT_LIMIT, CursorQuery, TimeCursorQuery, LimitQuery, FieldsQuery,
+                        paginate_by_time,
+                        parse_fields, paginate, page_response)
 from auth_handler import get_current_user
+from config import settings
+from serialization import FastJSONResponse, model_columns
+from etags import IfNoneMatchHeader, conditional_response, invalidate_responses, make_etag
+from recommender.hooks import dancer_saved, dancer_deleted, dancers_bulk_changed
+from notifications import hub
+from routes.pairs import dancer_pairs_query
 
 
 
 app = APIRouter(prefix="/dancers", tags=['dancers'])
 
+BULK_CHUNK_SIZE = 1000
+BULK_MAX_REPORTED_ERRORS = 1000
+
 @app.post("/", status_code=status.HTTP_201_CREATED)
-def create_dancer(dancer: Dancer, session: SessionDep) -> Dancer:
+def create_dancer(dancer_in: DancerCreate, session: SessionDep) -> DancerResponse:
     """
     Создать нового танцора в базе данных.
 
     Args:
-        dancer (Dancer): Объект танцора с данными для создания
+        dancer_in (DancerCreate): Данные нового танцора
         session (SessionDep): Сессия базы данных
 
     Returns:
-        Dancer: Созданный объект танцора с присвоенным ID
+        DancerResponse: Созданный объект танцора с присвоенным ID
     """
 
+    dancer = Dancer.model_validate(dancer_in)
+    dancer.version = 1
     session.add(dancer)
     session.commit()
     session.refresh(dancer)
+    dancer_saved(dancer)
     return dancer
 
+@app.post("/bulk")
+async def bulk_create_dancers(request: Request,
+                              session: SessionDep,
+                              current_user = Depends(get_current_user)) -> dict:
+    """
+    Массово загрузить танцоров из потока CSV или NDJSON.
+
+    Тело читается по мере поступления. Строки проверяются по модели DancerCreate
+    и вставляются пачками по BULK_CHUNK_SIZE одной командой executemany,
+    каждая пачка в своей транзакции. Если база отклонила пачку (нарушение
+    ограничения или недопустимое значение), пачка повторяется по одной
+    строке. Некорректные строки пропускаются и попадают в отчет. Прочие
+    ошибки базы прерывают загрузку; уже вставленные пачки остаются.
+    CSV должен начинаться со строки заголовка.
+
+    Args:
+        request (Request): Запрос с телом text/csv или application/x-ndjson
+        session (SessionDep): Сессия базы данных
+
+    Raises:
+        HTTPException: 403 если пользователь не администратор
+        HTTPException: 415 если формат тела не поддерживается
+        HTTPException: 400 если заголовок CSV не удалось разобрать
+
+    Returns:
+        dict: Число вставленных и отклоненных строк, ошибки по номерам строк
+            файла (с 1, для CSV считая заголовок) и скорость загрузки
+    """
+    if current_user.user_type != UserType.ADMIN:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Only admins can import dancers",
+        )
+
+    started = time.perf_counter()
+    inserted = 0
+    failed = 0
+    errors = []
+
+    def report(row_number, row_errors):
+        nonlocal failed
+        failed += 1
+        if len(errors) < BULK_MAX_REPORTED_ERRORS:
+            errors.append({"row": row_number, "errors": row_errors})
+
+    def insert_chunk(session, chunk):
+        """Вставить пачку; вернуть номера строк, отклоненных базой."""
+        try:
+            session.execute(insert(Dancer), [row for _, row in chunk])
+            session.commit()
+            return []
+        except (IntegrityError, DataError):
+            session.rollback()
+        rejected = []
+        for row_number, row in chunk:
+            try:
+                session.execute(insert(Dancer), [row])
+                session.commit()
+            except (IntegrityError, DataError):
+                session.rollback()
+                rejected.append(row_number)
+        return rejected
+
+    async def flush(chunk):
+        nonlocal inserted
+        if not chunk:
+            return
+        rejected = await run_db(session, lambda s: insert_chunk(s, chunk))
+        inserted += len(chunk) - len(rejected)
+        for row_number in rejected:
+            report(row_number, [{"loc": [], "msg": "Rejected by the database"}])
+
+    chunk = []
+    rows = 0
+    async for row_number, record in iter_records(request.stream(),
+                                                 request.headers.get("content-type", "")):
+        rows += 1
+        dancer, row_errors = validate_record(DancerCreate, record)
+        if row_errors:
+            report(row_number, row_errors)
+            continue
+        row = dancer.model_dump()
+        row["level_rank"] = get_level_value(dancer.level)
+        row["version"] = 1
+        chunk.append((row_number, row))
+        if len(chunk) >= BULK_CHUNK_SIZE:
+            await flush(chunk)
+            chunk = []
+    await flush(chunk)
+
+    if inserted:
+        dancers_bulk_changed()
+
+    elapsed = time.perf_counter() - started
+    return {
+        "inserted": inserted,
+        "failed": failed,
+        "errors": errors,
+        "errors_truncated": failed > len(errors),
+        "elapsed_seconds": round(elapsed, 3),
+        "rows_per_second": round(rows / elapsed, 1) if elapsed else None,
+    }
+
 @app.get("/")
 def read_dancers(
     session: SessionDep,
-) -> list[Dancer]:
+    response: Response,
+    cursor: CursorQuery = None,
+    limit: LimitQuery = DEFAULT_LIMIT,
+    fields: FieldsQuery = None,
+    name: str | None = None,
+    min_age: int | None = None,
+    max_age: int | None = None,
+    min_height: float | None = None,
+    max_height: float | None = None,
+    dancer_status: Annotated[StatusType | None, Query(alias="status")] = None,
+) -> list[DancerResponse]:
+    """
+    Получить страницу списка зарегистрированных танцоров.
+
+    Страницы упорядочены по id. Если есть следующая страница, ее курсор
+    возвращается в заголовке X-Next-Cursor.
+
+    Args:
+        session (SessionDep): Сессия базы данных
+        response (Response): Ответ для заголовка курсора
+        cursor (int | None): id последнего танцора предыдущей страницы
+        limit (int): Размер страницы
+        fields (str | None): Возвращаемые поля через запятую
+        name (str | None): Фильтр по имени
+        min_age, max_age (int | None): Фильтр по возрасту
+        min_height, max_height (float | None): Фильтр по росту
+        dancer_status (StatusType | None): Фильтр по статусу (параметр status)
+
+    Raises:
+        HTTPException: 400 если запрошено неизвестное поле
+
+    Returns:
+        list[DancerResponse]: Список объектов танцоров
+    """
+
+    selected = parse_fields(fields, DancerResponse)
+    if selected is None and settings.fast_json:
+        selected = model_columns(DancerResponse)
+    conditions = []
+    if name is not None:
+        conditions.append(Dancer.name == name)
+    if min_age is not None:
+        conditions.append(Dancer.age >= min_age)
+    if max_age is not None:
+        conditions.append(Dancer.age <= max_age)
+    if min_height is not None:
+        conditions.append(Dancer.height >= min_height)
+    if max_height is not None:
+        conditions.append(Dancer.height <= max_height)
+    if dancer_status is not None:
+        conditions.append(Dancer.status == dancer_status)
+
+    dancers, next_cursor = paginate(session, Dancer, conditions, cursor, limit, selected)
+    return page_response(response, dancers, next_cursor, selected)
+
+def _read_dancers_batch(session, ids: list[int], fields: str | None):
+    """
+    Прочитать танцоров по списку id одним запросом.
+
+    Повторяющиеся id отдаются один раз, порядок ответа совпадает с порядком
+    запроса. Значения id подставляются в IN литералами, поэтому запрос не
+    упирается в ограничение SQLite на число связанных параметров.
+
+    Args:
+        session (SessionDep): Сессия базы данных
+        ids (list[int]): Запрошенные id
+        fields (str | None): Возвращаемые поля через запятую
+
+    Raises:
+        HTTPException: 400 если запрошено неизвестное поле
+
+    Returns:
+        DancerBatchResponse | JSONResponse: Найденные танцоры и отсутствующие id
+    """
+    ids = list(dict.fromkeys(ids))
+    selected = parse_fields(fields, DancerResponse)
+    if selected is None and settings.fast_json:
+        selected = model_columns(DancerResponse)
+    in_ids = Dancer.id.in_(bindparam("ids", ids, expanding=True, literal_execute=True))
+    if selected is None:
+        found = {dancer.id: dancer
+                 for dancer in session.exec(select(Dancer).where(in_ids)).all()}
+    else:
+        statement = select(*[getattr(Dancer, name) for name in selected]).where(in_ids)
+        found = {row[0]: dict(zip(row._fields, row))
+                 for row in session.exec(statement).all()}
+
+    dancers = [found[dancer_id] for dancer_id in ids if dancer_id in found]
+    missing = [dancer_id for dancer_id in ids if dancer_id not in found]
+    if selected is None:
+        return DancerBatchResponse(dancers=dancers, missing=missing)
+    content = {"dancers": dancers, "missing": missing}
+    if settings.fast_json:
+        return FastJSONResponse(content=content)
+    return JSONResponse(content=jsonable_encoder(content))
+
+@app.get("/batch")
+def read_dancers_batch(
+    session: SessionDep,
+    ids: Annotated[str, Query(description="id танцоров через запятую")],
+    fields: FieldsQuery = None,
+) -> DancerBatchResponse:
     """
-    Получить список всех зарегистрированных танцоров.
+    Получить танцоров по списку id.
+
+    Танцоры возвращаются в порядке запроса, id, которых нет в базе,
+    перечисляются в missing. Для длинных списков есть POST /dancers/batch.
 
     Args:
         session (SessionDep): Сессия базы данных
+        ids (str): id танцоров через запятую
+        fields (str | None): Возвращаемые поля через запятую
+
+    Raises:
+        RequestValidationError: 422 если id не целые, их нет или больше
+            DANCER_BATCH_MAX_IDS - как у POST /dancers/batch
+        HTTPException: 400 если запрошено неизвестное поле
 
     Returns:
-        list[Dancer]: Список объектов танцоров
+        DancerBatchResponse: Найденные танцоры и отсутствующие id
     """
 
-    dancers = session.exec(select(Dancer)).all()
-    return dancers
+    # Список проверяется той же моделью, что и тело POST, с теми же ошибками 422
+    try:
+        batch = DancerBatchRequest(ids=[value.strip() for value in ids.split(",") if value.strip()])
+    except ValidationError as e:
+        raise RequestValidationError([{**error, "loc": ("query", *error["loc"])}
+                                      for error in e.errors(include_url=False)])
+    return _read_dancers_batch(session, batch.ids, fields)
+
+@app.post("/batch")
+def read_dancers_batch_post(
+    batch: DancerBatchRequest,
+    session: SessionDep,
+    fields: FieldsQuery = None,
+) -> DancerBatchResponse:
+    """
+    Получить танцоров по списку id из тела запроса.
+
+    То же, что GET /dancers/batch, для списков, не помещающихся в URL.
+
+    Args:
+        batch (DancerBatchRequest): Запрошенные id
+        session (SessionDep): Сессия базы данных
+        fields (str | None): Возвращаемые поля через запятую
+
+    Raises:
+        HTTPException: 400 если запрошено неизвестное поле
+
+    Returns:
+        DancerBatchResponse: Найденные танцоры и отсутствующие id
+    """
+
+    return _read_dancers_batch(session, batch.ids, fields)
 
 @app.get("/{dancer_id}")
-def read_dancer(dancer_id: int, session: SessionDep) -> Dancer:
+def read_dancer(dancer_id: int, session: SessionDep,
+                if_none_match: IfNoneMatchHeader = None) -> DancerResponse:
     """
     Получить информацию о танцоре по его ID.
 
+    Ответ содержит слабый ETag из версии танцора. Если клиент прислал его
+    в If-None-Match, а танцор не менялся, возвращается 304 без тела.
+
     Args:
         dancer_id (int): Уникальный идентификатор танцора
         session (SessionDep): Сессия базы данных
+        if_none_match (str | None): Заголовок If-None-Match
 
     Raises:
         HTTPException: 404 если танцор не найден
 
     Returns:
-        Dancer: Объект танцора с запрошенным ID
+        DancerResponse: Объект танцора с запрошенным ID
     """
     dancer = session.get(Dancer, dancer_id)
     if not dancer:
         raise HTTPException(status_code=404, detail="Dancer not found")
-    return dancer
+    return conditional_response(if_none_match, ("dancer", dancer_id),
+                                make_etag(dancer.id, dancer.version),
+                                lambda: DancerResponse.model_validate(dancer).model_dump(mode="json"))
+
+def _dancer_requests(session, response, dancer_column, dancer_id: int,
+                     cursor, limit: int, fields, request_status):
+    if session.get(Dancer, dancer_id) is None:
+        raise HTTPException(status_code=404, detail="Dancer not found")
+    selected = parse_fields(fields, PartnerRequest)
+    if selected is None and settings.fast_json:
+        selected = model_columns(PartnerRequest)
+    conditions = [dancer_column == dancer_id]
+    if request_status is not None:
+        conditions.append(PartnerRequest.status == request_status)
+    requests, next_cursor = paginate_by_time(session, PartnerRequest, conditions,
+                                             cursor, limit, selected)
+    return page_response(response, requests, next_cursor, selected)
+
+@app.get("/{dancer_id}/requests/incoming")
+def read_incoming_requests(
+    dancer_id: int,
+    session: SessionDep,
+    response: Response,
+    cursor: TimeCursorQuery = None,
+    limit: LimitQuery = DEFAULT_LIMIT,
+    fields: FieldsQuery = None,
+    request_status: Annotated[RequestStatus | None, Query(alias="status")] = None,
+) -> list[PartnerRequest]:
+    """
+    Получить страницу входящих запросов танцора, от новых к старым.
+
+    Страницы упорядочены по (created_at, id) и выбираются по индексу
+    (receiver_id, status, created_at, id). Если есть следующая страница,
+    ее курсор возвращается в заголовке X-Next-Cursor.
+
+    Args:
+        dancer_id (int): ID получателя запросов
+        session (SessionDep): Сессия базы данных
+        response (Response): Ответ для заголовка курсора
+        cursor (str | None): Курсор из X-Next-Cursor предыдущей страницы
+        limit (int): Размер страницы
+        fields (str | None): Возвращаемые поля через запятую
+        request_status (RequestStatus | None): Фильтр по статусу (параметр status)
+
+    Raises:
+        HTTPException: 404 если танцор не найден
+        HTTPException: 400 если запрошено неизвестное поле или курсор поврежден
+
+    Returns:
+        list[Request]: Входящие запросы
+    """
+    return _dancer_requests(session, response, PartnerRequest.receiver_id, dancer_id,
+                            cursor, limit, fields, request_status)
+
+@app.get("/{dancer_id}/requests/outgoing")
+def read_outgoing_requests(
+    dancer_id: int,
+    session: SessionDep,
+    response: Response,
+    cursor: TimeCursorQuery = None,
+    limit: LimitQuery = DEFAULT_LIMIT,
+    fields: FieldsQuery = None,
+    request_status: Annotated[RequestStatus | None, Query(alias="status")] = None,
+) -> list[PartnerRequest]:
+    """
+    Получить страницу исходящих запросов танцора, от новых к старым.
+
+    То же, что и входящие, но по индексу (sender_id, status, created_at, id).
+
+    Args:
+        dancer_id (int): ID отправителя запросов
+        session (SessionDep): Сессия базы данных
+        response (Response): Ответ для заголовка курсора
+        cursor (str | None): Курсор из X-Next-Cursor предыдущей страницы
+        limit (int): Размер страницы
+        fields (str | None): Возвращаемые поля через запятую
+        request_status (RequestStatus | None): Фильтр по статусу (параметр status)
+
+    Raises:
+        HTTPException: 404 если танцор не найден
+        HTTPException: 400 если запрошено неизвестное поле или курсор поврежден
+
+    Returns:
+        list[Request]: Исходящие запросы
+    """
+    return _dancer_requests(session, response, PartnerRequest.sender_id, dancer_id,
+                            cursor, limit, fields, request_status)
+
+@app.get("/{dancer_id}/requests/incoming/count")
+def count_incoming_requests(
+    dancer_id: int,
+    session: SessionDep,
+    request_status: Annotated[RequestStatus, Query(alias="status")] = RequestStatus.PENDING,
+) -> dict:
+    """
+    Посчитать входящие запросы танцора с заданным статусом (по умолчанию PENDING).
+
+    Рассчитано на частый опрос клиентами: один COUNT по покрывающему индексу
+    (receiver_id, status, ...), без проверки существования танцора -
+    для несуществующего танцора возвращается 0.
+
+    Args:
+        dancer_id (int): ID получателя запросов
+        session (SessionDep): Сессия базы данных
+        request_status (RequestStatus): Статус запросов (параметр status)
+
+    Returns:
+        dict: {"dancer_id": ..., "status": ..., "count": ...}
+    """
+    count = session.exec(
+        select(func.count()).select_from(PartnerRequest).where(
+            PartnerRequest.receiver_id == dancer_id,
+            PartnerRequest.status == request_status,
+        )
+    ).one()
+    return {"dancer_id": dancer_id, "status": request_status, "count": count}
 
 @app.put("/{dancer_id}")
-def update_dancer(dancer_upd: Dancer, 
+def update_dancer(dancer_upd: DancerUpdate, 
                   session: SessionDep,
                   current_user:dict = Depends(get_current_user)
-                  ) -> Dancer:
+                  ) -> DancerResponse:
     """
     Полностью обновить информацию о танцоре.
     
     Args:
-        dancer_upd (Dancer): Обновленные данные танцора
+        dancer_upd (DancerUpdate): Обновленные данные танцора
         session (SessionDep): Сессия базы данных
 
     Raises:
         HTTPException: 404 если танцор не найден
 
     Returns:
-        Dancer: Обновленный объект танцора
+        DancerResponse: Обновленный объект танцора
     """
     if not(current_user.dancer_id is None) and current_user.dancer_id != dancer_upd.id:
         raise HTTPException(
@@ -94,6 +485,7 @@ def update_dancer(dancer_upd: Dancer,
     if not dancer:
         raise HTTPException(status_code=404, detail="Dancer not found")
 
+    previous = (dancer.sex, dancer.style)
     dancer.name = dancer_upd.name
     dancer.age = dancer_upd.age
     dancer.height = dancer_upd.height
@@ -105,6 +497,8 @@ def update_dancer(dancer_upd: Dancer,
 
     session.commit()
     session.refresh(dancer)
+    dancer_saved(dancer, previous)
+    invalidate_responses("dancer", dancer.id)
 
     return dancer
 
@@ -114,7 +508,10 @@ def delete_dancer(dancer_id: int,
                   current_user:dict = Depends(get_current_user)):
     """
     Удалить танцора из системы по его ID.
-    
+
+    Пары танцора удаляются вместе с ним, его партнеры возвращаются
+    в статус IN_SEARCH и получают событие pair_deleted.
+
     Args:
         dancer_id (int): Уникальный идентификатор танцора
         session (SessionDep): Сессия базы данных
@@ -132,9 +529,43 @@ def delete_dancer(dancer_id: int,
             "User should have an existing dancer_id." \
             "Dancer with dancer_id should exist and be the same delete user_id.",
         )
-    dancer = session.get(Dancer, dancer_id)
+    begin_write(session)
+    dancer = session.get(Dancer, dancer_id, with_for_update=True)
     if not dancer:
         raise HTTPException(status_code=404, detail="Dancer not found")
+    previous = (dancer.sex, dancer.style)
+
+    # Пары танцора распадаются, партнеры снова в поиске
+    pairs = session.exec(select(Pair).where(
+        Pair.id.in_(dancer_pairs_query(dancer_id)))).all()
+    pair_ids = [pair.id for pair in pairs]
+    partners = []
+    if pair_ids:
+        session.execute(delete(PairMember).where(PairMember.pair_id.in_(pair_ids)))
+        session.execute(delete(Pair).where(Pair.id.in_(pair_ids)))
+        partner_ids = {pair.dancer2_id if pair.dancer1_id == dancer_id else pair.dancer1_id
+                       for pair in pairs}
+        partners = session.exec(select(Dancer).where(Dancer.id.in_(partner_ids))
+                                .with_for_update()).all()
+        for partner in partners:
+            if partner.status == StatusType.IN_PAIR:
+                partner.status = StatusType.IN_SEARCH
+                session.add(partner)
+
+    # Внешние ключи SQLite выключены, ON DELETE CASCADE там не срабатывает
+    session.execute(delete(PairMember).where(PairMember.dancer_id == dancer_id))
+    session.execute(delete(Recommendation).where(
+        (Recommendation.dancer_id == dancer_id) | (Recommendation.candidate_id == dancer_id)))
     session.delete(dancer)
     session.commit()
+    dancer_deleted(dancer_id, previous)
+    for partner in partners:
+        dancer_saved(partner)
+    invalidate_responses("pair", *pair_ids)
+    invalidate_responses("dancer", *(partner.id for partner in partners))
+    for pair in pairs:
+        hub.publish([pair.dancer1_id, pair.dancer2_id],
+                    {"type": "pair_deleted", "pair_id": pair.id,
+                     "dancer_ids": [pair.dancer1_id, pair.dancer2_id]})
+    invalidate_responses("dancer", dancer_id)
     return {"ok": True}
@@ -0,0 +1,75 @@
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from fastapi.responses import PlainTextResponse
+from auth_handler import get_current_user
+from config import settings
+from db.session import SessionDep
+from models import User
+from monitoring import metrics, slow_queries
+from schemas import UserType
+
+app = APIRouter(prefix="/monitoring", tags=["monitoring"])
+metrics_app = APIRouter(tags=["monitoring"])
+
+
+@metrics_app.get("/metrics", response_class=PlainTextResponse)
+def read_metrics() -> PlainTextResponse:
+    """
+    Метрики процесса в текстовом формате Prometheus.
+
+    Подключается только при METRICS_ENABLED. Каждый процесс uvicorn
+    отдает свои метрики, поэтому Prometheus опрашивает процессы по
+    отдельности.
+
+    Returns:
+        PlainTextResponse: Счетчики и гистограммы запросов и базы данных
+    """
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+
+@app.get("/slow-queries")
+def read_slow_queries(
+    session: SessionDep,
+    current_user: User = Depends(get_current_user),
+    limit: int = Query(default=50, ge=1, le=1000),
+    explain: bool = False,
+    parameters: bool = False,
+) -> dict:
+    """
+    Последние медленные SQL-запросы этого процесса, от новых к старым.
+
+    Запросы записываются, если SLOW_QUERY_MS задан и запрос выполнялся
+    дольше этого порога. С explain=true для записей без плана строится
+    EXPLAIN по сохраненным параметрам; сам запрос при этом не выполняется.
+    Параметры запросов (в них бывают хэши паролей и email) отдаются только
+    с parameters=true.
+
+    Args:
+        session (SessionDep): Сессия базы данных для EXPLAIN
+        limit (int): Максимальное число записей
+        explain (bool): Построить планы запросов
+        parameters (bool): Показать параметры запросов
+
+    Raises:
+        HTTPException: 403 если пользователь не администратор
+
+    Returns:
+        dict: Порог, заполненность буфера и записи (statement, parameters,
+            route, endpoint, duration_ms, explain)
+    """
+    if current_user.user_type != UserType.ADMIN:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Only admins can see slow queries",
+        )
+    entries = slow_queries.entries(limit)
+    if explain:
+        connection = session.connection()
+        for entry in entries:
+            slow_queries.explain(entry, connection)
+    return {
+        "threshold_ms": settings.slow_query_ms,
+        **slow_queries.stats(),
+        "entries": [{**{key: value for key, value in entry.items() if not key.startswith("_")},
+                     "parameters": entry["_display_parameters"] if parameters else None}
+                    for entry in entries],
+    }
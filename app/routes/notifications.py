@@ -0,0 +1,161 @@
+import asyncio
+import json
+from fastapi import APIRouter, Depends, HTTPException, WebSocket, status
+from fastapi.responses import StreamingResponse
+from auth_handler import get_current_user
+from config import settings
+from db.session import SessionDep, run_db
+from models import User
+from notifications import hub
+from schemas import UserType
+
+app = APIRouter(prefix="/notifications", tags=["notifications"])
+
+
+def subscribed_dancer(user: User, dancer_id: int | None) -> int:
+    """
+    Определить, на события какого танцора подписывается пользователь.
+
+    Args:
+        user (User): Аутентифицированный пользователь
+        dancer_id (int | None): Запрошенный танцор; по умолчанию - свой
+
+    Raises:
+        HTTPException: 403 если пользователь не связан с танцором или
+            запрашивает чужого танцора, не будучи администратором
+
+    Returns:
+        int: ID танцора
+    """
+    if user.user_type == UserType.ADMIN and dancer_id is not None:
+        return dancer_id
+    if user.dancer_id is None or dancer_id not in (None, user.dancer_id):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Only a dancer's own user or an admin can subscribe to its events",
+        )
+    return user.dancer_id
+
+
+def _websocket_user(session, token: str) -> User:
+    # Соединение живет долго: транзакция проверки токена сразу завершается,
+    # чтобы не держать соединение с базой
+    try:
+        return get_current_user(token, session)
+    finally:
+        session.rollback()
+
+
+async def _send_events(websocket: WebSocket, subscription):
+    while True:
+        await websocket.send_json(await subscription.get())
+
+
+async def _wait_disconnect(websocket: WebSocket):
+    while (await websocket.receive())["type"] != "websocket.disconnect":
+        pass
+
+
+@app.websocket("/ws")
+async def notifications_ws(websocket: WebSocket,
+                           session: SessionDep,
+                           token: str | None = None,
+                           dancer_id: int | None = None):
+    """
+    Поток событий танцора через WebSocket.
+
+    Токен передается в заголовке Authorization (Bearer) или, для
+    браузеров, параметром token. События - JSON-объекты с полем type:
+    request_created, request_updated, pair_deleted и resync, если часть
+    событий была пропущена из-за медленного клиента.
+
+    Args:
+        websocket (WebSocket): Соединение
+        session (SessionDep): Сессия базы данных для проверки токена
+        token (str | None): JWT токен, если он не передан в заголовке
+        dancer_id (int | None): Танцор для администратора; по умолчанию - свой
+    """
+    scheme, _, header_token = websocket.headers.get("authorization", "").partition(" ")
+    if scheme.lower() == "bearer" and header_token:
+        token = header_token
+    try:
+        if not token:
+            raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED)
+        user = await run_db(session, lambda s: _websocket_user(s, token))
+        dancer = subscribed_dancer(user, dancer_id)
+    except HTTPException:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+
+    subscription = hub.subscribe(dancer)
+    try:
+        await websocket.accept()
+        tasks = [asyncio.create_task(_send_events(websocket, subscription)),
+                 asyncio.create_task(_wait_disconnect(websocket))]
+        done, pending = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+        for task in pending:
+            task.cancel()
+        for task in done:
+            # Отправка в закрытое соединение - обычное отключение клиента
+            task.exception()
+    finally:
+        hub.unsubscribe(subscription)
+
+
+@app.get("/stream")
+async def notifications_stream(dancer_id: int | None = None,
+                               current_user: User = Depends(get_current_user)):
+    """
+    Поток событий танцора через Server-Sent Events.
+
+    Те же события, что и в /notifications/ws; имя события SSE совпадает
+    с полем type. Раз в NOTIFICATION_KEEPALIVE секунд без событий
+    отправляется комментарий, чтобы прокси не закрывали соединение.
+
+    Args:
+        dancer_id (int | None): Танцор для администратора; по умолчанию - свой
+
+    Raises:
+        HTTPException: 403 если подписка на танцора запрещена
+
+    Returns:
+        StreamingResponse: Поток text/event-stream
+    """
+    dancer = subscribed_dancer(current_user, dancer_id)
+
+    async def events():
+        subscription = hub.subscribe(dancer)
+        try:
+            yield ": connected\n\n"
+            while True:
+                try:
+                    event = await asyncio.wait_for(subscription.get(),
+                                                   settings.notification_keepalive)
+                except asyncio.TimeoutError:
+                    yield ": keep-alive\n\n"
+                    continue
+                yield f"event: {event['type']}\ndata: {json.dumps(event)}\n\n"
+        finally:
+            hub.unsubscribe(subscription)
+
+    return StreamingResponse(events(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache"})
+
+
+@app.get("/stats")
+def notification_stats(current_user: User = Depends(get_current_user)) -> dict:
+    """
+    Число открытых подписок и счетчики событий этого процесса.
+
+    Raises:
+        HTTPException: 403 если пользователь не администратор
+
+    Returns:
+        dict: dancers, connections, published и delivered
+    """
+    if current_user.user_type != UserType.ADMIN:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Only admins can see notification statistics",
+        )
+    return hub.stats()
@@ -1,42 +1,192 @@
-from fastapi import APIRouter, HTTPException, Depends
-from models import Pair, Dancer, PairResponse
-from schemas import StatusType
-from db.session import SessionDep
+from fastapi import APIRouter, HTTPException, Depends, Query, Response
+from starlette.concurrency import run_in_threadpool
+from models import Pair, PairMember, Dancer, PairResponse
+from schemas import StatusType, UserType, PairProposal, DancerResponse
+from db.session import SessionDep, run_db, begin_write
 from sqlmodel import select
+from sqlalchemy import delete, union_all
+from sqlalchemy.orm import aliased, joinedload, selectinload
 from auth_handler import get_current_user
+from pagination import (DEFAULT_LIMIT, CursorQuery, LimitQuery, FieldsQuery,
+                        parse_fields, paginate, page_response)
+from recommender.hooks import dancer_saved
+from notifications import hub
+from config import settings
+from serialization import model_columns
+from etags import IfNoneMatchHeader, conditional_response, invalidate_responses, make_etag
+from recommender.index import index
+from recommender.matching import propose_pairs
 from fastapi import status
 
 app = APIRouter(prefix='/pairs', tags=['pairs'])
 
 
+def dancer_pairs_query(dancer_id: int):
+    """
+    Запрос id пар, в которых состоит танцор.
+
+    Вместо OR по двум колонкам - UNION ALL двух запросов, каждый из которых
+    идет по своему индексу (dancer1_id и dancer2_id).
+
+    Args:
+        dancer_id (int): ID танцора
+
+    Returns:
+        CompoundSelect: Запрос id пар
+    """
+    return union_all(select(Pair.id).where(Pair.dancer1_id == dancer_id),
+                     select(Pair.id).where(Pair.dancer2_id == dancer_id))
+
+
+def to_pair_response(pair: Pair) -> PairResponse:
+    """
+    Собрать PairResponse из пары с уже загруженными танцорами.
+
+    Args:
+        pair (Pair): Пара с загруженными связями dancer1 и dancer2
+
+    Returns:
+        PairResponse: Объект пары с информацией о танцорах
+    """
+    return PairResponse(
+        id=pair.id,
+        dancer1=pair.dancer1,
+        dancer2=pair.dancer2,
+        created_at=pair.created_at
+    )
+
+def pair_page_rows(session, cursor: int | None, limit: int):
+    """
+    Выбрать страницу пар с танцорами одним запросом в виде словарей.
+
+    Колонки пары и обоих танцоров читаются через JOIN без ORM-объектов;
+    результат совпадает с сериализованным PairResponse.
+
+    Args:
+        session (Session): Сессия базы данных
+        cursor (int | None): id последней пары предыдущей страницы
+        limit (int): Размер страницы
+
+    Returns:
+        tuple[list[dict], int | None]: Пары страницы и курсор следующей страницы
+    """
+    dancer1, dancer2 = aliased(Dancer), aliased(Dancer)
+    columns = model_columns(DancerResponse)
+    statement = (
+        select(Pair.id, Pair.created_at,
+               *[getattr(dancer1, name) for name in columns],
+               *[getattr(dancer2, name) for name in columns])
+        .join(dancer1, Pair.dancer1_id == dancer1.id)
+        .join(dancer2, Pair.dancer2_id == dancer2.id)
+    )
+    if cursor is not None:
+        statement = statement.where(Pair.id > cursor)
+    rows = session.execute(statement.order_by(Pair.id).limit(limit + 1)).all()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = rows[-1][0]
+    width = len(columns)
+    pairs = [{
+        "id": row[0],
+        "dancer1": dict(zip(columns, row[2:2 + width])),
+        "dancer2": dict(zip(columns, row[2 + width:])),
+        "created_at": row[1],
+    } for row in rows]
+    return pairs, next_cursor
+
 @app.get("/")
-def read_pairs(session: SessionDep) -> list[PairResponse]:
+def read_pairs(
+    session: SessionDep,
+    response: Response,
+    cursor: CursorQuery = None,
+    limit: LimitQuery = DEFAULT_LIMIT,
+    fields: FieldsQuery = None,
+) -> list[PairResponse]:
     """
-    Получить список всех существующих пар.
+    Получить страницу списка существующих пар.
+
+    Страницы упорядочены по id. Если есть следующая страница, ее курсор
+    возвращается в заголовке X-Next-Cursor. При указании fields возвращаются
+    только выбранные колонки пары (например dancer1_id,dancer2_id) без
+    загрузки танцоров.
 
     Args:
         session (SessionDep): Сессия базы данных
+        response (Response): Ответ для заголовка курсора
+        cursor (int | None): id последней пары предыдущей страницы
+        limit (int): Размер страницы
+        fields (str | None): Возвращаемые колонки пары через запятую
+
+    Raises:
+        HTTPException: 400 если запрошено неизвестное поле
 
     Returns:
         list[PairResponse]: Список пар с полной информацией о танцорах
     """
 
-    pairs = session.exec(select(Pair)).all()
-    return [PairResponse(
-        id=pair.id,
-        dancer1=session.get(Dancer, pair.dancer1_id),
-        dancer2=session.get(Dancer, pair.dancer2_id),
-        created_at=pair.created_at
-    ) for pair in pairs]
+    selected = parse_fields(fields, Pair)
+    if selected is None and settings.fast_json:
+        pairs, next_cursor = pair_page_rows(session, cursor, limit)
+        return page_response(response, pairs, next_cursor, None, serialized=True)
+    # Танцоры всей страницы загружаются двумя запросами selectinload
+    pairs, next_cursor = paginate(
+        session, Pair, [], cursor, limit, selected,
+        options=(selectinload(Pair.dancer1), selectinload(Pair.dancer2))
+    )
+    if selected is None:
+        pairs = [to_pair_response(pair) for pair in pairs]
+    return page_response(response, pairs, next_cursor, selected)
+
+@app.get("/proposals")
+async def read_pair_proposals(
+    session: SessionDep,
+    current_user = Depends(get_current_user),
+    k: int = Query(default=10, ge=1, le=50),
+    style: str | None = None,
+) -> list[PairProposal]:
+    """
+    Предложить глобальное распределение по парам всех танцоров в поиске.
+
+    Кандидаты оцениваются по тем же признакам, что и KNN-рекомендации
+    (уровень, возраст, рост), у каждого танцора остаются K ближайших, и по
+    этому графу строится устойчивое паросочетание. Пары не сохраняются.
+
+    Args:
+        session (SessionDep): Сессия базы данных
+        k (int): Число кандидатов на танцора
+        style (str | None): Ограничить одним стилем
+
+    Raises:
+        HTTPException: 403 если пользователь не администратор
+
+    Returns:
+        list[PairProposal]: Предлагаемые пары, лучшие первыми
+    """
+    if current_user.user_type != UserType.ADMIN:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Only admins can compute pair proposals",
+        )
+
+    await run_db(session, index.ensure_loaded)
+    return await run_in_threadpool(propose_pairs, index, k, style)
 
 @app.get("/{pair_id}")
-def read_pair(pair_id: int, session: SessionDep) -> PairResponse:
+def read_pair(pair_id: int, session: SessionDep,
+              if_none_match: IfNoneMatchHeader = None) -> PairResponse:
     """
     Получить информацию о паре по её ID.
-    
+
+    Ответ включает обоих танцоров, поэтому слабый ETag строится из версий
+    пары и обоих танцоров; при совпадении с If-None-Match возвращается 304
+    без тела.
+
     Args:
         pair_id (int): Уникальный идентификатор пары
         session (SessionDep): Сессия базы данных
+        if_none_match (str | None): Заголовок If-None-Match
 
     Raises:
         HTTPException: 404 если пара не найдена
@@ -44,16 +194,14 @@ def read_pair(pair_id: int, session: SessionDep) -> PairResponse:
     Returns:
         PairResponse: Объект пары с информацией о танцорах
     """
-
-    pair = session.get(Pair, pair_id)
+    pair = session.get(Pair, pair_id,
+                       options=[joinedload(Pair.dancer1), joinedload(Pair.dancer2)])
     if not pair:
         raise HTTPException(status_code=404, detail="Pair not found")
-    return PairResponse(
-        id=pair.id,
-        dancer1=session.get(Dancer, pair.dancer1_id),
-        dancer2=session.get(Dancer, pair.dancer2_id),
-        created_at=pair.created_at
-    )
+    return conditional_response(
+        if_none_match, ("pair", pair_id),
+        make_etag(pair.id, pair.version, pair.dancer1.version, pair.dancer2.version),
+        lambda: to_pair_response(pair).model_dump(mode="json"))
 
 @app.delete("/{pair_id}")
 def delete_pair(pair_id: int, 
@@ -77,7 +225,8 @@ def delete_pair(pair_id: int,
         dict: Результат операции
     """
 
-    pair = session.get(Pair, pair_id)
+    begin_write(session)
+    pair = session.get(Pair, pair_id, with_for_update=True)
     if not pair:
         raise HTTPException(status_code=404, detail="Pair not found")
     
@@ -96,23 +245,13 @@ def delete_pair(pair_id: int,
         dancer1 = session.get(Dancer, pair.dancer1_id)
         dancer2 = session.get(Dancer, pair.dancer2_id)
 
-        # Удаляем пару
+        # Удаляем пару вместе с записями об участниках
+        session.execute(delete(PairMember).where(PairMember.pair_id == pair.id))
         session.delete(pair)
 
         # Проверяем другие существующие пары
-        dancer1_pairs = session.exec(
-            select(Pair).where(
-                (Pair.dancer1_id == dancer1.id) |
-                (Pair.dancer2_id == dancer1.id)
-            )
-        ).all()
-
-        dancer2_pairs = session.exec(
-            select(Pair).where(
-                (Pair.dancer1_id == dancer2.id) |
-                (Pair.dancer2_id == dancer2.id)
-            )
-        ).all()
+        dancer1_pairs = session.execute(dancer_pairs_query(dancer1.id).limit(1)).first()
+        dancer2_pairs = session.execute(dancer_pairs_query(dancer2.id).limit(1)).first()
 
         # Обновляем статусы если нужно
         if not dancer1_pairs and dancer1.status == StatusType.IN_PAIR:
@@ -124,4 +263,11 @@ def delete_pair(pair_id: int,
             session.add(dancer2)
 
         session.commit()
+        dancer_saved(dancer1)
+        dancer_saved(dancer2)
+        invalidate_responses("pair", pair_id)
+        invalidate_responses("dancer", dancer1.id, dancer2.id)
+        hub.publish([dancer1.id, dancer2.id],
+                    {"type": "pair_deleted", "pair_id": pair_id,
+                     "dancer_ids": [dancer1.id, dancer2.id]})
         return {"ok": True}
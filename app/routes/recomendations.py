@@ -1,35 +1,28 @@
+import json
+from collections import defaultdict
 from typing import List
-import numpy as np
-from fastapi import HTTPException, Query, APIRouter
-from models import Dancer
-from db.session import SessionDep
+from fastapi import HTTPException, Query, APIRouter, Depends, status
+from fastapi.responses import StreamingResponse
+from models import Dancer, Recommendation
+from db.session import SessionDep, new_session_like, run_db
 from sqlmodel import select
-from schemas import StatusType
+from schemas import Sex, StatusType, KnnBatchRequest, UserType, DancerResponse, get_level_value
+from auth_handler import get_current_user
+from recommender.index import index
+from recommender.results import candidate_buckets, recommendation_cache
+from recommender.precompute import worker
 
 app = APIRouter(prefix='/recomendations', tags=['recomendations'])
 
+# SQLite limits the number of bound parameters in one statement
+IN_CHUNK_SIZE = 900
 
-LEVEL_ORDER = {
-    "S": 8,
-    "M": 7,
-    "A": 6,
-    "B": 5,
-    "C": 4,
-    "D": 3,
-    "E": 2,
-    "N": 1,
-}
 
-def get_level_value(level: str | None) -> int:
-    if not level:
-        return 0
-    return LEVEL_ORDER.get(level.upper(), 0)
-
-@app.get("/base/{dancer_id}", response_model=List[Dancer])
+@app.get("/base/{dancer_id}", response_model=List[DancerResponse])
 def get_basic_recommendations(
     dancer_id: int,
     session: SessionDep
-) -> List[Dancer]:
+) -> List[DancerResponse]:
     """
     Get basic partner recommendations based on compatibility rules.
     
@@ -44,44 +37,53 @@ def get_basic_recommendations(
         session (SessionDep): Database session dependency
         
     Returns:
-        List[Dancer]: List of compatible dancers ordered by basic compatibility
+        List[DancerResponse]: List of compatible dancers ordered by basic compatibility
         
     Raises:
         HTTPException: 404 if dancer not found
+
+    Notes:
+        Results are cached per dancer until a write touches the dancer or
+        its candidates' (sex, style) bucket, at most RECOMMENDATION_CACHE_TTL
+        seconds
     """
 
+    cached = recommendation_cache.get(dancer_id, "base")
+    if cached is not None:
+        return cached
+
+    # Taken before any read, so a write racing with this request rejects the result
+    generations = recommendation_cache.generations(dancer_id)
     dancer = session.get(Dancer, dancer_id)
     if not dancer:
         raise HTTPException(status_code=404, detail="Dancer not found")
+    buckets = candidate_buckets(dancer.sex, dancer.style)
+    generations = recommendation_cache.bucket_generations(generations, buckets)
 
     # Basic filters
-    current_level = get_level_value(dancer.level)
+    current_level = dancer.level_rank
 
-    # Query compatible dancers
+    # Query compatible dancers, level similarity (±1 level) is an indexed range
     query = select(Dancer).where(
-        Dancer.id != dancer_id,
-        Dancer.sex != dancer.sex.value,
+        Dancer.style == dancer.style,
+        Dancer.sex.in_([sex for sex in Sex if sex != dancer.sex]),
         Dancer.status == StatusType.IN_SEARCH,
-        Dancer.style == dancer.style
+        Dancer.level_rank.between(current_level - 1, current_level + 1),
+        Dancer.id != dancer_id
     )
 
-    eligible_dancers = session.exec(query).all()
-
-    # Filter by level similarity
-    recommended = []
-    for dancer in eligible_dancers:
-        dancer_level = get_level_value(dancer.level)
-        if abs(dancer_level - current_level) <= 1:
-            recommended.append(dancer)
+    dancers = session.exec(query).all()
+    recommendation_cache.set(dancer_id, "base", None,
+                             [dancer.model_dump() for dancer in dancers],
+                             buckets, generations)
+    return dancers
 
-    return recommended
-
-@app.get("/knn/{dancer_id}", response_model=List[Dancer])
+@app.get("/knn/{dancer_id}", response_model=List[DancerResponse])
 def get_knn_recommendations(
     dancer_id: int,
     session: SessionDep,
     k: int = Query(default=5, ge=1, le=20)
-) -> List[Dancer]:
+) -> List[DancerResponse]:
     """
     Get K-nearest neighbors recommendations with compatibility filtering.
     
@@ -91,7 +93,10 @@ def get_knn_recommendations(
     - Age
     - Height
     
-    Features are normalized before distance calculation.
+    Features are normalized with the running mean and std of the candidates'
+    (sex, style) bucket before distance calculation. Candidates are taken
+    from the in-memory recommendation index instead of the database, only the
+    resulting K dancers are loaded.
     
     Args:
         dancer_id (int): ID of the dancer seeking recommendations
@@ -99,7 +104,7 @@ def get_knn_recommendations(
         k (int, optional): Number of neighbors to return. Between 1-20. Defaults to 5.
         
     Returns:
-        List[Dancer]: Top K most similar compatible dancers ordered by similarity
+        List[DancerResponse]: Top K most similar compatible dancers ordered by similarity
         
     Raises:
         HTTPException: 
@@ -109,9 +114,26 @@ def get_knn_recommendations(
     Notes:
         Requires dancer to have both age and height specified in their profile
         Uses Euclidean distance on normalized features
-        Starts with basic compatibility-filtered candidates
+        Uses the same compatibility filters as basic recommendations
+        Results are cached per (dancer, k) like basic recommendations
+        With the precompute worker enabled, an up to date list is read from
+        the recommendation table with one indexed query
     """
 
+    cached = recommendation_cache.get(dancer_id, "knn", k)
+    if cached is not None:
+        return cached
+
+    if worker.is_fresh(dancer_id, k):
+        return session.exec(
+            select(Dancer)
+            .join(Recommendation, Recommendation.candidate_id == Dancer.id)
+            .where(Recommendation.dancer_id == dancer_id)
+            .order_by(Recommendation.rank)
+            .limit(k)
+        ).all()
+
+    generations = recommendation_cache.generations(dancer_id)
     current_dancer = session.get(Dancer, dancer_id)
     if not current_dancer:
         raise HTTPException(status_code=404, detail="Dancer not found")
@@ -122,39 +144,149 @@ def get_knn_recommendations(
             detail="Age and height required for KNN recommendations"
         )
 
-    # Get base recommendations
-    base_recommendations = get_basic_recommendations(dancer_id, session)
+    buckets = candidate_buckets(current_dancer.sex, current_dancer.style)
+    generations = recommendation_cache.bucket_generations(generations, buckets)
+    index.ensure_loaded(session)
+    top_ids = index.nearest(
+        current_dancer.sex,
+        current_dancer.style,
+        (get_level_value(current_dancer.level), current_dancer.age, current_dancer.height),
+        k
+    )
+    dancers = []
+    if top_ids:
+        # Load only the selected dancers, keeping the distance order
+        rows = session.exec(select(Dancer).where(Dancer.id.in_(top_ids))).all()
+        by_id = {dancer.id: dancer for dancer in rows}
+        dancers = [by_id[i] for i in top_ids if i in by_id]
+    recommendation_cache.set(dancer_id, "knn", k,
+                             [dancer.model_dump() for dancer in dancers],
+                             buckets, generations)
+    return dancers
+
+def _knn_batch_rows(session, dancer_ids: list[int]) -> dict:
+    """Read the KNN columns of the requested dancers, keyed by id."""
+    rows = {}
+    for start in range(0, len(dancer_ids), IN_CHUNK_SIZE):
+        chunk = dancer_ids[start:start + IN_CHUNK_SIZE]
+        for row in session.exec(select(
+            Dancer.id, Dancer.sex, Dancer.style, Dancer.level, Dancer.age, Dancer.height
+        ).where(Dancer.id.in_(chunk))):
+            rows[row.id] = row
+    index.ensure_loaded(session)
+    return rows
+
+def _knn_group_lines(session, members: list, k: int) -> list[str]:
+    """Search one (sex, style, level) group and render its NDJSON lines."""
+    results = index.nearest_for(members, k)
+    needed = list({i for top_ids in results.values() for i in top_ids})
+    dancers = {}
+    for start in range(0, len(needed), IN_CHUNK_SIZE):
+        chunk = needed[start:start + IN_CHUNK_SIZE]
+        for dancer in session.exec(select(Dancer).where(Dancer.id.in_(chunk))):
+            dancers[dancer.id] = DancerResponse.model_validate(dancer).model_dump(mode="json")
+    return [
+        json.dumps({"dancer_id": row.id,
+                    "recommendations": [dancers[i] for i in results[row.id] if i in dancers]},
+                   ensure_ascii=False) + "\n"
+        for row in members
+    ]
+
+@app.post("/knn/batch")
+async def get_knn_recommendations_batch(
+    batch: KnnBatchRequest,
+    session: SessionDep
+) -> StreamingResponse:
+    """
+    Get KNN recommendations for many dancers in one call.
+
+    Dancers are grouped by (sex, style, level): all dancers of a group share
+    the same candidate pool, so the pool is normalized once and the whole
+    group is searched in one call. Results are
+    the same as `get_knn_recommendations` would return for each dancer.
+
+    Only the requested dancers are read up front. Neighbours and their
+    profiles are computed group by group while the response is streamed,
+    so the first lines go out before the last group is searched. Error
+    lines come first, then one group after another.
+
+    Args:
+        batch (KnnBatchRequest): Dancer ids and number of neighbours
+        session (SessionDep): Database session dependency
+
+    Returns:
+        StreamingResponse: NDJSON stream, one line per requested dancer:
+            {"dancer_id": ..., "recommendations": [...]} or
+            {"dancer_id": ..., "error": "..."}
+    """
 
-    # Prepare feature vectors
-    features = []
-    valid_dancers = []
+    dancer_ids = list(dict.fromkeys(batch.dancer_ids))
+    rows = await run_db(session, lambda s: _knn_batch_rows(s, dancer_ids))
 
-    for dancer in base_recommendations:
-        if dancer.age and dancer.height and dancer.level:
-            level_val = get_level_value(dancer.level)
-            features.append([level_val, dancer.age, dancer.height])
-            valid_dancers.append(dancer)
+    errors = {}
+    groups = defaultdict(list)
+    for dancer_id in dancer_ids:
+        row = rows.get(dancer_id)
+        if row is None:
+            errors[dancer_id] = "Dancer not found"
+        elif not row.age or not row.height:
+            errors[dancer_id] = "Age and height required for KNN recommendations"
+        else:
+            groups[(row.sex, row.style, get_level_value(row.level))].append(row)
 
-    if not features:
-        return []
+    async def lines():
+        for dancer_id, error in errors.items():
+            yield json.dumps({"dancer_id": dancer_id, "error": error}, ensure_ascii=False) + "\n"
+        if not groups:
+            return
+        # The handler's session is closed by the time the body is sent
+        async with new_session_like(session) as stream_session:
+            for members in groups.values():
+                for line in await run_db(stream_session,
+                                         lambda s: _knn_group_lines(s, members, batch.k)):
+                    yield line
 
-    # Prepare current dancer's features
-    current_features = np.array([
-        get_level_value(current_dancer.level),
-        current_dancer.age,
-        current_dancer.height
-    ])
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+@app.get("/cache/stats")
+def recommendation_cache_stats(current_user = Depends(get_current_user)):
+    """
+    Get hit and invalidation counters of the recommendation cache.
 
-    # Normalize features
-    features_array = np.array(features)
-    normalized = (features_array - features_array.mean(axis=0)) / (features_array.std(axis=0) + 1e-8)
-    current_normalized = (current_features - features_array.mean(axis=0)) / (features_array.std(axis=0) + 1e-8)
+    `stale_rejected` counts results that were computed while a write touched
+    their dancer or bucket and therefore were not cached.
 
-    # Calculate distances
-    distances = np.linalg.norm(normalized - current_normalized, axis=1)
+    Raises:
+        HTTPException: 403 if the user is not an admin
 
-    # Get top K indices
-    sorted_indices = np.argsort(distances)
-    top_k_indices = sorted_indices[:k]
+    Returns:
+        dict: Cache size, hits, misses, hit rate, evictions, invalidations
+            and rejected stale results
+    """
+    if current_user.user_type != UserType.ADMIN:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Only admins can see cache statistics",
+        )
+    return recommendation_cache.stats()
 
-    return [valid_dancers[i] for i in top_k_indices]
+@app.get("/precompute/stats")
+def precompute_stats(current_user = Depends(get_current_user)):
+    """
+    Get the state of the background precompute worker.
+
+    `lag_seconds` is the age of the oldest change not yet reflected in the
+    recommendation table.
+
+    Raises:
+        HTTPException: 403 if the user is not an admin
+
+    Returns:
+        dict: Queue sizes, lag, materialized lists and batch counters
+    """
+    if current_user.user_type != UserType.ADMIN:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Only admins can see precompute statistics",
+        )
+    return worker.stats()
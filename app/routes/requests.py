@@ -1,13 +1,44 @@
-from fastapi import APIRouter, status, HTTPException, Depends
-from models import Dancer, Request, Pair
+from typing import Annotated
+from fastapi import APIRouter, status, HTTPException, Depends, Query, Response
+from sqlalchemy.exc import IntegrityError
+from models import Dancer, Request, Pair, PairMember
 from schemas import RequestCreate, RequestUpdate, RequestStatus, StatusType
-from db.session import SessionDep
+from db.session import SessionDep, begin_write
 from sqlmodel import select
 from auth_handler import get_current_user
+from pagination import (DEFAULT_LIMIT, CursorQuery, LimitQuery, FieldsQuery,
+                        parse_fields, paginate, page_response)
+from recommender.hooks import dancer_saved
+from notifications import hub
+from config import settings
+from serialization import model_columns
+from etags import IfNoneMatchHeader, conditional_response, invalidate_responses, make_etag
 
 
 app = APIRouter(prefix="/requests", tags=['requests'])
 
+# Первичный ключ pair_member на Postgres; на SQLite ограничение без имени
+PAIR_MEMBER_PK = "pair_member_pkey"
+
+
+def _violates_pair_member(error: IntegrityError) -> bool:
+    """
+    Проверить, что нарушен первичный ключ pair_member (танцор уже в паре).
+
+    Args:
+        error (IntegrityError): Ошибка фиксации транзакции
+
+    Returns:
+        bool: True если конфликт по pair_member.dancer_id
+    """
+    # psycopg2 сообщает имя ограничения в diag, asyncpg - в исходном исключении
+    diag = getattr(error.orig, "diag", None)
+    constraint = (getattr(diag, "constraint_name", None)
+                  or getattr(error.orig.__cause__, "constraint_name", None))
+    if constraint is not None:
+        return constraint == PAIR_MEMBER_PK
+    return "pair_member.dancer_id" in str(error.orig)
+
 @app.post("/", status_code=status.HTTP_201_CREATED)
 def create_request(request: RequestCreate,
                    session: SessionDep,
@@ -48,35 +79,72 @@ def create_request(request: RequestCreate,
     session.add(db_request)
     session.commit()
     session.refresh(db_request)
+    hub.publish([db_request.sender_id, db_request.receiver_id],
+                {"type": "request_created", "request": db_request.model_dump(mode="json")})
     return db_request
 
 
 @app.get("/")
 def read_requests(
     session: SessionDep,
+    response: Response,
+    cursor: CursorQuery = None,
+    limit: LimitQuery = DEFAULT_LIMIT,
+    fields: FieldsQuery = None,
+    request_status: Annotated[RequestStatus | None, Query(alias="status")] = None,
+    sender_id: int | None = None,
+    receiver_id: int | None = None,
 ) -> list[Request]:
     """
-    Получить список всех запросов на партнерство.
+    Получить страницу списка запросов на партнерство.
+
+    Страницы упорядочены по id (и тем самым по времени создания). Если есть
+    следующая страница, ее курсор возвращается в заголовке X-Next-Cursor.
 
     Args:
         session (SessionDep): Сессия базы данных
+        response (Response): Ответ для заголовка курсора
+        cursor (int | None): id последнего запроса предыдущей страницы
+        limit (int): Размер страницы
+        fields (str | None): Возвращаемые поля через запятую
+        request_status (RequestStatus | None): Фильтр по статусу (параметр status)
+        sender_id (int | None): Фильтр по отправителю
+        receiver_id (int | None): Фильтр по получателю
+
+    Raises:
+        HTTPException: 400 если запрошено неизвестное поле
 
     Returns:
         list[Request]: Список объектов запросов
     """
 
-    requests = session.exec(select(Request)).all()
-    return requests
+    selected = parse_fields(fields, Request)
+    if selected is None and settings.fast_json:
+        selected = model_columns(Request)
+    conditions = []
+    if request_status is not None:
+        conditions.append(Request.status == request_status)
+    if sender_id is not None:
+        conditions.append(Request.sender_id == sender_id)
+    if receiver_id is not None:
+        conditions.append(Request.receiver_id == receiver_id)
+
+    requests, next_cursor = paginate(session, Request, conditions, cursor, limit, selected)
+    return page_response(response, requests, next_cursor, selected)
 
 @app.get("/{request_id}")
-def read_request(request_id: int, session: SessionDep) -> Request:
-    request = session.get(Request, request_id)
+def read_request(request_id: int, session: SessionDep,
+                 if_none_match: IfNoneMatchHeader = None) -> Request:
     """
     Получить информацию о запросе по его ID.
 
+    Ответ содержит слабый ETag из версии запроса; при совпадении с
+    If-None-Match возвращается 304 без тела.
+
     Args:
         request_id (int): Уникальный идентификатор запроса
         session (SessionDep): Сессия базы данных
+        if_none_match (str | None): Заголовок If-None-Match
 
     Raises:
         HTTPException: 404 если запрос не найден
@@ -84,9 +152,12 @@ def read_request(request_id: int, session: SessionDep) -> Request:
     Returns:
         Request: Объект запроса с указанным ID
     """
+    request = session.get(Request, request_id)
     if not request:
         raise HTTPException(status_code=404, detail="Request not found")
-    return request
+    return conditional_response(if_none_match, ("request", request_id),
+                                make_etag(request.id, request.version),
+                                lambda: request.model_dump(mode="json"))
 
 @app.put("/{request_id}")
 def update_request(
@@ -103,6 +174,11 @@ def update_request(
     - Создает новую пару
     - Обновляет статусы танцоров
 
+    Все это выполняется одной транзакцией записи: запрос и оба танцора
+    блокируются (BEGIN IMMEDIATE на SQLite, SELECT ... FOR UPDATE на
+    Postgres), а таблица pair_member не дает танцору попасть во вторую пару
+    даже при одновременных принятиях.
+
     Args:
         request_id (int): ID обновляемого запроса
         request_update (RequestUpdate): Новый статус запроса
@@ -116,7 +192,8 @@ def update_request(
         Request: Обновленный объект запроса
     """
 
-    db_request = session.get(Request, request_id)
+    begin_write(session)
+    db_request = session.get(Request, request_id, with_for_update=True)
     if not db_request:
         raise HTTPException(status_code=404, detail="Request not found")
 
@@ -125,8 +202,18 @@ def update_request(
 
     # Если запрос принят - обновляем статусы танцоров
     if db_request.status == RequestStatus.ACCEPTED:
-        sender = session.get(Dancer, db_request.sender_id)
-        receiver = session.get(Dancer, db_request.receiver_id)
+        # Танцоры блокируются в порядке id, чтобы встречные принятия
+        # не приводили к взаимной блокировке
+        dancers = {dancer.id: dancer for dancer in session.exec(
+            select(Dancer)
+            .where(Dancer.id.in_([db_request.sender_id, db_request.receiver_id]))
+            .order_by(Dancer.id)
+            .with_for_update()
+        )}
+        sender = dancers.get(db_request.sender_id)
+        receiver = dancers.get(db_request.receiver_id)
+        if sender is None or receiver is None:
+            raise HTTPException(status_code=404, detail="Dancer not found")
 
         if sender.status != StatusType.IN_SEARCH or receiver.status != StatusType.IN_SEARCH:
             raise HTTPException(
@@ -148,10 +235,7 @@ def update_request(
 
         # Проверка существующих пар
         existing_pair = session.exec(
-            select(Pair).where(
-                (Pair.dancer1_id.in_([sender.id, receiver.id])) |
-                (Pair.dancer2_id.in_([sender.id, receiver.id]))
-            )
+            select(PairMember).where(PairMember.dancer_id.in_([sender.id, receiver.id]))
         ).first()
 
         if existing_pair:
@@ -163,6 +247,9 @@ def update_request(
         # Создаем новую пару
         new_pair = Pair(dancer1_id=sender.id, dancer2_id=receiver.id)
         session.add(new_pair)
+        session.flush()
+        session.add(PairMember(dancer_id=sender.id, pair_id=new_pair.id))
+        session.add(PairMember(dancer_id=receiver.id, pair_id=new_pair.id))
 
         # Обновляем статусы танцоров
         sender.status = StatusType.IN_PAIR
@@ -171,8 +258,29 @@ def update_request(
         session.add(receiver)
 
     session.add(db_request)
-    session.commit()
+    try:
+        session.commit()
+    except IntegrityError as e:
+        session.rollback()
+        if not _violates_pair_member(e):
+            raise
+        # pair_member уже содержит одного из танцоров
+        raise HTTPException(
+            status_code=400,
+            detail="One or both dancers are already in a pair"
+        )
     session.refresh(db_request)
+
+    invalidate_responses("request", db_request.id)
+    pair_id = None
+    if db_request.status == RequestStatus.ACCEPTED:
+        pair_id = new_pair.id
+        dancer_saved(sender)
+        dancer_saved(receiver)
+        invalidate_responses("dancer", sender.id, receiver.id)
+    hub.publish([db_request.sender_id, db_request.receiver_id],
+                {"type": "request_updated", "request": db_request.model_dump(mode="json"),
+                 "pair_id": pair_id})
     return db_request
 
 @app.delete("/{request_id}")
@@ -206,4 +314,5 @@ def delete_request(request_id: int,
             raise HTTPException(status_code=404, detail="Request not found")
         session.delete(request)
         session.commit()
+        invalidate_responses("request", request_id)
         return {"ok": True}
@@ -1,5 +1,5 @@
 from enum import Enum
-from sqlmodel import SQLModel
+from sqlmodel import SQLModel, Field
 
 
 class StatusType(str, Enum):
@@ -19,9 +19,64 @@ class UserType(str, Enum):
     ADMIN = "ADMIN" 
     DANCER = "DANCER" 
 
+LEVEL_ORDER = {
+    "S": 8,
+    "M": 7,
+    "A": 6,
+    "B": 5,
+    "C": 4,
+    "D": 3,
+    "E": 2,
+    "N": 1,
+}
+
+def get_level_value(level: str | None) -> int:
+    if not level:
+        return 0
+    return LEVEL_ORDER.get(level.upper(), 0)
+
+class DancerBase(SQLModel):
+    name: str = Field(index=True)
+    sex: Sex = "MALE"
+    age: int | None = Field(default=None, index=True)
+    height: float | None = Field(default=None, index=True)
+    secret_name: str 
+    style: str | None = None
+    level: str | None = None
+    status: StatusType = "IN_SEARCH"
+
+class DancerCreate(DancerBase):
+    pass
+
+class DancerUpdate(DancerBase):
+    id: int | None = None
+
+class DancerResponse(DancerBase):
+    id: int
+    version: int
+
 class RequestCreate(SQLModel):
     sender_id: int
     receiver_id: int
 
 class RequestUpdate(SQLModel):
     status: RequestStatus
+
+class KnnBatchRequest(SQLModel):
+    dancer_ids: list[int] = Field(min_length=1, max_length=10000)
+    k: int = Field(default=5, ge=1, le=20)
+
+DANCER_BATCH_MAX_IDS = 5000
+
+class DancerBatchRequest(SQLModel):
+    ids: list[int] = Field(min_length=1, max_length=DANCER_BATCH_MAX_IDS)
+
+class DancerBatchResponse(SQLModel):
+    dancers: list[DancerResponse]
+    missing: list[int]
+
+class PairProposal(SQLModel):
+    dancer1_id: int
+    dancer2_id: int
+    style: str | None
+    distance: float
@@ -0,0 +1,41 @@
+import json
+from datetime import date, datetime
+from fastapi.responses import JSONResponse
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def model_columns(model) -> list[str]:
+    """
+    Имена всех полей модели ответа, id первым.
+
+    Передаются в paginate как выбранные поля, чтобы читать строки без ORM;
+    у табличной модели должны быть колонки с такими же именами.
+    """
+    return ["id"] + [name for name in model.model_fields if name != "id"]
+
+
+def _default(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+class FastJSONResponse(JSONResponse):
+    """
+    JSON-ответ из готовых словарей без jsonable_encoder и response_model.
+
+    Предназначен для строк, прочитанных из базы: они уже соответствуют
+    модели и повторно не проверяются. Если установлен orjson, сериализует
+    им, иначе стандартным json без лишних пробелов. Перечисления отдаются
+    значениями, даты - в ISO 8601, как и в обычном пути FastAPI.
+    """
+
+    def render(self, content) -> bytes:
+        if orjson is not None:
+            return orjson.dumps(content)
+        return json.dumps(content, ensure_ascii=False, separators=(",", ":"),
+                          default=_default).encode("utf-8")
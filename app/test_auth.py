@@ -1,9 +1,13 @@
 from fastapi.testclient import TestClient
 import pytest
+from passlib.context import CryptContext
 from main import app
+from models import User
 
 client = TestClient(app)
 
+pytestmark = pytest.mark.parametrize("client", ["sync", "async"], indirect=True)
+
 @pytest.fixture
 def test_register():
     response = client.post(
@@ -27,3 +31,47 @@ def test_login():
     )
     assert response.status_code == 200
     assert "access_token" in response.json()
+
+
+def signup(client, email, user_type="DANCER"):
+    response = client.post("/auth/signup", json={"name": "Иван Иванов", "email": email,
+                                                 "password": "secret", "user_type": user_type})
+    assert response.status_code == 201
+    return response.json()
+
+
+def login(client, email, password="secret"):
+    return client.post("/auth/login", data={"username": email, "password": password})
+
+
+def test_signup_login_and_token(client, fast_hashing):
+    admin_id = signup(client, "admin@admin.com", "ADMIN")
+    dancer_id = signup(client, "dancer@dancer.com")
+
+    assert login(client, "admin@admin.com", "wrong").status_code == 401
+    assert login(client, "nobody@admin.com").status_code == 401
+    response = login(client, "admin@admin.com")
+    assert response.status_code == 200
+    headers = {"Authorization": f"Bearer {response.json()['access_token']}"}
+    assert client.get("/auth/cache/stats", headers=headers).status_code == 200
+
+    dancer_token = login(client, "dancer@dancer.com").json()["access_token"]
+    dancer_headers = {"Authorization": f"Bearer {dancer_token}"}
+    assert client.get("/auth/cache/stats", headers=dancer_headers).status_code == 403
+    assert client.delete(f"/auth/{admin_id}", headers=dancer_headers).status_code == 403
+    assert client.delete(f"/auth/{dancer_id}", headers=headers).json() == {"ok": True}
+    assert login(client, "dancer@dancer.com").status_code == 401
+
+
+def test_login_rehashes_outdated_password(client, session, fast_hashing):
+    outdated = CryptContext(schemes=["bcrypt"], bcrypt__default_rounds=4).hash("secret")
+    user = User(name="Иван Иванов", email="dancer@dancer.com", password=outdated)
+    session.add(user)
+    session.commit()
+
+    response = login(client, "dancer@dancer.com")
+    assert response.status_code == 200
+    session.refresh(user)
+    assert user.password.startswith("$2b$05$")
+    headers = {"Authorization": f"Bearer {response.json()['access_token']}"}
+    assert client.delete(f"/auth/{user.user_id}", headers=headers).json() == {"ok": True}
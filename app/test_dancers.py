@@ -0,0 +1,102 @@
+import pytest
+from sqlalchemy import text
+from sqlmodel import select
+from auth_handler import get_current_user
+from config import settings
+from models import Dancer, User
+from schemas import DANCER_BATCH_MAX_IDS
+
+
+pytestmark = pytest.mark.parametrize("client", ["sync", "async"], indirect=True)
+
+
+def test_batch_keeps_order_and_reports_missing(client, add_pairs, count_queries, monkeypatch):
+    add_pairs(2)
+    response, queries = count_queries(lambda: client.get("/dancers/batch?ids=3,99,1,3"))
+    assert response.status_code == 200
+    assert [dancer["id"] for dancer in response.json()["dancers"]] == [3, 1]
+    assert response.json()["missing"] == [99]
+    assert queries == 1
+
+    # Список длиннее лимита параметров SQLite все равно читается одним запросом
+    ids = list(range(DANCER_BATCH_MAX_IDS, 0, -1))
+    response, queries = count_queries(
+        lambda: client.post("/dancers/batch?fields=name", json={"ids": ids}))
+    assert response.status_code == 200
+    assert response.json()["dancers"] == [{"id": 4, "name": "Follower 1"},
+                                          {"id": 3, "name": "Leader 1"},
+                                          {"id": 2, "name": "Follower 0"},
+                                          {"id": 1, "name": "Leader 0"}]
+    assert len(response.json()["missing"]) == DANCER_BATCH_MAX_IDS - 4
+    assert queries == 1
+
+    monkeypatch.setattr(settings, "fast_json", True)
+    fast = client.get("/dancers/batch?ids=2,1").json()
+    monkeypatch.setattr(settings, "fast_json", False)
+    assert fast == client.get("/dancers/batch?ids=2,1").json()
+
+    # Ошибки списка id одинаковы для GET и POST
+    too_many = [1] * (DANCER_BATCH_MAX_IDS + 1)
+    for ids in (["1", "x"], [], too_many):
+        query = client.get(f"/dancers/batch?ids={','.join(map(str, ids))}")
+        body = client.post("/dancers/batch", json={"ids": ids})
+        assert query.status_code == body.status_code == 422
+        assert ([error["type"] for error in query.json()["detail"]]
+                == [error["type"] for error in body.json()["detail"]])
+
+
+def test_level_rank_is_kept_in_sync_and_not_exposed(client, session, admin):
+
+    response = client.post("/dancers/", json={"name": "A", "secret_name": "s",
+                                              "level": "b", "level_rank": 99})
+    assert response.status_code == 201
+    created = response.json()
+    assert "level_rank" not in created
+    dancer = session.get(Dancer, created["id"])
+    assert dancer.level_rank == 5
+
+    client.put(f"/dancers/{dancer.id}", json={**created, "level": "S", "level_rank": 1})
+    session.refresh(dancer)
+    assert dancer.level_rank == 8
+
+    assert "level_rank" not in client.get("/dancers/").json()[0]
+    assert "level_rank" not in client.get(f"/dancers/{dancer.id}").json()
+    assert client.get("/dancers/?fields=level_rank").status_code == 400
+
+
+def test_bulk_imports_csv_and_ndjson(client, session, admin, monkeypatch):
+    monkeypatch.setattr("routes.dancers.BULK_CHUNK_SIZE", 2)
+    csv_body = ("name,secret_name,level,age\n"
+                "A,s,C,20\n"
+                "\n"
+                "B,s,C,not a number\n"
+                '"C\nD",s,B,\n'
+                "E,s,D,30\n").encode()
+    response = client.post("/dancers/bulk", content=csv_body,
+                           headers={"Content-Type": "text/csv"})
+    assert response.status_code == 200
+    report = response.json()
+    assert (report["inserted"], report["failed"]) == (3, 1)
+    assert [error["row"] for error in report["errors"]] == [4]
+
+    # Строки, отклоненные базой, отсекаются повтором пачки по одной строке
+    session.execute(text("CREATE TRIGGER reject_bad BEFORE INSERT ON dancer "
+                         "WHEN NEW.name = 'bad' BEGIN SELECT RAISE(ABORT, 'bad name'); END"))
+    session.commit()
+    ndjson_body = b'{"name": "F", "secret_name": "s"}\n{"name": "bad", "secret_name": "s"}\n[]\n'
+    report = client.post("/dancers/bulk", content=ndjson_body,
+                         headers={"Content-Type": "application/x-ndjson"}).json()
+    assert (report["inserted"], report["failed"]) == (1, 2)
+    assert report["errors"][0] == {"row": 2, "errors": [{"loc": [], "msg": "Rejected by the database"}]}
+    assert report["errors"][1]["row"] == 3
+
+    assert sorted(session.exec(select(Dancer.name)).all()) == ["A", "C\nD", "E", "F"]
+    assert client.post("/dancers/bulk", content=b"name\n",
+                       headers={"Content-Type": "text/plain"}).status_code == 415
+
+
+def test_bulk_requires_admin(client):
+    client.app.dependency_overrides[get_current_user] = lambda: User(user_id=2, name="dancer")
+    response = client.post("/dancers/bulk", content=b"name,secret_name\nA,s\n",
+                           headers={"Content-Type": "text/csv"})
+    assert response.status_code == 403
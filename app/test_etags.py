@@ -0,0 +1,49 @@
+from config import settings
+
+
+def test_conditional_get_and_cached_bodies(client, add_pairs, admin, monkeypatch):
+    monkeypatch.setattr(settings, "response_cache_size", 100)
+    add_pairs(1)
+
+    first = client.get("/pairs/1")
+    etag = first.headers["ETag"]
+    assert etag == 'W/"1-1.1.1"'
+    assert first.json()["dancer1"]["name"] == "Leader 0"
+    assert client.get("/pairs/1").content == first.content
+    not_modified = client.get("/pairs/1", headers={"If-None-Match": etag})
+    assert (not_modified.status_code, not_modified.content) == (304, b"")
+
+    # Сохранение без изменений не меняет версию
+    dancer = client.get("/dancers/1").json()
+    client.put("/dancers/1", json=dancer)
+    assert client.get("/dancers/1", headers={"If-None-Match": 'W/"1-1"'}).status_code == 304
+
+    client.put("/dancers/1", json={**dancer, "height": 181.0})
+    changed = client.get("/dancers/1", headers={"If-None-Match": 'W/"1-1"'})
+    assert changed.status_code == 200
+    assert changed.json()["height"] == 181.0
+    assert changed.headers["ETag"] == 'W/"1-2"'
+
+    # Изменение танцора меняет ETag пары, в которой он состоит
+    pair = client.get("/pairs/1", headers={"If-None-Match": etag})
+    assert pair.status_code == 200
+    assert pair.headers["ETag"] == 'W/"1-1.2.1"'
+    assert pair.json()["dancer1"]["height"] == 181.0
+
+    client.delete("/pairs/1")
+    assert client.get("/pairs/1").status_code == 404
+    assert client.get("/dancers/999", headers={"If-None-Match": "*"}).status_code == 404
+
+
+def test_version_is_server_controlled_and_ids_are_not_reused(client, admin):
+    dancer = {"name": "A", "secret_name": "s", "version": 99}
+    created = client.post("/dancers/", json=dancer).json()
+    assert created["version"] == 1
+    client.post("/dancers/bulk", content=b'{"name": "B", "secret_name": "s", "version": 7}\n',
+                headers={"Content-Type": "application/x-ndjson"})
+    assert client.get(f"/dancers/{created['id'] + 1}").json()["version"] == 1
+
+    # После удаления последней строки id не выдается снова с тем же ETag
+    client.delete(f"/dancers/{created['id'] + 1}")
+    recreated = client.post("/dancers/", json=dancer).json()
+    assert recreated["id"] == created["id"] + 2
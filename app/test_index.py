@@ -0,0 +1,111 @@
+import numpy as np
+from models import Dancer
+from recommender.index import RecommendationIndex
+from schemas import Sex, StatusType, get_level_value
+
+
+def add_dancers(session, count, seed=0):
+    rng = np.random.default_rng(seed)
+    dancers = [Dancer(name=f"D{i}", secret_name="s",
+                      sex=Sex.MALE if i % 2 else Sex.FEMALE, style="latin",
+                      level="BCD"[rng.integers(0, 3)], age=int(rng.integers(16, 40)),
+                      height=float(rng.uniform(150, 195)))
+               for i in range(count)]
+    session.add_all(dancers)
+    session.commit()
+    return dancers
+
+
+def expected_nearest(dancers, query, k):
+    followers = [d for d in dancers if d.sex == Sex.FEMALE and d.status == StatusType.IN_SEARCH]
+    matrix = np.array([[get_level_value(d.level), d.age, d.height] for d in followers])
+    mean, std = matrix.mean(axis=0), matrix.std(axis=0) + 1e-8
+    level = get_level_value(query.level)
+    distances = {d.id: np.linalg.norm((row - mean) / std - (np.array(
+                     [level, query.age, query.height]) - mean) / std)
+                 for d, row in zip(followers, matrix)
+                 if abs(get_level_value(d.level) - level) <= 1}
+    return sorted(distances, key=distances.get)[:k]
+
+
+def nearest(index, dancer, k):
+    return index.nearest(dancer.sex, dancer.style,
+                         (get_level_value(dancer.level), dancer.age, dancer.height), k)
+
+
+def test_nearest_matches_brute_force(session):
+    dancers = add_dancers(session, 80)
+    index = RecommendationIndex()
+    index.ensure_loaded(session)
+    for leader in dancers[1:20:2]:
+        assert nearest(index, leader, 5) == expected_nearest(dancers, leader, 5)
+    # With k above the pool size every candidate is returned, nearest first
+    assert nearest(index, dancers[1], 100) == expected_nearest(dancers, dancers[1], 100)
+
+
+def test_upsert_moves_dancer_between_partitions(session):
+    dancers = add_dancers(session, 20)
+    index = RecommendationIndex()
+    index.ensure_loaded(session)
+    follower, leader = dancers[0], dancers[1]
+    assert index.key_of(follower.id) == (Sex.FEMALE, "latin", StatusType.IN_SEARCH)
+
+    follower.status = StatusType.IN_PAIR
+    index.upsert(follower)
+    assert index.key_of(follower.id) == (Sex.FEMALE, "latin", StatusType.IN_PAIR)
+    assert follower.id not in nearest(index, leader, 20)
+    assert nearest(index, leader, 20) == expected_nearest(dancers, leader, 20)
+
+    follower.status = StatusType.IN_SEARCH
+    follower.style = "standard"
+    index.upsert(follower)
+    assert index.key_of(follower.id) == (Sex.FEMALE, "standard", StatusType.IN_SEARCH)
+    assert follower.id not in nearest(index, leader, 20)
+
+    # A dancer without height stays indexed but takes no part in KNN
+    leader.height = None
+    index.upsert(leader)
+    assert index.key_of(leader.id) == (Sex.MALE, "latin", StatusType.IN_SEARCH)
+    assert leader.id not in nearest(index, dancers[2], 20)
+
+
+def test_remove_keeps_rows_dense(session):
+    dancers = add_dancers(session, 40, seed=1)
+    index = RecommendationIndex()
+    index.ensure_loaded(session)
+    removed = {dancer.id for dancer in dancers[:20:3]}
+    for dancer_id in removed:
+        index.remove(dancer_id)
+    remaining = [dancer for dancer in dancers if dancer.id not in removed]
+
+    for sex in Sex:
+        ids, features = index.snapshot()[(sex, "latin")]
+        by_id = {dancer.id: dancer for dancer in remaining if dancer.sex == sex}
+        assert sorted(ids.tolist()) == sorted(by_id)
+        for dancer_id, row in zip(ids, features):
+            dancer = by_id[dancer_id]
+            assert row.tolist() == [get_level_value(dancer.level), dancer.age, dancer.height]
+    assert index.key_of(dancers[0].id) is None
+    assert nearest(index, dancers[1], 5) == expected_nearest(remaining, dancers[1], 5)
+
+
+def test_running_stats_follow_changes(session):
+    dancers = add_dancers(session, 300, seed=2)
+    index = RecommendationIndex()
+    index.ensure_loaded(session)
+    for dancer in dancers[:40]:
+        index.remove(dancer.id)
+    for dancer in dancers[40:80]:
+        dancer.status = StatusType.IN_PAIR
+        index.upsert(dancer)
+    for dancer in dancers[80:120]:
+        dancer.age += 3
+        index.upsert(dancer)
+
+    for sex in Sex:
+        searching = np.array([[get_level_value(d.level), d.age, d.height]
+                              for d in dancers[80:] if d.sex == sex])
+        count, mean, std = index.stats(sex, "latin")
+        assert count == len(searching)
+        assert np.allclose(mean, searching.mean(axis=0))
+        assert np.allclose(std, searching.std(axis=0))
@@ -0,0 +1,70 @@
+import asyncio
+import csv
+import json
+import pytest
+from fastapi import HTTPException
+import ingest
+from ingest import iter_records
+
+
+def read(body: bytes, content_type: str, chunk_size: int = 1):
+    async def stream():
+        for i in range(0, len(body), chunk_size):
+            yield body[i:i + chunk_size]
+
+    async def collect():
+        return [(line, record if isinstance(record, dict) else type(record))
+                async for line, record in iter_records(stream(), content_type)]
+
+    return asyncio.run(collect())
+
+
+def test_csv_records_across_chunk_boundaries():
+    body = ('\ufeffname,secret_name,level\r\n'
+            'Анна,"a, b",C\r\n'
+            '\r\n'
+            '"Multi\nline ""name""",s,\r\n'
+            'short\r\n'
+            'Б,"unterminated\n').encode()
+    expected = [
+        (2, {"name": "Анна", "secret_name": "a, b", "level": "C"}),
+        (4, {"name": 'Multi\nline "name"', "secret_name": "s", "level": None}),
+        (6, ValueError),
+        (7, csv.Error),
+    ]
+    for chunk_size in (1, 3, 7, len(body)):
+        assert read(body, "text/csv; charset=utf-8", chunk_size) == expected
+
+
+def test_stray_quote_rejects_only_its_line(monkeypatch):
+    body = b'name,age\nBob "Jr,20\n' + b"".join(b"X%d,30\n" % i for i in range(5))
+    records = read(body, "text/csv", chunk_size=4)
+    assert records[0] == (2, ValueError)
+    assert records[1:] == [(3 + i, {"name": f"X{i}", "age": "30"}) for i in range(5)]
+
+    # Длинная запись с незакрытой кавычкой обрывается на пределе
+    monkeypatch.setattr(ingest, "CSV_MAX_RECORD_LINES", 3)
+    body = b'name,age\nBob "Jr,20\n' + b"".join(b'X%d,"3"\n' % i for i in range(5))
+    records = read(body, "text/csv", chunk_size=len(body))
+    assert records[0] == (2, ValueError)
+    assert records[1:] == [(3 + i, {"name": f"X{i}", "age": "3"}) for i in range(5)]
+
+
+def test_ndjson_reports_bad_lines():
+    body = b'{"name": "A"}\n\n[1]\n{"name": \xff}\n{broken\n{"name": "B"}'
+    assert read(body, "application/x-ndjson") == [
+        (1, {"name": "A"}),
+        (3, ValueError),
+        (4, UnicodeDecodeError),
+        (5, json.JSONDecodeError),
+        (6, {"name": "B"}),
+    ]
+
+
+def test_unsupported_type_and_broken_csv_header():
+    with pytest.raises(HTTPException) as e:
+        read(b"name\nA\n", "text/plain")
+    assert e.value.status_code == 415
+    with pytest.raises(HTTPException) as e:
+        read(b"na\xffme\nA\n", "text/csv")
+    assert e.value.status_code == 400
@@ -0,0 +1,67 @@
+import numpy as np
+from recommender.index import RecommendationIndex
+from recommender.matching import propose_pairs
+from schemas import Sex, StatusType, get_level_value
+
+
+class FakeDancer:
+    def __init__(self, dancer_id, sex, level, age, height):
+        self.id = dancer_id
+        self.sex = sex
+        self.style = "latin"
+        self.status = StatusType.IN_SEARCH
+        self.level = level
+        self.age = age
+        self.height = height
+
+
+def make_index(count, seed=0):
+    rng = np.random.default_rng(seed)
+    dancers = [FakeDancer(i + 1, Sex.MALE if i % 2 else Sex.FEMALE,
+                          "SMABCDEN"[rng.integers(0, 8)],
+                          int(rng.integers(15, 40)), float(rng.uniform(150, 195)))
+               for i in range(count)]
+    index = RecommendationIndex()
+    index.load((d.id, d.sex, d.style, d.status, d.level, d.age, d.height) for d in dancers)
+    return index, dancers
+
+
+def test_proposals_are_stable():
+    index, dancers = make_index(200)
+    proposals = propose_pairs(index, k=200)
+
+    ids, features = zip(*[(d.id, (d.level, d.age, d.height)) for d in dancers])
+    matrix = np.array([[get_level_value(level), age, height]
+                       for level, age, height in features])
+    normalized = dict(zip(ids, (matrix - matrix.mean(axis=0)) / (matrix.std(axis=0) + 1e-8)))
+    levels = dict(zip(ids, matrix[:, 0]))
+
+    partner_distance = {}
+    for pair in proposals:
+        assert pair["dancer1_id"] not in partner_distance
+        assert pair["dancer2_id"] not in partner_distance
+        partner_distance[pair["dancer1_id"]] = pair["distance"]
+        partner_distance[pair["dancer2_id"]] = pair["distance"]
+
+    leaders = [d.id for d in dancers if d.sex == Sex.MALE]
+    followers = [d.id for d in dancers if d.sex == Sex.FEMALE]
+    for leader in leaders:
+        for follower in followers:
+            if abs(levels[leader] - levels[follower]) > 1:
+                continue
+            distance = np.linalg.norm(normalized[leader] - normalized[follower])
+            blocking = (distance < partner_distance.get(leader, np.inf) - 1e-9 and
+                        distance < partner_distance.get(follower, np.inf) - 1e-9)
+            assert not blocking
+
+
+def test_proposals_respect_level_and_sex():
+    index, dancers = make_index(300, seed=1)
+    by_id = {d.id: d for d in dancers}
+    proposals = propose_pairs(index, k=5)
+    assert proposals
+    for pair in proposals:
+        leader, follower = by_id[pair["dancer1_id"]], by_id[pair["dancer2_id"]]
+        assert leader.sex == Sex.MALE and follower.sex == Sex.FEMALE
+        assert abs(get_level_value(leader.level) - get_level_value(follower.level)) <= 1
+
@@ -0,0 +1,37 @@
+from sqlalchemy import inspect
+from sqlmodel import SQLModel, create_engine
+from db.migrations import migrate
+
+
+def test_migrate_upgrades_old_dancer_table(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'old.db'}")
+    with engine.begin() as conn:
+        # Таблица dancer в том виде, в каком она была до level_rank и version
+        conn.exec_driver_sql(
+            "CREATE TABLE dancer (id INTEGER PRIMARY KEY, name VARCHAR NOT NULL, "
+            "sex VARCHAR NOT NULL, age INTEGER, height FLOAT, secret_name VARCHAR NOT NULL, "
+            "style VARCHAR, level VARCHAR, status VARCHAR NOT NULL)")
+        conn.exec_driver_sql(
+            "INSERT INTO dancer (name, sex, secret_name, level, status) VALUES "
+            "('A', 'MALE', 's', 'c', 'IN_SEARCH'), ('B', 'FEMALE', 's', NULL, 'IN_SEARCH'), "
+            "('C', 'MALE', 's', 'X', 'IN_PAIR'), ('D', 'FEMALE', 's', 'S', 'IN_SEARCH')")
+    SQLModel.metadata.create_all(engine)
+    migrate(engine)
+    # Повторный запуск ничего не меняет
+    migrate(engine)
+
+    with engine.begin() as conn:
+        rows = conn.exec_driver_sql("SELECT level_rank, version FROM dancer ORDER BY id").all()
+        # Таблица пересоздана с AUTOINCREMENT: id удаленной строки не выдается снова
+        conn.exec_driver_sql("DELETE FROM dancer WHERE id = 4")
+        new_id = conn.exec_driver_sql(
+            "INSERT INTO dancer (name, sex, secret_name, status, level_rank, version) "
+            "VALUES ('E', 'MALE', 's', 'IN_SEARCH', 0, 1) RETURNING id").scalar()
+        pair_sql = conn.exec_driver_sql(
+            "SELECT sql FROM sqlite_master WHERE name = 'pair'").scalar()
+    assert rows == [(4, 1), (0, 1), (0, 1), (8, 1)]
+    assert new_id == 5
+    assert "REFERENCES dancer" in pair_sql
+    indexes = {index["name"] for index in inspect(engine).get_indexes("dancer")}
+    assert "ix_dancer_style_sex_status_level_rank" in indexes
+    engine.dispose()
@@ -0,0 +1,133 @@
+import time
+import pytest
+from fastapi import FastAPI
+from fastapi.responses import StreamingResponse
+from auth_handler import get_current_user
+from fastapi.testclient import TestClient
+from sqlmodel import Session
+from config import settings
+from db.session import get_session
+from models import Dancer, User
+from monitoring import Metrics, MetricsMiddleware, SlowQueryLog, instrument_engine
+from routes import dancers, monitoring, pairs
+from schemas import UserType
+
+
+@pytest.fixture
+def metrics(monkeypatch):
+    """Свежие метрики вместо общего объекта процесса."""
+    metrics = Metrics()
+    monkeypatch.setattr("monitoring.metrics", metrics)
+    monkeypatch.setattr("routes.monitoring.metrics", metrics)
+    return metrics
+
+
+def test_metrics_count_requests_and_statements(engine, session, tmp_path, metrics, monkeypatch):
+    monkeypatch.setattr(settings, "profile_token", "secret")
+    monkeypatch.setattr(settings, "profile_dir", str(tmp_path))
+    session.add_all([Dancer(name=f"D{i}", secret_name="s") for i in range(3)])
+    session.commit()
+
+    def get_test_session():
+        with Session(engine) as session:
+            yield session
+
+    app = FastAPI()
+    app.add_middleware(MetricsMiddleware)
+    app.include_router(dancers.app)
+    app.include_router(monitoring.metrics_app)
+    app.dependency_overrides[get_session] = get_test_session
+    instrument_engine(engine)
+    client = TestClient(app)
+
+    for dancer_id in (1, 2, 3, 99):
+        response = client.get(f"/dancers/{dancer_id}")
+    assert response.status_code == 404
+    assert 'desc="1 statements"' in response.headers["server-timing"]
+
+    response = client.get("/dancers/", headers={"X-Profile": "secret"})
+    report = tmp_path / response.headers["X-Profile-Report"]
+    assert report.read_text().startswith("GET /dancers/: ")
+    assert "X-Profile-Report" not in client.get("/dancers/", headers={"X-Profile": "wrong"}).headers
+
+    text = client.get("/metrics").text
+    assert 'http_requests_total{method="GET",route="/dancers/{dancer_id}",status="200"} 3' in text
+    assert 'http_requests_total{method="GET",route="/dancers/{dancer_id}",status="404"} 1' in text
+    assert ('http_request_db_statements_bucket{method="GET",route="/dancers/{dancer_id}",le="1"} 4'
+            in text)
+    assert 'http_request_duration_seconds_count{method="GET",route="/dancers/"} 2' in text
+
+
+def test_streaming_latency_stops_at_response_start(metrics):
+    app = FastAPI()
+    app.add_middleware(MetricsMiddleware)
+    app.include_router(monitoring.metrics_app)
+
+    @app.get("/stream")
+    def stream():
+        def chunks():
+            yield "first\n"
+            time.sleep(0.3)
+            yield "last\n"
+        return StreamingResponse(chunks(), media_type="text/event-stream")
+
+    client = TestClient(app)
+    assert client.get("/stream").text == "first\nlast\n"
+    text = client.get("/metrics").text
+    assert 'http_request_duration_seconds_bucket{method="GET",route="/stream",le="0.25"} 1' in text
+
+
+def test_slow_queries_keep_route_and_explain(engine, add_pairs, admin, monkeypatch):
+    monkeypatch.setattr(settings, "slow_query_ms", 0.0)
+    add_pairs(2)
+
+    def get_test_session():
+        with Session(engine) as session:
+            yield session
+
+    app = FastAPI()
+    app.add_middleware(MetricsMiddleware)
+    app.include_router(pairs.app)
+    app.include_router(monitoring.app)
+    app.dependency_overrides[get_session] = get_test_session
+    app.dependency_overrides[get_current_user] = lambda: admin
+    instrument_engine(engine)
+    client = TestClient(app)
+
+    client.get("/pairs/?cursor=1")
+    entries = client.get("/monitoring/slow-queries?limit=5&explain=true").json()["entries"]
+    pair_query = next(entry for entry in entries if "FROM pair" in entry["statement"])
+    assert (pair_query["endpoint"], pair_query["route"]) == ("read_pairs", "GET /pairs/")
+    assert pair_query["parameters"] is None
+    assert any("SEARCH pair" in line for line in pair_query["explain"])
+    entries = client.get("/monitoring/slow-queries?limit=5&parameters=true").json()["entries"]
+    pair_query = next(entry for entry in entries if "FROM pair" in entry["statement"])
+    assert pair_query["parameters"][0] == 1
+
+    app.dependency_overrides[get_current_user] = lambda: User(
+        user_id=2, name="dancer", user_type=UserType.DANCER)
+    assert client.get("/monitoring/slow-queries").status_code == 403
+
+
+def test_slow_query_log_is_bounded():
+    log = SlowQueryLog(maxsize=2)
+    for i in range(5):
+        log.record(f"SELECT {i}", (), False, "sqlite", 1.0, None)
+    assert [entry["statement"] for entry in log.entries()] == ["SELECT 4", "SELECT 3"]
+    assert log.stats() == {"size": 2, "maxsize": 2, "recorded": 5}
+
+
+def test_slow_query_parameters_stay_out_of_the_log(engine, caplog):
+    log = SlowQueryLog(maxsize=5)
+    log.record("SELECT * FROM user WHERE password = ?", ("$2b$12$secret",), False,
+               "sqlite", 1.0, None)
+    log.record("SELECT * FROM no_such_table", (), False, "sqlite", 1.0, None)
+    assert "secret" not in caplog.text
+    assert "SELECT * FROM user WHERE password = ?" in caplog.text
+
+    with engine.connect() as connection:
+        connection.exec_driver_sql("CREATE TEMP TABLE marker (id INTEGER)")
+        broken = log.entries()[0]
+        assert log.explain(broken, connection)[0].startswith("EXPLAIN failed")
+        # Ошибка EXPLAIN откатывает только точку сохранения, не транзакцию
+        assert connection.exec_driver_sql("SELECT count(*) FROM marker").scalar() == 0
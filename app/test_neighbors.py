@@ -0,0 +1,41 @@
+import importlib.util
+import numpy as np
+import pytest
+from recommender.neighbors import BACKENDS, BruteForceSearch, get_backend
+
+
+def make_points(count, seed=0):
+    rng = np.random.default_rng(seed)
+    points = np.stack([rng.integers(0, 3, count), rng.integers(15, 40, count),
+                       rng.uniform(150, 195, count)], axis=1).astype(np.float64)
+    return (points - points.mean(axis=0)) / points.std(axis=0)
+
+
+@pytest.mark.parametrize("name", ["grid", "lsh"])
+def test_backend_finds_exact_neighbours(name):
+    points = make_points(2000)
+    queries = points[:100] + 0.01
+    exact = BruteForceSearch(points).query(queries, 5)
+    found = get_backend(name)(points).query(queries, 5)
+    for rows, expected, query in zip(found, exact, queries):
+        assert np.allclose(np.linalg.norm(points[rows] - query, axis=1),
+                           np.linalg.norm(points[expected] - query, axis=1))
+
+
+@pytest.mark.parametrize("name", ["brute", "grid", "lsh"])
+def test_backend_small_pool(name):
+    points = make_points(3)
+    found = BACKENDS[name](points).query(points[:1], 5)
+    assert sorted(found[0].tolist()) == [0, 1, 2]
+    assert found[0][0] == 0
+
+
+def test_unknown_backend():
+    with pytest.raises(ValueError):
+        get_backend("annoy")
+
+
+@pytest.mark.skipif(importlib.util.find_spec("scipy") is not None, reason="scipy is installed")
+def test_missing_dependency_fails_at_lookup():
+    with pytest.raises(RuntimeError, match="requires scipy"):
+        get_backend("kdtree")
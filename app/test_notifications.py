@@ -0,0 +1,57 @@
+import asyncio
+import pytest
+from starlette.websockets import WebSocketDisconnect
+from auth_handler import create_access_token, user_claims
+from models import Dancer, User
+from notifications import LocalBroker, NotificationHub
+from schemas import UserType
+
+
+@pytest.mark.parametrize("client", ["sync", "async"], indirect=True)
+def test_websocket_receives_request_and_pair_events(client, session, admin):
+    session.add_all([Dancer(name="Leader", secret_name="s", sex="MALE"),
+                     Dancer(name="Follower", secret_name="s", sex="FEMALE")])
+    session.commit()
+    user = User(user_id=7, name="follower", email="follower@example.com",
+                user_type=UserType.DANCER, dancer_id=2)
+    session.add(user)
+    session.commit()
+    token = create_access_token(user_claims(user))
+
+    with pytest.raises(WebSocketDisconnect):
+        with client.websocket_connect("/notifications/ws?token=bad") as websocket:
+            websocket.receive_json()
+
+    with client.websocket_connect(f"/notifications/ws?token={token}") as websocket:
+        assert client.post("/requests/", json={"sender_id": 1, "receiver_id": 2}).status_code == 201
+        event = websocket.receive_json()
+        assert event["type"] == "request_created"
+        assert event["request"]["status"] == "PENDING"
+
+        client.put("/requests/1", json={"status": "ACCEPTED"})
+        event = websocket.receive_json()
+        assert (event["type"], event["request"]["status"]) == ("request_updated", "ACCEPTED")
+
+        client.delete(f"/pairs/{event['pair_id']}")
+        event = websocket.receive_json()
+        assert event == {"type": "pair_deleted", "pair_id": 1, "dancer_ids": [1, 2]}
+
+    assert client.get("/notifications/stats").json()["connections"] == 0
+
+
+def test_slow_subscriber_gets_resync_instead_of_unbounded_queue():
+    async def scenario():
+        hub = NotificationHub(LocalBroker(), queue_size=3)
+        subscription = hub.subscribe(1)
+        for i in range(10):
+            hub.publish([1, 2], {"type": "request_created", "n": i})
+        await asyncio.sleep(0)
+        assert subscription.queue.qsize() == 3
+        events = [await subscription.get() for _ in range(4)]
+        hub.unsubscribe(subscription)
+        return events, hub.stats()
+
+    events, stats = asyncio.run(scenario())
+    assert events == [{"type": "resync", "missed": 7}] + [
+        {"type": "request_created", "n": i} for i in (7, 8, 9)]
+    assert stats["connections"] == 0 and stats["delivered"] == 10
@@ -0,0 +1,68 @@
+from datetime import datetime
+import pytest
+from fastapi import HTTPException
+from models import Dancer
+from pagination import (DEFAULT_LIMIT, decode_time_cursor, encode_time_cursor,
+                        paginate, parse_fields)
+from schemas import DancerResponse
+
+
+def add_dancers(session, count):
+    session.add_all([Dancer(name=f"D{i}", secret_name="s", age=20 + i % 10)
+                     for i in range(count)])
+    session.commit()
+
+
+def test_parse_fields():
+    assert parse_fields(None, DancerResponse) is None
+    assert parse_fields("", DancerResponse) is None
+    assert parse_fields("age, name,age,id", DancerResponse) == ["id", "age", "name"]
+    with pytest.raises(HTTPException) as error:
+        parse_fields("name,password", DancerResponse)
+    assert error.value.status_code == 400
+    assert error.value.detail == "Unknown fields: password"
+
+
+def test_paginate_walks_all_rows(session):
+    add_dancers(session, 25)
+    conditions = [Dancer.age >= 25]
+    seen, cursor = [], None
+    while True:
+        items, cursor = paginate(session, Dancer, conditions, cursor, 5)
+        seen += [dancer.id for dancer in items]
+        if cursor is None:
+            break
+        assert cursor == items[-1].id
+    assert seen == [i + 1 for i in range(25) if i % 10 >= 5]
+
+    # Ровно limit строк - следующей страницы нет
+    items, cursor = paginate(session, Dancer, [], 20, 5, ["id", "name"])
+    assert [tuple(item) for item in items] == [(i, f"D{i - 1}") for i in range(21, 26)]
+    assert cursor is None
+
+
+def test_time_cursor_round_trip():
+    created_at = datetime(2024, 5, 1, 12, 30, 15, 123456)
+    assert decode_time_cursor(encode_time_cursor(created_at, 42)) == (created_at, 42)
+    for cursor in ("bad", "2024-05-01_x", "_1"):
+        with pytest.raises(HTTPException):
+            decode_time_cursor(cursor)
+
+
+def test_list_endpoint_pages_by_default(client, session):
+    add_dancers(session, DEFAULT_LIMIT + 20)
+    first = client.get("/dancers/")
+    assert len(first.json()) == DEFAULT_LIMIT
+    assert first.headers["X-Next-Cursor"] == str(DEFAULT_LIMIT)
+
+    rest = client.get("/dancers/", params={"cursor": first.headers["X-Next-Cursor"]})
+    assert [dancer["id"] for dancer in rest.json()] == list(range(DEFAULT_LIMIT + 1,
+                                                                  DEFAULT_LIMIT + 21))
+    assert "X-Next-Cursor" not in rest.headers
+
+    page = client.get("/dancers/?limit=3&fields=name&status=IN_SEARCH")
+    assert page.json() == [{"id": 1, "name": "D0"}, {"id": 2, "name": "D1"},
+                           {"id": 3, "name": "D2"}]
+    assert page.headers["X-Next-Cursor"] == "3"
+    assert client.get("/dancers/?limit=0").status_code == 422
+    assert client.get("/dancers/?limit=1001").status_code == 422
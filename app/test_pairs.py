@@ -0,0 +1,49 @@
+import pytest
+from models import Dancer
+
+
+pytestmark = pytest.mark.parametrize("client", ["sync", "async"], indirect=True)
+
+
+def test_read_pairs_query_count_does_not_grow(client, add_pairs, count_queries):
+    add_pairs(3)
+    response, few = count_queries(lambda: client.get("/pairs/"))
+    assert response.status_code == 200
+    assert len(response.json()) == 3
+
+    add_pairs(30)
+    response, many = count_queries(lambda: client.get("/pairs/"))
+    assert response.status_code == 200
+    assert len(response.json()) == 33
+    assert many == few
+
+
+def test_read_pairs_returns_dancers(client, add_pairs):
+    add_pairs(2)
+    pairs = client.get("/pairs/").json()
+    assert [p["dancer1"]["name"] for p in pairs] == ["Leader 0", "Leader 1"]
+    assert [p["dancer2"]["name"] for p in pairs] == ["Follower 0", "Follower 1"]
+
+
+def test_read_pair_single_query(client, add_pairs, count_queries):
+    add_pairs(1)
+    response, queries = count_queries(lambda: client.get("/pairs/1"))
+    assert response.status_code == 200
+    assert response.json()["dancer2"]["name"] == "Follower 0"
+    assert queries == 1
+
+
+def test_fast_json_matches_response_models(client, session, add_pairs, monkeypatch):
+    from config import settings
+    add_pairs(5)
+    session.add(Dancer(name="Solo", secret_name="s", age=20, height=170.5))
+    session.commit()
+
+    urls = ["/dancers/?limit=4", "/dancers/?cursor=4", "/pairs/?limit=3", "/pairs/?cursor=3"]
+    regular = [client.get(url) for url in urls]
+    monkeypatch.setattr(settings, "fast_json", True)
+    fast = [client.get(url) for url in urls]
+
+    for slow_response, fast_response in zip(regular, fast):
+        assert fast_response.json() == slow_response.json()
+        assert fast_response.headers.get("X-Next-Cursor") == slow_response.headers.get("X-Next-Cursor")
@@ -0,0 +1,46 @@
+import asyncio
+import threading
+import pytest
+from fastapi import HTTPException
+from passlib.context import CryptContext
+from config import settings
+import passwords
+from passwords import hash_password_async, verify_password_async, needs_rehash, shutdown_pool
+
+
+def test_hash_and_verify_in_thread_pool(fast_hashing):
+    hashed = asyncio.run(hash_password_async("secret"))
+    assert hashed.startswith("$2b$05$")
+    assert asyncio.run(verify_password_async("secret", hashed))
+    assert not asyncio.run(verify_password_async("wrong", hashed))
+    assert not needs_rehash(hashed)
+    assert needs_rehash(CryptContext(schemes=["bcrypt"], bcrypt__default_rounds=4).hash("secret"))
+
+
+def test_hash_and_verify_in_process_pool(monkeypatch):
+    monkeypatch.setattr(settings, "password_hash_workers", 1)
+    try:
+        hashed = asyncio.run(hash_password_async("secret"))
+        assert asyncio.run(verify_password_async("secret", hashed))
+    finally:
+        shutdown_pool()
+
+
+def test_saturated_queue_returns_503(fast_hashing, client, monkeypatch):
+    pending = threading.BoundedSemaphore(1)
+    monkeypatch.setattr(passwords, "_pending", pending)
+    pending.acquire()
+    with pytest.raises(HTTPException) as e:
+        asyncio.run(hash_password_async("secret"))
+    assert e.value.status_code == 503
+    assert e.value.headers == {"Retry-After": "1"}
+
+    response = client.post("/auth/login", data={"username": "a@a.com", "password": "secret"})
+    assert response.status_code == 401
+    response = client.post("/auth/signup", json={"name": "A", "email": "a@a.com",
+                                                 "password": "secret"})
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "1"
+
+    pending.release()
+    assert asyncio.run(verify_password_async("secret", asyncio.run(hash_password_async("secret"))))
@@ -0,0 +1,77 @@
+from models import Dancer, Request
+
+
+def full_scans(engine, statements):
+    scans = []
+    with engine.connect() as conn:
+        for statement, parameters in statements:
+            if not statement.lstrip().upper().startswith(("SELECT", "UPDATE", "DELETE")):
+                continue
+            for row in conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {statement}", parameters):
+                detail = row[-1]
+                if detail.startswith("SCAN") and "INDEX" not in detail:
+                    scans.append((statement, detail))
+    return scans
+
+
+def test_request_and_pair_queries_use_indexes(client, engine, session, record_queries, admin):
+    dancers = [Dancer(name=f"D{i}", secret_name="s", sex="MALE" if i % 2 else "FEMALE")
+               for i in range(6)]
+    session.add_all(dancers)
+    session.flush()
+    session.add_all([Request(sender_id=dancers[i].id, receiver_id=dancers[i + 1].id)
+                     for i in range(5)])
+    session.commit()
+
+    def calls():
+        assert client.get("/requests/?receiver_id=2&status=PENDING").status_code == 200
+        assert client.get("/requests/?sender_id=1").status_code == 200
+        assert client.put("/requests/1", json={"status": "ACCEPTED"}).status_code == 200
+        assert client.delete("/pairs/1").status_code == 200
+        assert client.put("/requests/3", json={"status": "ACCEPTED"}).status_code == 200
+        assert client.delete(f"/dancers/{dancers[2].id}").status_code == 200
+
+    _, statements = record_queries(calls)
+    assert any("FROM pair" in statement for statement, _ in statements)
+    assert any("DELETE FROM recommendation" in statement for statement, _ in statements)
+    assert full_scans(engine, statements) == []
+
+
+def test_dancer_request_lists_page_by_time_over_indexes(client, engine, session,
+                                                        record_queries, admin):
+    dancers = [Dancer(name=f"D{i}", secret_name="s", sex="MALE" if i % 2 else "FEMALE")
+               for i in range(8)]
+    session.add_all(dancers)
+    session.flush()
+    receiver = dancers[0].id
+    session.add_all([Request(sender_id=dancer.id, receiver_id=receiver) for dancer in dancers[1:]])
+    session.commit()
+    session.get(Request, 1).status = "REJECTED"
+    session.commit()
+
+    pages = []
+
+    def calls():
+        cursor = None
+        while True:
+            params = {"status": "PENDING", "limit": 4}
+            if cursor:
+                params["cursor"] = cursor
+            response = client.get(f"/dancers/{receiver}/requests/incoming", params=params)
+            assert response.status_code == 200
+            pages.append(response.json())
+            cursor = response.headers.get("X-Next-Cursor")
+            if not cursor:
+                break
+        response = client.get(f"/dancers/{receiver}/requests/incoming/count")
+        assert response.json()["count"] == 6
+        response = client.get(f"/dancers/{dancers[1].id}/requests/outgoing?fields=id,status")
+        assert response.json() == [{"id": 1, "status": "REJECTED"}]
+
+    _, statements = record_queries(calls)
+    ids = [request["id"] for page in pages for request in page]
+    assert [len(page) for page in pages] == [4, 2]
+    assert ids == [7, 6, 5, 4, 3, 2]
+    assert full_scans(engine, statements) == []
+    assert client.get("/dancers/999/requests/incoming").status_code == 404
+    assert client.get(f"/dancers/{receiver}/requests/incoming?cursor=bad").status_code == 400
@@ -0,0 +1,133 @@
+import json
+import time
+from sqlmodel import select
+from models import Recommendation
+from recommender.precompute import worker
+from recommender.results import RecommendationCache, candidate_buckets, recommendation_cache
+
+
+def add_dancer(client, name, sex, level="C"):
+    response = client.post("/dancers/", json={
+        "name": name, "secret_name": "s", "sex": sex, "age": 25, "height": 175.0,
+        "style": "latin", "level": level, "status": "IN_SEARCH"})
+    assert response.status_code == 201
+    return response.json()["id"]
+
+
+def test_recommendations_cached_until_bucket_changes(client, count_queries):
+    leader = add_dancer(client, "Leader", "MALE")
+    add_dancer(client, "Follower 1", "FEMALE")
+
+    first, _ = count_queries(lambda: client.get(f"/recomendations/base/{leader}"))
+    second, queries = count_queries(lambda: client.get(f"/recomendations/base/{leader}"))
+    assert second.json() == first.json()
+    assert queries == 0
+
+    add_dancer(client, "Follower 2", "FEMALE")
+    names = [d["name"] for d in client.get(f"/recomendations/base/{leader}").json()]
+    assert sorted(names) == ["Follower 1", "Follower 2"]
+
+    # A dancer of the leader's own bucket doesn't invalidate the list
+    add_dancer(client, "Leader 2", "MALE")
+    _, queries = count_queries(lambda: client.get(f"/recomendations/base/{leader}"))
+    assert queries == 0
+
+
+def test_result_computed_during_write_is_not_cached():
+    cache = RecommendationCache(10)
+    buckets = candidate_buckets("MALE", "latin")
+    token = cache.bucket_generations(cache.generations(1), buckets)
+    cache.invalidate(2, buckets)
+    cache.set(1, "knn", 5, [], buckets, token)
+    assert cache.get(1, "knn", 5) is None
+
+    # The dancer itself changed before its buckets were known
+    token = cache.generations(1)
+    cache.invalidate(1, candidate_buckets("MALE", "standard"))
+    cache.set(1, "knn", 5, [], buckets, cache.bucket_generations(token, buckets))
+    assert cache.get(1, "knn", 5) is None
+    assert cache.stats()["stale_rejected"] == 2
+
+    # A write to an unrelated bucket doesn't reject the result
+    token = cache.bucket_generations(cache.generations(1), buckets)
+    cache.invalidate(3, candidate_buckets("MALE", "standard"))
+    cache.set(1, "knn", 5, [], buckets, token)
+    assert cache.get(1, "knn", 5) == []
+    assert cache.invalidate(4, buckets) == 1
+    assert cache.get(1, "knn", 5) is None
+
+
+def test_entries_expire_after_ttl():
+    cache = RecommendationCache(10, ttl=0.05)
+    buckets = candidate_buckets("MALE", "latin")
+    cache.set(1, "base", None, [], buckets,
+              cache.bucket_generations(cache.generations(1), buckets))
+    assert cache.get(1, "base") == []
+    time.sleep(0.05)
+    assert cache.get(1, "base") is None
+    assert cache.stats()["size"] == 0
+
+
+def wait_for(worker, timeout=10.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        stats = worker.stats()
+        if not stats["pending_dancers"] and not stats["pending_buckets"]:
+            return stats
+        time.sleep(0.01)
+    raise AssertionError(f"Precompute worker did not catch up: {worker.stats()}")
+
+
+def test_precomputed_knn_is_single_read(client, engine, count_queries):
+    leader = add_dancer(client, "Leader", "MALE")
+    for i, level in enumerate("BCDC"):
+        add_dancer(client, f"Follower {i}", "FEMALE", level)
+    expected = client.get(f"/recomendations/knn/{leader}?k=3").json()
+
+    worker.start(engine)
+    try:
+        recommendation_cache.clear()
+        wait_for(worker)
+        response, queries = count_queries(
+            lambda: client.get(f"/recomendations/knn/{leader}?k=3"))
+        assert response.json() == expected
+        assert queries == 1
+
+        # A new candidate makes the list stale until the worker recomputes it
+        add_dancer(client, "Follower 4", "FEMALE", "C")
+        wait_for(worker)
+        recommendation_cache.clear()
+        names = [d["name"] for d in client.get(f"/recomendations/knn/{leader}?k=5").json()]
+        assert "Follower 4" in names
+    finally:
+        worker.stop()
+
+
+def test_deleting_dancer_drops_precomputed_rows(client, session, admin):
+    leader, other = add_dancer(client, "Leader", "MALE"), add_dancer(client, "Leader 2", "MALE")
+    follower = add_dancer(client, "Follower", "FEMALE")
+    session.add_all([Recommendation(dancer_id=leader, rank=0, candidate_id=follower),
+                     Recommendation(dancer_id=follower, rank=0, candidate_id=leader),
+                     Recommendation(dancer_id=follower, rank=1, candidate_id=other),
+                     Recommendation(dancer_id=other, rank=0, candidate_id=follower)])
+    session.commit()
+
+    assert client.delete(f"/dancers/{leader}").json() == {"ok": True}
+    rows = session.exec(select(Recommendation.dancer_id, Recommendation.candidate_id)).all()
+    assert sorted(rows) == sorted([(follower, other), (other, follower)])
+
+
+def test_knn_batch_streams_every_requested_dancer(client):
+    leaders = [add_dancer(client, f"Leader {i}", "MALE", level) for i, level in enumerate("CCB")]
+    followers = [add_dancer(client, f"Follower {i}", "FEMALE") for i in range(2)]
+
+    response = client.post("/recomendations/knn/batch",
+                           json={"dancer_ids": leaders + [0], "k": 5})
+    assert response.headers["content-type"] == "application/x-ndjson"
+    lines = {line["dancer_id"]: line for line in map(json.loads, response.iter_lines())}
+    assert lines.pop(0) == {"dancer_id": 0, "error": "Dancer not found"}
+    assert set(lines) == set(leaders)
+    for leader in leaders:
+        expected = [d["id"] for d in client.get(f"/recomendations/knn/{leader}?k=5").json()]
+        assert [d["id"] for d in lines[leader]["recommendations"]] == expected
+    assert {d["id"] for d in lines[leaders[0]]["recommendations"]} == set(followers)
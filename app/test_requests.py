@@ -0,0 +1,94 @@
+import random
+from concurrent.futures import ThreadPoolExecutor
+import pytest
+from fastapi import HTTPException
+from sqlalchemy import func, text
+from sqlalchemy.exc import IntegrityError
+from sqlmodel import SQLModel, Session, create_engine, select
+from db.db import configure_sqlite
+from models import Dancer, Pair, PairMember, Request
+from routes.requests import update_request
+from schemas import RequestStatus, RequestUpdate, StatusType
+
+
+def test_concurrent_accepts_keep_pairs_consistent(tmp_path, admin):
+    engine = create_engine(f"sqlite:///{tmp_path / 'race.db'}",
+                           connect_args={"check_same_thread": False, "timeout": 30})
+    configure_sqlite(engine)
+    SQLModel.metadata.create_all(engine)
+
+    rng = random.Random(0)
+    with Session(engine) as session:
+        leaders = [Dancer(name=f"L{i}", secret_name="s", sex="MALE") for i in range(40)]
+        followers = [Dancer(name=f"F{i}", secret_name="s", sex="FEMALE") for i in range(40)]
+        session.add_all(leaders + followers)
+        session.flush()
+        requests = [Request(sender_id=rng.choice(leaders).id, receiver_id=rng.choice(followers).id)
+                    for _ in range(400)]
+        session.add_all(requests)
+        session.commit()
+        request_ids = [request.id for request in requests]
+
+    def accept(request_id):
+        with Session(engine) as session:
+            try:
+                update_request(request_id, RequestUpdate(status=RequestStatus.ACCEPTED),
+                               session, admin)
+                return True
+            except HTTPException as e:
+                assert e.status_code == 400
+                return False
+
+    with ThreadPoolExecutor(max_workers=32) as pool:
+        accepted = sum(pool.map(accept, request_ids))
+
+    with Session(engine) as session:
+        pairs = session.exec(select(Pair)).all()
+        members = [pair.dancer1_id for pair in pairs] + [pair.dancer2_id for pair in pairs]
+        assert accepted == len(pairs) > 0
+        assert len(members) == len(set(members))
+        assert session.exec(select(func.count()).select_from(PairMember)).one() == len(members)
+        in_pair = set(session.exec(
+            select(Dancer.id).where(Dancer.status == StatusType.IN_PAIR)).all())
+        assert in_pair == set(members)
+        assert session.exec(select(func.count()).select_from(Request).where(
+            Request.status == RequestStatus.ACCEPTED)).one() == len(pairs)
+    engine.dispose()
+
+
+def send_request(client, session):
+    leader = Dancer(name="L", secret_name="s", sex="MALE")
+    follower = Dancer(name="F", secret_name="s", sex="FEMALE")
+    session.add_all([leader, follower])
+    session.commit()
+    response = client.post("/requests/", json={"sender_id": leader.id,
+                                               "receiver_id": follower.id})
+    assert response.status_code == 201
+    return response.json()["id"], leader.id, follower.id
+
+
+def test_accept_reraises_unrelated_integrity_errors(client, session, admin):
+    request_id, _, _ = send_request(client, session)
+    session.execute(text("CREATE TRIGGER reject_pair BEFORE INSERT ON pair "
+                         "BEGIN SELECT RAISE(ABORT, 'pairs are closed'); END"))
+    session.commit()
+    with pytest.raises(IntegrityError):
+        client.put(f"/requests/{request_id}", json={"status": "ACCEPTED"})
+
+
+def test_deleting_dancer_dissolves_pair(client, session, admin):
+    request_id, leader_id, follower_id = send_request(client, session)
+    assert client.put(f"/requests/{request_id}", json={"status": "ACCEPTED"}).status_code == 200
+    assert client.delete(f"/dancers/{leader_id}").json() == {"ok": True}
+    assert session.exec(select(PairMember)).all() == []
+    assert session.exec(select(Pair)).all() == []
+    assert client.get(f"/dancers/{follower_id}").json()["status"] == "IN_SEARCH"
+
+    leader = Dancer(name="L2", secret_name="s", sex="MALE")
+    session.add(leader)
+    session.commit()
+    response = client.post("/requests/", json={"sender_id": leader.id,
+                                               "receiver_id": follower_id})
+    assert response.status_code == 201
+    response = client.put(f"/requests/{response.json()['id']}", json={"status": "ACCEPTED"})
+    assert response.status_code == 200